@@ -69,6 +69,14 @@ DATABASES = {
     }
 }
 
+# Cache (file based so the web server and the run_jobs worker share it)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -92,6 +100,9 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered report cards kept under MEDIA_ROOT/card_cache (school.card_cache)
+REPORT_CARD_CACHE_MAX_BYTES = config('REPORT_CARD_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+
 # Default primary key
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,47 @@
+# school/activity.py
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import ActivityEvent
+
+
+# ============================================
+# RECORDING
+# ============================================
+#
+# An event is one INSERT made in the caller's transaction, so it commits
+# or rolls back with the change it describes and survives a crash or a
+# forked job worker exiting straight after it.
+
+def record_activity(kind, description, actor=None):
+    """Record an activity event for the feed"""
+    return ActivityEvent.objects.create(
+        kind=kind,
+        description=description[:255],
+        actor_id=getattr(actor, 'pk', actor),
+        created_at=timezone.now(),
+    )
+
+
+# ============================================
+# READING & PRUNING
+# ============================================
+
+def recent_activity(limit=10):
+    """Latest events, read newest-first from the created_at index"""
+    return list(ActivityEvent.objects.select_related('actor').order_by('-created_at')[:limit])
+
+
+def prune_activity(days=365, chunk_size=5000):
+    """Delete events older than `days` in chunks; returns the number deleted"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = list(
+            ActivityEvent.objects.filter(created_at__lt=cutoff)
+            .order_by('created_at').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return deleted
+        deleted += ActivityEvent.objects.filter(id__in=ids).delete()[0]
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import *
+from .search import search_students
 
 
 @admin.register(User)
@@ -49,9 +50,15 @@ class TeacherAssignmentAdmin(admin.ModelAdmin):
 class StudentAdmin(admin.ModelAdmin):
     list_display = ['admission_number', 'get_full_name', 'gender', 'current_class', 'is_active']
     list_filter = ['gender', 'is_active', 'current_class']
-    search_fields = ['admission_number', 'first_name', 'last_name']
+    search_fields = ['admission_number', 'first_name', 'last_name', 'guardian_name', 'guardian_phone']
     date_hierarchy = 'enrollment_date'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index instead of LIKE '%term%' per field
+        if not search_term.strip():
+            return queryset, False
+        return search_students(queryset, search_term), False
+
 
 @admin.register(Quarter)
 class QuarterAdmin(admin.ModelAdmin):
@@ -62,6 +69,7 @@ class QuarterAdmin(admin.ModelAdmin):
 @admin.register(QuarterlyResult)
 class QuarterlyResultAdmin(admin.ModelAdmin):
     list_display = ['student', 'course', 'quarter', 'score', 'get_grade', 'status', 'teacher']
+    list_select_related = ['student', 'course', 'quarter__academic_year', 'teacher']
     list_filter = ['status', 'quarter', 'course']
     search_fields = ['student__first_name', 'student__last_name', 'student__admission_number']
 
@@ -75,11 +83,29 @@ class SemesterAdmin(admin.ModelAdmin):
 @admin.register(SemesterResult)
 class SemesterResultAdmin(admin.ModelAdmin):
     list_display = ['student', 'course', 'semester', 'average_score', 'get_grade', 'is_approved']
+    list_select_related = ['student', 'course', 'semester__academic_year']
     list_filter = ['is_approved', 'semester']
     search_fields = ['student__first_name', 'student__last_name']
 
 
+class GradeBoundaryInline(admin.TabularInline):
+    model = GradeBoundary
+    extra = 5
+
+
+@admin.register(GradeScale)
+class GradeScaleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'department', 'created_at']
+    inlines = [GradeBoundaryInline]
+
+
 @admin.register(ResultTemplate)
 class ResultTemplateAdmin(admin.ModelAdmin):
     list_display = ['name', 'department', 'template_type', 'is_active']
-    list_filter = ['template_type', 'is_active', 'department']
\ No newline at end of file
+    list_filter = ['template_type', 'is_active', 'department']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'total', 'attempts', 'created_by', 'created_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['result', 'error', 'started_at', 'finished_at', 'updated_at']
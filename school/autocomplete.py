@@ -0,0 +1,93 @@
+# school/autocomplete.py
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .models import Class, Course, Student, User
+from .search import search_students
+
+
+# ============================================
+# TYPE-AHEAD LOOKUPS
+# ============================================
+#
+# Each source lists the columns matched as prefixes. The columns carry
+# LOWER() indexes, and a prefix is matched as the range
+# [term, term + U+FFFF), which any backend can answer from those indexes.
+# Students are looked up through the full-text index instead.
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_TIMEOUT = 60 * 5
+
+AUTOCOMPLETE_SOURCES = {
+    'teachers': {
+        'queryset': lambda: User.objects.filter(role__in=['teacher', 'class_teacher'], is_active=True),
+        'fields': ['first_name', 'last_name', 'username'],
+    },
+    'courses': {
+        'queryset': lambda: Course.objects.all(),
+        'fields': ['name', 'code'],
+    },
+    'classes': {
+        'queryset': lambda: Class.objects.select_related('department'),
+        'fields': ['name'],
+    },
+}
+
+
+def _version_key(kind):
+    return f'autocomplete:version:{kind}'
+
+
+def invalidate_autocomplete(kind):
+    """Retire every cached answer of one source"""
+    cache.set(_version_key(kind), time.time_ns(), None)
+
+
+def _cache_key(kind, term, limit):
+    version = cache.get_or_set(_version_key(kind), time.time_ns, None)
+    digest = hashlib.md5(term.encode()).hexdigest()
+    return f'autocomplete:{kind}:{version}:{limit}:{digest}'
+
+
+def _prefix_matches(queryset, fields, term):
+    # Every word must start one of the fields
+    lowered = {f'{field}_lower': Lower(field) for field in fields}
+    queryset = queryset.annotate(**lowered)
+    for word in term.split():
+        condition = Q()
+        for name in lowered:
+            condition |= Q(**{f'{name}__gte': word, f'{name}__lt': word + '\uffff'})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def _lookup(kind, term, limit):
+    if kind == 'students':
+        rows = search_students(Student.objects.filter(is_active=True), term).order_by(
+            'search_rank', 'last_name', 'first_name'
+        )[:limit]
+    else:
+        source = AUTOCOMPLETE_SOURCES[kind]
+        rows = _prefix_matches(source['queryset'](), source['fields'], term)[:limit]
+    return [{'id': row.pk, 'text': str(row)} for row in rows]
+
+
+def autocomplete(kind, term, limit=AUTOCOMPLETE_LIMIT):
+    """Top `limit` {'id', 'text'} matches of `term` for one source, cached"""
+    term = ' '.join(term.lower().split())
+    if not term:
+        return []
+    key = _cache_key(kind, term, limit)
+    results = cache.get(key)
+    if results is None:
+        results = _lookup(kind, term, limit)
+        cache.set(key, results, AUTOCOMPLETE_TIMEOUT)
+    return results
+
+
+def autocomplete_kinds():
+    return ['students'] + list(AUTOCOMPLETE_SOURCES)
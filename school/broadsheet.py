@@ -0,0 +1,133 @@
+# school/broadsheet.py
+import re
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .class_stats import STATS_PERIODS, STATS_TIMEOUT, class_scores, class_version
+from .exports import csv_chunks, xlsx_chunks
+from .ranking import class_positions
+
+
+# ============================================
+# CLASS BROADSHEETS
+# ============================================
+#
+# A broadsheet is the students x courses matrix of a class for a quarter
+# (approved scores) or a semester (averages), with each student's total,
+# average and position and each course's average, highest and lowest.
+# All the scores come from one query and are pivoted in Python: students
+# are rows in name order, courses are columns in code order, and a missing
+# score is None.
+#
+# Broadsheets are cached per (class, period) behind the same class version
+# stamp as the class statistics, so an approval, an edit or a re-ranking
+# in the class retires both. PDFs are cached next to the matrix under the
+# same stamp.
+
+BROADSHEET_PERIODS = STATS_PERIODS
+BROADSHEET_FORMATS = ['html', 'print', 'csv', 'xlsx', 'pdf']
+TWO_PLACES = Decimal('0.01')
+
+
+def _mean(total, count):
+    return (Decimal(total) / count).quantize(TWO_PLACES)
+
+
+def build_broadsheet(class_id, period, period_id):
+    """Students x courses score matrix of a class with row and column aggregates"""
+    students = {}
+    courses = {}
+    cells = []
+    for (student_id, admission_number, first_name, last_name,
+         course_id, code, name, _, score) in class_scores(class_id, period, period_id):
+        students.setdefault(student_id, (last_name, first_name, student_id, admission_number))
+        courses.setdefault(course_id, (code, name, course_id))
+        cells.append((student_id, course_id, score))
+
+    student_order = sorted(students.values())
+    course_order = sorted(courses.values())
+    row_index = {student[2]: index for index, student in enumerate(student_order)}
+    column_index = {course[2]: index for index, course in enumerate(course_order)}
+    matrix = [[None] * len(course_order) for _ in student_order]
+    for student_id, course_id, score in cells:
+        matrix[row_index[student_id]][column_index[course_id]] = score
+
+    # Positions are the class ranks printed on the report cards
+    positions = class_positions(class_id, period, period_id)
+    rows = []
+    for (last_name, first_name, student_id, admission_number), scores in zip(student_order, matrix):
+        present = [score for score in scores if score is not None]
+        total = sum(present, Decimal(0))
+        rows.append({
+            'id': student_id, 'admission_number': admission_number, 'name': f'{first_name} {last_name}',
+            'scores': scores, 'count': len(present), 'total': total, 'average': _mean(total, len(present)),
+            'position': positions.get(student_id),
+        })
+
+    columns = []
+    for index, (code, name, course_id) in enumerate(course_order):
+        present = [scores[index] for scores in matrix if scores[index] is not None]
+        columns.append({
+            'id': course_id, 'code': code, 'name': name, 'count': len(present),
+            'average': _mean(sum(present, Decimal(0)), len(present)),
+            'highest': max(present), 'lowest': min(present),
+        })
+
+    return {
+        'courses': columns,
+        'students': rows,
+        'average': _mean(sum(row['total'] for row in rows), len(cells)) if cells else None,
+    }
+
+
+def _broadsheet_key(class_id, period, period_id):
+    return f'broadsheet:{class_version(class_id)}:{class_id}:{period}:{period_id}'
+
+
+def get_broadsheet(class_id, period, period_id):
+    """Cached broadsheet of one class and period"""
+    key = _broadsheet_key(class_id, period, period_id)
+    sheet = cache.get(key)
+    if sheet is None:
+        sheet = build_broadsheet(class_id, period, period_id)
+        cache.set(key, sheet, STATS_TIMEOUT)
+    return sheet
+
+
+def get_broadsheet_pdf(class_id, period, period_id, render):
+    """Cached PDF of a broadsheet; `render` builds the bytes on a miss"""
+    key = _broadsheet_key(class_id, period, period_id) + ':pdf'
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render()
+        cache.set(key, pdf, STATS_TIMEOUT)
+    return pdf
+
+
+# ============================================
+# TABULAR OUTPUT
+# ============================================
+
+def broadsheet_table(sheet):
+    """(headers, rows) of a broadsheet, course aggregates as the last rows"""
+    headers = ['Admission No.', 'Student'] + [course['code'] for course in sheet['courses']]
+    headers += ['Total', 'Average', 'Position']
+    rows = [
+        [row['admission_number'], row['name'], *row['scores'], row['total'], row['average'], row['position']]
+        for row in sheet['students']
+    ]
+    for label, field in [('Course Average', 'average'), ('Highest', 'highest'), ('Lowest', 'lowest')]:
+        rows.append(['', label] + [course[field] for course in sheet['courses']] + ['', '', ''])
+    return headers, rows
+
+
+def broadsheet_chunks(sheet, output_format, title='Broadsheet'):
+    """Byte chunks of a broadsheet in 'csv' or 'xlsx'"""
+    headers, rows = broadsheet_table(sheet)
+    if output_format == 'csv':
+        return csv_chunks(headers, rows)
+    if output_format == 'xlsx':
+        # Sheet names are capped at 31 characters and cannot carry []:*?/\
+        return xlsx_chunks(headers, rows, sheet=re.sub(r'[\[\]:*?/\\]', ' ', title)[:31])
+    raise ValueError(f'Unknown broadsheet format: {output_format}')
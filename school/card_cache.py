@@ -0,0 +1,277 @@
+# school/card_cache.py
+import hashlib
+import os
+import shutil
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .grading import get_scale
+from .models import ClassRank, QuarterlyResult, Semester, SemesterResult, Student
+from .result_templates import active_template, content_hash
+
+
+# ============================================
+# REPORT CARD DOCUMENT CACHE
+# ============================================
+#
+# Rendered cards (HTML and PDF) are stored under MEDIA_ROOT as
+#   card_cache/<kind>-<period_id>/<student_id>/<digest>.<format>
+# where the digest covers every value the card is rendered from: the
+# student, the result and rank rows, the grade scales, the active
+# ResultTemplate and the card templates themselves. A changed input gives
+# a new file name, so a stale card is never served even if an
+# invalidation was missed. Invalidation only reclaims the disk space early.
+#
+# The digest doubles as the ETag of the print endpoints. The cache is kept
+# under REPORT_CARD_CACHE_MAX_BYTES by dropping the least recently served
+# cards; a hit touches the file so its mtime tracks use.
+
+CARD_CACHE_DIR = 'card_cache'
+SIZE_KEY = 'card_cache:bytes'
+EVICT_TO = 0.8
+PART_GRACE = 300  # seconds before an unfinished .part write counts as abandoned
+
+# Files whose changes alter how every card looks
+CARD_SOURCES = [
+    'school/templates/school/report_card_base.html',
+    'school/templates/school/print_quarterly.html',
+    'school/templates/school/print_semester.html',
+    'school/templates/school/cards/card_header.html',
+    'school/templates/school/cards/card_summary.html',
+    'school/templates/school/cards/quarterly_card.html',
+    'school/templates/school/cards/semester_card.html',
+    'static/css/report_card.css',
+]
+
+
+def cache_root():
+    return Path(settings.MEDIA_ROOT) / CARD_CACHE_DIR
+
+
+def max_bytes():
+    return getattr(settings, 'REPORT_CARD_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+
+@lru_cache(maxsize=None)
+def layout_version():
+    """Hash of the card templates and stylesheet, read once per process"""
+    digest = hashlib.sha1()
+    for source in CARD_SOURCES:
+        digest.update((settings.BASE_DIR / source).read_bytes())
+    return digest.hexdigest()
+
+
+# ============================================
+# DIGEST
+# ============================================
+
+def _card_rows(kind, period, student):
+    if kind == 'quarterly':
+        results = QuarterlyResult.objects.filter(
+            student=student, quarter=period, status='approved'
+        ).order_by('course__name').values_list(
+            'id', 'course__name', 'course__department_id', 'score', 'position', 'percentile', 'teacher_comment',
+        )
+        rank = ClassRank.objects.filter(student=student, quarter=period)
+    elif kind == 'semester':
+        results = SemesterResult.objects.filter(
+            student=student, semester=period
+        ).order_by('course__name').values_list(
+            'id', 'course__name', 'course__department_id', 'q1_score', 'q2_score', 'total_score',
+            'average_score', 'position', 'percentile', 'class_teacher_comment', 'headteacher_comment',
+        )
+        rank = ClassRank.objects.filter(student=student, semester=period)
+    else:
+        raise ValueError(f'Unknown report card kind: {kind}')
+    rank = rank.values_list('courses', 'total_score', 'average_score', 'position', 'percentile').first()
+    return list(results), rank
+
+
+def card_digest(kind, period, student):
+    """Digest of everything one card is rendered from"""
+    results, rank = _card_rows(kind, period, student)
+    class_ = student.current_class
+    template = active_template(class_.department_id, kind) if class_ else None
+    inputs = (
+        layout_version(),
+        kind, period.pk, str(period),
+        student.pk, student.admission_number, student.get_full_name(), student.gender,
+        student.photo.name if student.photo else '',
+        class_.pk if class_ else None, class_.name if class_ else None,
+        results, rank,
+        # Grades are looked up at render time from each course's department
+        [get_scale(department_id) for department_id in sorted({row[2] for row in results})],
+        (template[0], content_hash(template[1])) if template else None,
+    )
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()
+
+
+# ============================================
+# STORE
+# ============================================
+
+def _student_dir(kind, period_id, student_id):
+    return cache_root() / f'{kind}-{period_id}' / str(student_id)
+
+
+def _disk_usage():
+    root = cache_root()
+    return sum(path.stat().st_size for path in root.rglob('*') if path.is_file()) if root.exists() else 0
+
+
+def _adjust_size(delta):
+    # The running total lives in the shared cache; when it is missing the
+    # tree is measured once, which already includes the change
+    try:
+        return cache.incr(SIZE_KEY, delta)
+    except ValueError:
+        total = _disk_usage()
+        cache.set(SIZE_KEY, total, None)
+        return total
+
+
+def _remove_dirs(directories):
+    removed = 0
+    for directory in directories:
+        if directory.is_dir():
+            removed += sum(path.stat().st_size for path in directory.iterdir())
+            shutil.rmtree(directory, ignore_errors=True)
+    if removed:
+        _adjust_size(-removed)
+    return removed
+
+
+def open_card(kind, period, student, output_format, build, digest=None):
+    """
+    Open a cached card document for reading, rendering it on a miss.
+
+    `build()` returns the document as str (HTML) or bytes (PDF).
+    """
+    digest = digest or card_digest(kind, period, student)
+    directory = _student_dir(kind, period.pk, student.pk)
+    path = directory / f'{digest}.{output_format}'
+    try:
+        os.utime(path)
+        return open(path, 'rb')
+    except FileNotFoundError:
+        pass
+
+    content = build()
+    data = content.encode() if isinstance(content, str) else content
+    directory.mkdir(parents=True, exist_ok=True)
+    # Older versions of this card are never served again
+    replaced = 0
+    for stale in directory.glob(f'*.{output_format}'):
+        replaced += stale.stat().st_size
+        stale.unlink(missing_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}.part')
+    partial.write_bytes(data)
+    partial.replace(path)
+
+    if _adjust_size(len(data) - replaced) > max_bytes():
+        evict(keep=path)
+    return open(path, 'rb')
+
+
+def evict(target=None, keep=None):
+    """
+    Drop the least recently served cards (except `keep`) until the cache fits in `target` bytes.
+
+    `.part` files are writes still in progress in another request and are
+    left alone; ones older than PART_GRACE were abandoned and go first.
+    """
+    target = max_bytes() * EVICT_TO if target is None else target
+    root = cache_root()
+    started = time.time()
+    files = []
+    in_flight = 0
+    if root.exists():
+        for path in root.rglob('*.*'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.suffix == '.part':
+                if stat.st_mtime > started - PART_GRACE:
+                    in_flight += stat.st_size
+                    continue
+                files.append((0, stat.st_size, path))
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    total = in_flight + sum(size for _, size, _ in files)
+    evicted = 0
+    for _, size, path in files:
+        if total <= target:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    cache.set(SIZE_KEY, total, None)
+    return evicted
+
+
+# ============================================
+# INVALIDATION
+# ============================================
+
+def invalidate_cards(kind, period_ids, student_ids):
+    """Drop the cards of some students for some periods of one kind"""
+    root = cache_root()
+    return _remove_dirs(
+        root / f'{kind}-{period_id}' / str(student_id)
+        for period_id in set(period_ids) for student_id in set(student_ids)
+    )
+
+
+def invalidate_student_cards(student_ids):
+    """Drop every card of some students"""
+    root = cache_root()
+    if not root.exists():
+        return 0
+    return _remove_dirs(
+        period_dir / str(student_id)
+        for period_dir in root.iterdir() for student_id in set(student_ids)
+    )
+
+
+def invalidate_result_cards(keys, whole_class=True):
+    """
+    Drop the cards affected by changed quarterly results.
+
+    `keys` are (student_id, course_id, quarter_id) tuples. Approvals move
+    positions, so by default the cards of every classmate are dropped too.
+    """
+    student_ids = {student_id for student_id, _, _ in keys}
+    quarter_ids = {quarter_id for _, _, quarter_id in keys}
+    if whole_class:
+        class_ids = Student.objects.filter(pk__in=student_ids).values_list('current_class_id', flat=True)
+        student_ids |= set(Student.objects.filter(current_class_id__in=class_ids).values_list('pk', flat=True))
+    semester_ids = Semester.objects.filter(
+        Q(quarter_1_id__in=quarter_ids) | Q(quarter_2_id__in=quarter_ids)
+    ).values_list('pk', flat=True)
+    return (
+        invalidate_cards('quarterly', quarter_ids, student_ids)
+        + invalidate_cards('semester', semester_ids, student_ids)
+    )
+
+
+def invalidate_department_cards(department_id, kind):
+    """Drop one kind of card for every student of a department (template edits)"""
+    root = cache_root()
+    if not root.exists():
+        return 0
+    student_ids = set(Student.objects.filter(
+        current_class__department_id=department_id
+    ).values_list('pk', flat=True))
+    return _remove_dirs(
+        period_dir / str(student_id)
+        for period_dir in root.glob(f'{kind}-*') for student_id in student_ids
+    )
@@ -0,0 +1,152 @@
+# school/class_stats.py
+import statistics
+import time
+
+from django.core.cache import cache
+
+from .grading import get_scale, grade_scores, pass_mark
+from .models import QuarterlyResult, SemesterResult, Student
+
+
+# ============================================
+# CLASS PERFORMANCE STATISTICS
+# ============================================
+#
+# Every score of a class for a quarter or a semester is read in one query
+# and summarised per course, per student and for the whole class: mean,
+# median, standard deviation, min, max, pass rate and grade histogram.
+# Grades and pass marks come from the scale of each course's department.
+#
+# Summaries are cached per (class, period) behind a version stamp of the
+# class, which approvals and result edits in that class move on.
+
+STATS_TIMEOUT = 60 * 60 * 24
+STATS_PERIODS = ['quarter', 'semester']
+GLOBAL_VERSION_KEY = 'class_stats:version'
+
+
+def _class_version_key(class_id):
+    return f'class_stats:version:{class_id}'
+
+
+def invalidate_class_statistics(class_ids=None):
+    """Retire the cached statistics of some classes, or of every class"""
+    if class_ids is None:
+        cache.set(GLOBAL_VERSION_KEY, time.time_ns(), None)
+        return
+    cache.set_many({_class_version_key(class_id): time.time_ns() for class_id in class_ids}, None)
+
+
+def invalidate_student_classes(student_ids):
+    """Retire the statistics of the classes some students are in"""
+    invalidate_class_statistics(set(
+        Student.objects.filter(pk__in=set(student_ids), current_class__isnull=False)
+        .values_list('current_class_id', flat=True)
+    ))
+
+
+def class_scores(class_id, period, period_id):
+    """Scores of a class's active students for a quarter (approved) or a semester"""
+    if period == 'quarter':
+        results, score_field = QuarterlyResult.objects.filter(quarter_id=period_id, status='approved'), 'score'
+    elif period == 'semester':
+        results, score_field = SemesterResult.objects.filter(semester_id=period_id), 'average_score'
+    else:
+        raise ValueError(f'Unknown statistics period: {period}')
+    return results.filter(student__current_class_id=class_id, student__is_active=True).values_list(
+        'student_id', 'student__admission_number', 'student__first_name', 'student__last_name',
+        'course_id', 'course__code', 'course__name', 'course__department_id', score_field,
+    )
+
+
+def _histogram(labels, grades):
+    # Best grade first, every label of the scale present
+    counts = dict.fromkeys(reversed(labels), 0)
+    for grade in grades:
+        counts[grade] = counts.get(grade, 0) + 1
+    return [{'grade': label, 'count': count} for label, count in counts.items()]
+
+
+def summarise(scores, grades, passed, labels):
+    """Summary of one group of scores with their grades and pass flags"""
+    values = [float(score) for score in scores]
+    return {
+        'count': len(values),
+        'mean': round(statistics.fmean(values), 2),
+        'median': round(statistics.median(values), 2),
+        'stdev': round(statistics.pstdev(values), 2),
+        'min': min(values),
+        'max': max(values),
+        'pass_rate': round(100 * sum(passed) / len(values), 1),
+        'grades': _histogram(labels, grades),
+    }
+
+
+def build_class_statistics(class_id, period, period_id):
+    """Per-course, per-student and whole-class summaries from one query"""
+    courses = {}
+    students = {}
+    for (student_id, admission_number, first_name, last_name,
+         course_id, code, name, department_id, score) in class_scores(class_id, period, period_id):
+        course = courses.setdefault(course_id, {
+            'id': course_id, 'code': code, 'name': name, 'department_id': department_id,
+            'student_ids': [], 'scores': [],
+        })
+        course['student_ids'].append(student_id)
+        course['scores'].append(score)
+        students.setdefault(student_id, {
+            'id': student_id, 'admission_number': admission_number, 'name': f'{first_name} {last_name}',
+            'scores': [], 'grades': [], 'passed': [],
+        })
+
+    labels = []
+    everything = {'scores': [], 'grades': [], 'passed': []}
+    for course in courses.values():
+        # Grades and the pass mark depend on the course's department only
+        course_labels = get_scale(course['department_id'])[1]
+        labels += [label for label in course_labels if label not in labels]
+        grades = grade_scores(course['scores'], course['department_id'])
+        mark = pass_mark(course['department_id'])
+        passed = [score >= mark for score in course['scores']]
+        course['summary'] = summarise(course['scores'], grades, passed, course_labels)
+        for student_id, score, grade, ok in zip(course['student_ids'], course['scores'], grades, passed):
+            student = students[student_id]
+            student['scores'].append(score)
+            student['grades'].append(grade)
+            student['passed'].append(ok)
+        everything['scores'] += course['scores']
+        everything['grades'] += grades
+        everything['passed'] += passed
+
+    return {
+        'class': summarise(everything['scores'], everything['grades'], everything['passed'], labels)
+        if everything['scores'] else None,
+        'courses': [
+            {key: course[key] for key in ('id', 'code', 'name')} | course['summary']
+            for course in sorted(courses.values(), key=lambda c: c['name'])
+        ],
+        'students': sorted(
+            (
+                {key: student[key] for key in ('id', 'admission_number', 'name')}
+                | summarise(student['scores'], student['grades'], student['passed'], labels)
+                for student in students.values()
+            ),
+            key=lambda s: (-s['mean'], s['name']),
+        ),
+    }
+
+
+def class_version(class_id):
+    """Version stamp of a class's results, moved on by approvals and edits in it"""
+    version = cache.get_or_set(GLOBAL_VERSION_KEY, time.time_ns, None)
+    return f'{version}:{cache.get_or_set(_class_version_key(class_id), time.time_ns, None)}'
+
+
+def get_class_statistics(class_id, period, period_id):
+    """Cached statistics of one class and period"""
+    key = f'class_stats:{class_version(class_id)}:{class_id}:{period}:{period_id}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = build_class_statistics(class_id, period, period_id)
+        cache.set(key, stats, STATS_TIMEOUT)
+    return stats
@@ -0,0 +1,168 @@
+# school/cube.py
+import math
+from decimal import Decimal
+
+from django.db import transaction
+
+from .grading import grader
+from .models import QuarterlyResult, ResultAggregate, Student
+
+
+# ============================================
+# RESULT CUBE
+# ============================================
+#
+# ResultAggregate holds one cell per (department, class, course, teacher,
+# quarter) with the count, sum, sum of squares, min, max and grade counts
+# of the approved scores in it. Means and standard deviations of any
+# roll-up follow from the sums, so reports group a few hundred cells
+# instead of every result row.
+#
+# Cells are placed by the student's current class. Approvals and result
+# edits recompute only the cells of the (class, course, quarter) they touch.
+
+# Roll-up level -> (cell field, fields naming a group)
+CUBE_DIMENSIONS = {
+    'department': ('department_id', ['department__name']),
+    'class': ('class_assigned_id', ['class_assigned__name']),
+    'course': ('course_id', ['course__code', 'course__name']),
+    'teacher': ('teacher_id', ['teacher__first_name', 'teacher__last_name']),
+    'quarter': ('quarter_id', ['quarter__academic_year__name', 'quarter__name']),
+}
+
+ROW_FIELDS = [
+    'student__current_class__department_id', 'student__current_class_id', 'course_id', 'teacher_id',
+    'quarter_id', 'course__department_id', 'score',
+]
+
+
+def _cells(rows):
+    """Cube cells from ROW_FIELDS tuples"""
+    cells = {}
+    graders = {}
+    for department_id, class_id, course_id, teacher_id, quarter_id, course_department_id, score in rows:
+        key = (department_id, class_id, course_id, teacher_id, quarter_id)
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = ResultAggregate(
+                department_id=department_id, class_assigned_id=class_id, course_id=course_id,
+                teacher_id=teacher_id, quarter_id=quarter_id,
+                score_sum=Decimal(0), score_squares=Decimal(0), min_score=score, max_score=score,
+            )
+        cell.count += 1
+        cell.score_sum += score
+        cell.score_squares += score * score
+        cell.min_score = min(cell.min_score, score)
+        cell.max_score = max(cell.max_score, score)
+        # Grades follow the course's department, like everywhere else
+        if course_department_id not in graders:
+            graders[course_department_id] = grader(course_department_id)
+        grade = graders[course_department_id](score)
+        cell.grade_counts[grade] = cell.grade_counts.get(grade, 0) + 1
+    return list(cells.values())
+
+
+def _approved_rows(**filters):
+    return QuarterlyResult.objects.filter(
+        status='approved', student__current_class__isnull=False, **filters
+    ).values_list(*ROW_FIELDS)
+
+
+def refresh_cells(class_ids=None, course_ids=None, quarter_ids=None):
+    """Recompute every cell in the given classes x courses x quarters (None = all)"""
+    cell_filters = {}
+    row_filters = {}
+    if class_ids is not None:
+        cell_filters['class_assigned_id__in'] = row_filters['student__current_class_id__in'] = set(class_ids)
+    if course_ids is not None:
+        cell_filters['course_id__in'] = row_filters['course_id__in'] = set(course_ids)
+    if quarter_ids is not None:
+        cell_filters['quarter_id__in'] = row_filters['quarter_id__in'] = set(quarter_ids)
+
+    cells = _cells(_approved_rows(**row_filters).iterator(chunk_size=2000))
+    with transaction.atomic():
+        ResultAggregate.objects.filter(**cell_filters).delete()
+        ResultAggregate.objects.bulk_create(cells, batch_size=500)
+    return len(cells)
+
+
+def refresh_cube(keys):
+    """Recompute the cells fed by changed (student_id, course_id, quarter_id) keys"""
+    keys = list(keys)
+    class_ids = set(
+        Student.objects.filter(pk__in={student_id for student_id, _, _ in keys}, current_class__isnull=False)
+        .values_list('current_class_id', flat=True)
+    )
+    if not class_ids:
+        return 0
+    return refresh_cells(
+        class_ids,
+        {course_id for _, course_id, _ in keys},
+        {quarter_id for _, _, quarter_id in keys},
+    )
+
+
+def rebuild_cube():
+    """Rebuild the whole cube from the approved results"""
+    return refresh_cells()
+
+
+# ============================================
+# ROLL-UPS
+# ============================================
+
+def _summary(group):
+    count = group['count']
+    mean = group['score_sum'] / count
+    # Population variance from the sums; clamp rounding noise below zero
+    variance = max(float(group['score_squares'] / count - mean * mean), 0.0)
+    return {
+        **group,
+        'mean': mean.quantize(Decimal('0.01')),
+        'stdev': round(math.sqrt(variance), 2),
+        'grades': sorted(group['grade_counts'].items()),
+    }
+
+
+def rollup(by, **filters):
+    """
+    Cube totals grouped by some CUBE_DIMENSIONS, best mean first.
+
+    `filters` narrow on dimensions, e.g. rollup(['course'], quarter=3, department=1).
+    """
+    group_fields = []
+    label_fields = []
+    for level in by:
+        field, names = CUBE_DIMENSIONS[level]
+        group_fields += [field] + names
+        label_fields.append(names)
+    cells = ResultAggregate.objects.filter(**{
+        CUBE_DIMENSIONS[level][0]: value for level, value in filters.items()
+    }).values_list(*group_fields, 'count', 'score_sum', 'score_squares', 'min_score', 'max_score', 'grade_counts')
+
+    groups = {}
+    width = len(group_fields)
+    for row in cells:
+        key = row[:width]
+        count, score_sum, score_squares, min_score, max_score, grade_counts = row[width:]
+        group = groups.get(key)
+        if group is None:
+            values = dict(zip(group_fields, key))
+            group = groups[key] = {
+                **values,
+                'label': ' / '.join(
+                    ' '.join(str(values[name]) for name in names if values[name] is not None) or '-'
+                    for names in label_fields
+                ),
+                'count': 0, 'score_sum': Decimal(0), 'score_squares': Decimal(0),
+                'min_score': min_score, 'max_score': max_score, 'grade_counts': {},
+            }
+        group['count'] += count
+        group['score_sum'] += score_sum
+        group['score_squares'] += score_squares
+        group['min_score'] = min(group['min_score'], min_score)
+        group['max_score'] = max(group['max_score'], max_score)
+        for grade, graded in grade_counts.items():
+            group['grade_counts'][grade] = group['grade_counts'].get(grade, 0) + graded
+
+    return sorted((_summary(group) for group in groups.values()), key=lambda g: -g['mean'])
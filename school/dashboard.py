@@ -0,0 +1,148 @@
+# school/dashboard.py
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, F, FilteredRelation, Q
+
+from .models import (
+    Class, Course, Department, Quarter, QuarterlyResult, Student, TeacherAssignment, User,
+)
+
+
+# ============================================
+# ADMIN DASHBOARD STATISTICS
+# ============================================
+
+ADMIN_STATS_KEY = 'dashboard:admin_stats'
+ADMIN_STATS_TIMEOUT = 60 * 5
+
+
+def compute_admin_stats():
+    """Every dashboard count, one aggregate of filtered counts per table"""
+    stats = QuarterlyResult.objects.aggregate(
+        pending_results=Count('pk', filter=Q(status='submitted')),
+        total_results=Count('pk', filter=Q(status='approved')),
+    )
+    stats.update(Student.objects.aggregate(total_students=Count('pk', filter=Q(is_active=True))))
+    stats.update(User.objects.aggregate(total_teachers=Count('pk', filter=Q(role__in=['teacher', 'class_teacher']))))
+    stats.update(Quarter.objects.aggregate(active_quarters=Count('pk', filter=Q(is_active=True))))
+    stats.update(Class.objects.aggregate(total_classes=Count('pk')))
+    stats.update(Department.objects.aggregate(total_departments=Count('pk')))
+    stats.update(Course.objects.aggregate(total_courses=Count('pk')))
+    return stats
+
+
+def get_admin_stats():
+    """Cached snapshot of the admin dashboard counts"""
+    stats = cache.get(ADMIN_STATS_KEY)
+    if stats is None:
+        stats = compute_admin_stats()
+        cache.set(ADMIN_STATS_KEY, stats, ADMIN_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_admin_stats():
+    cache.delete(ADMIN_STATS_KEY)
+
+
+# ============================================
+# STUDENT LIST COUNTS
+# ============================================
+#
+# Filtered student counts are cached under a key that embeds a version
+# stamp. Replacing the stamp retires every cached count at once.
+
+STUDENT_COUNT_VERSION_KEY = 'students:count_version'
+
+
+def student_count_key(filters):
+    version = cache.get_or_set(STUDENT_COUNT_VERSION_KEY, time.time_ns, None)
+    params = '&'.join(f'{name}={value}' for name, value in sorted(filters.items()))
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'students:count:{version}:{digest}'
+
+
+def invalidate_student_counts():
+    cache.set(STUDENT_COUNT_VERSION_KEY, time.time_ns(), None)
+
+
+# ============================================
+# TEACHER PROGRESS MATRIX
+# ============================================
+
+TEACHER_PROGRESS_TIMEOUT = 60 * 10
+RESULT_STATUSES = ['draft', 'submitted', 'approved', 'rejected']
+
+
+def teacher_progress_key(teacher_id):
+    return f'dashboard:teacher_progress:{teacher_id}'
+
+
+def compute_teacher_progress(teacher_id, quarter):
+    """
+    Result-entry progress of every assignment of a teacher for `quarter`.
+
+    Roster size and per-status counts come from one grouped query; the
+    quarter's results are joined on (student, course) so only matching
+    rows take part in the counts.
+    """
+    active = Q(class_assigned__students__is_active=True)
+    assignments = TeacherAssignment.objects.filter(teacher_id=teacher_id).select_related(
+        'class_assigned', 'course'
+    ).order_by('class_assigned__name', 'course__name')
+
+    if quarter is not None:
+        assignments = assignments.annotate(
+            quarter_results=FilteredRelation(
+                'class_assigned__students__results',
+                condition=Q(
+                    class_assigned__students__results__quarter=quarter,
+                    class_assigned__students__results__course=F('course'),
+                ),
+            ),
+        ).annotate(
+            roster=Count('class_assigned__students', filter=active, distinct=True),
+            entered=Count('quarter_results', filter=active),
+            **{
+                status: Count('quarter_results', filter=active & Q(quarter_results__status=status))
+                for status in RESULT_STATUSES
+            }
+        )
+    else:
+        assignments = assignments.annotate(
+            roster=Count('class_assigned__students', filter=active, distinct=True),
+        )
+
+    rows = []
+    for assignment in assignments:
+        row = {
+            'id': assignment.pk,
+            'class_id': assignment.class_assigned_id,
+            'class_name': assignment.class_assigned.name,
+            'course_id': assignment.course_id,
+            'course_name': assignment.course.name,
+            'course_code': assignment.course.code,
+            'roster': assignment.roster,
+            'entered': getattr(assignment, 'entered', 0),
+        }
+        for status in RESULT_STATUSES:
+            row[status] = getattr(assignment, status, 0)
+        row['missing'] = max(row['roster'] - row['entered'], 0)
+        rows.append(row)
+    return rows
+
+
+def get_teacher_progress(teacher_id, quarter):
+    """Cached progress matrix of one teacher for the active quarter"""
+    key = teacher_progress_key(teacher_id)
+    cached = cache.get(key)
+    quarter_id = quarter.pk if quarter else None
+    if cached is None or cached['quarter_id'] != quarter_id:
+        cached = {'quarter_id': quarter_id, 'rows': compute_teacher_progress(teacher_id, quarter)}
+        cache.set(key, cached, TEACHER_PROGRESS_TIMEOUT)
+    return cached['rows']
+
+
+def invalidate_teacher_progress(teacher_ids):
+    cache.delete_many([teacher_progress_key(teacher_id) for teacher_id in teacher_ids if teacher_id])
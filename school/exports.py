@@ -0,0 +1,275 @@
+# school/exports.py
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from .models import QuarterlyResult, SemesterResult
+
+
+# ============================================
+# RESULT EXPORTS
+# ============================================
+#
+# Exports stream: rows come from values_list(...).iterator(chunk_size) and
+# leave as CSV or XLSX chunks as soon as a batch is formatted, so memory
+# stays flat however many rows are exported. The same chunks feed a
+# StreamingHttpResponse or a file on disk.
+#
+# XLSX is written without a spreadsheet library: a workbook is a ZIP of a
+# few XML parts, and zipfile can write one to a stream that cannot seek.
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# kind -> model, {filter name: field}, [(header, field), ...], ordering
+EXPORTS = {
+    'quarterly': {
+        'model': QuarterlyResult,
+        'filters': {
+            'quarter': 'quarter_id', 'class': 'student__current_class_id', 'course': 'course_id', 'status': 'status',
+        },
+        'columns': [
+            ('Admission No.', 'student__admission_number'),
+            ('First Name', 'student__first_name'),
+            ('Last Name', 'student__last_name'),
+            ('Class', 'student__current_class__name'),
+            ('Course Code', 'course__code'),
+            ('Course', 'course__name'),
+            ('Academic Year', 'quarter__academic_year__name'),
+            ('Quarter', 'quarter__name'),
+            ('Score', 'score'),
+            ('Position', 'position'),
+            ('Status', 'status'),
+            ('Teacher', 'teacher__username'),
+            ('Comment', 'teacher_comment'),
+        ],
+        'ordering': ['student__current_class__name', 'student__last_name', 'student__first_name', 'student_id', 'course__code'],
+    },
+    'semester': {
+        'model': SemesterResult,
+        'filters': {
+            'semester': 'semester_id', 'class': 'student__current_class_id', 'course': 'course_id',
+        },
+        'columns': [
+            ('Admission No.', 'student__admission_number'),
+            ('First Name', 'student__first_name'),
+            ('Last Name', 'student__last_name'),
+            ('Class', 'student__current_class__name'),
+            ('Course Code', 'course__code'),
+            ('Course', 'course__name'),
+            ('Academic Year', 'semester__academic_year__name'),
+            ('Semester', 'semester__name'),
+            ('Q1 Score', 'q1_score'),
+            ('Q2 Score', 'q2_score'),
+            ('Total', 'total_score'),
+            ('Average', 'average_score'),
+            ('Position', 'position'),
+        ],
+        'ordering': ['student__current_class__name', 'student__last_name', 'student__first_name', 'student_id', 'course__code'],
+    },
+}
+
+
+# Every filter but the status is an id
+STATUS_VALUES = [value for value, _ in QuarterlyResult.STATUS_CHOICES]
+
+
+def clean_filter(name, value):
+    """A filter value checked and converted for the query, or ValueError"""
+    value = str(value).strip()
+    if name == 'status':
+        if value not in STATUS_VALUES:
+            raise ValueError('status must be one of ' + ', '.join(STATUS_VALUES))
+        return value
+    if not value.isdigit():
+        raise ValueError(f'{name} must be an id')
+    return int(value)
+
+
+def export_filters(kind, params):
+    """
+    Known filters of an export kind picked out of request-style params.
+
+    Raises ValueError for a value that is not an id (or a known status),
+    so nothing unchecked reaches the query or the file name.
+    """
+    names = EXPORTS[kind]['filters']
+    return {
+        name: clean_filter(name, params[name])
+        for name in names if params.get(name) not in (None, '')
+    }
+
+
+def export_rows(kind, filters):
+    """(headers, row iterator) of an export, `filters` keyed by filter name"""
+    export = EXPORTS[kind]
+    queryset = export['model'].objects.filter(**{
+        export['filters'][name]: value for name, value in filters.items()
+    }).order_by(*export['ordering'])
+    headers = [header for header, _ in export['columns']]
+    rows = queryset.values_list(*[field for _, field in export['columns']]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return headers, rows
+
+
+def _batches(rows, size=EXPORT_CHUNK_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ============================================
+# CSV
+# ============================================
+
+def csv_chunks(headers, rows):
+    """Encoded CSV, one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # The BOM makes spreadsheet programs read the file as UTF-8
+    writer.writerow(headers)
+    yield ('\ufeff' + buffer.getvalue()).encode()
+    for batch in _batches(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+
+
+# ============================================
+# XLSX
+# ============================================
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+# Characters XML 1.0 cannot carry
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values):
+    return '<row>' + ''.join(_cell(value) for value in values) + '</row>'
+
+
+class _Sink:
+    """Write-only stream that hands over whatever zipfile wrote since the last take()"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def xlsx_chunks(headers, rows, sheet='Results'):
+    """A one-sheet XLSX workbook, streamed as it is compressed"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content.replace('{sheet}', escape(sheet)))
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as part:
+            part.write((SHEET_START + _row(headers)).encode())
+            for batch in _batches(rows):
+                part.write(''.join(_row(row) for row in batch).encode())
+                yield sink.take()
+            part.write(SHEET_END.encode())
+    yield sink.take()
+
+
+# ============================================
+# ENTRY POINTS
+# ============================================
+
+def export_chunks(kind, filters, output_format):
+    """Byte chunks of an export in 'csv' or 'xlsx'"""
+    if kind not in EXPORTS:
+        raise ValueError(f'Unknown export: {kind}')
+    headers, rows = export_rows(kind, filters)
+    if output_format == 'csv':
+        return csv_chunks(headers, rows)
+    if output_format == 'xlsx':
+        return xlsx_chunks(headers, rows, sheet=f'{kind.capitalize()} Results')
+    raise ValueError(f'Unknown export format: {output_format}')
+
+
+def export_filename(kind, filters, output_format):
+    parts = [f'{kind}-results'] + [f'{name}-{value}' for name, value in sorted(filters.items())]
+    return '_'.join(parts) + f'.{output_format}'
+
+
+def write_export(kind, filters, output_format, path):
+    """Write an export straight to a file, returning its size in bytes"""
+    size = 0
+    with open(path, 'wb') as output:
+        for chunk in export_chunks(kind, filters, output_format):
+            output.write(chunk)
+            size += len(chunk)
+    return size
@@ -1,7 +1,37 @@
 # school/forms.py
 from django import forms
+from django.template import TemplateSyntaxError, engines
+from django.urls import reverse_lazy
 from .models import *
 
+
+class RemoteSelect(forms.Select):
+    """Select that renders only the chosen option and loads the rest on demand"""
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    class Media:
+        js = ['js/autocomplete.js']
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse_lazy('school:autocomplete', args=[self.kind])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Only the selected row is queried, never the whole table
+        all_choices = self.choices
+        selected = [v for v in value if str(v).isdigit()]
+        self.choices = [('', all_choices.field.empty_label or '')] + [
+            all_choices.choice(obj) for obj in all_choices.queryset.filter(pk__in=selected)
+        ]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
+
 class StudentForm(forms.ModelForm):
     class Meta:
         model = Student
@@ -17,7 +47,7 @@ class StudentForm(forms.ModelForm):
             'middle_name': forms.TextInput(attrs={'class': 'form-control'}),
             'gender': forms.Select(attrs={'class': 'form-control'}),
             'date_of_birth': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'current_class': forms.Select(attrs={'class': 'form-control'}),
+            'current_class': RemoteSelect('classes', attrs={'class': 'form-control'}),
             'photo': forms.FileInput(attrs={'class': 'form-control'}),
             'guardian_name': forms.TextInput(attrs={'class': 'form-control'}),
             'guardian_phone': forms.TextInput(attrs={'class': 'form-control'}),
@@ -53,7 +83,7 @@ class ClassForm(forms.ModelForm):
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'department': forms.Select(attrs={'class': 'form-control'}),
-            'class_teacher': forms.Select(attrs={'class': 'form-control'}),
+            'class_teacher': RemoteSelect('teachers', attrs={'class': 'form-control'}),
             'academic_year': forms.Select(attrs={'class': 'form-control'}),
             'capacity': forms.NumberInput(attrs={'class': 'form-control'}),
         }
@@ -74,9 +104,9 @@ class TeacherAssignmentForm(forms.ModelForm):
         model = TeacherAssignment
         fields = ['teacher', 'course', 'class_assigned', 'academic_year']
         widgets = {
-            'teacher': forms.Select(attrs={'class': 'form-control'}),
-            'course': forms.Select(attrs={'class': 'form-control'}),
-            'class_assigned': forms.Select(attrs={'class': 'form-control'}),
+            'teacher': RemoteSelect('teachers', attrs={'class': 'form-control'}),
+            'course': RemoteSelect('courses', attrs={'class': 'form-control'}),
+            'class_assigned': RemoteSelect('classes', attrs={'class': 'form-control'}),
             'academic_year': forms.Select(attrs={'class': 'form-control'}),
         }
 
@@ -135,4 +165,12 @@ class ResultTemplateForm(forms.ModelForm):
             'template_type': forms.Select(attrs={'class': 'form-control'}),
             'html_content': forms.Textarea(attrs={'class': 'form-control', 'rows': 10}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
-        }
\ No newline at end of file
+        }
+
+    def clean_html_content(self):
+        html = self.cleaned_data['html_content']
+        try:
+            engines['django'].from_string(html)
+        except TemplateSyntaxError as e:
+            raise forms.ValidationError(f'Template error: {e}')
+        return html
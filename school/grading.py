@@ -0,0 +1,124 @@
+# school/grading.py
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.core.cache import cache
+
+
+# ============================================
+# GRADE SCALES
+# ============================================
+
+# Used for departments without a GradeScale: (min_score, label), ascending
+DEFAULT_SCALE = (
+    (Decimal('0'), 'F'),
+    (Decimal('60'), 'D'),
+    (Decimal('70'), 'C'),
+    (Decimal('80'), 'B'),
+    (Decimal('90'), 'A'),
+)
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _split(boundaries):
+    return tuple(b[0] for b in boundaries), tuple(b[1] for b in boundaries)
+
+
+_DEFAULT = _split(DEFAULT_SCALE)
+
+
+# Scales are also memoized in each process. The shared cache holds a
+# version stamp that every invalidation bumps; a process compares it with
+# the stamp its memo was built under at most every LOCAL_CHECK_INTERVAL
+# seconds, so grading a page of rows costs no cache reads at all.
+LOCAL_CHECK_INTERVAL = 5
+VERSION_KEY = 'grade_scale:version'
+
+_local = {'scales': {}, 'version': None, 'checked_at': None}
+
+
+def scale_cache_key(department_id):
+    return f'grade_scale:{department_id}'
+
+
+def _local_scales():
+    """This process's memo of scales, emptied when another process invalidated one"""
+    now = time.monotonic()
+    if _local['checked_at'] is None or now - _local['checked_at'] >= LOCAL_CHECK_INTERVAL:
+        version = cache.get(VERSION_KEY)
+        if version != _local['version']:
+            _local['scales'] = {}
+            _local['version'] = version
+        _local['checked_at'] = now
+    return _local['scales']
+
+
+def get_scale(department_id):
+    """
+    Sorted (min_scores, labels) for a department.
+
+    Built once from the department's GradeBoundary rows and kept in the
+    cache until invalidate_scale() is called for that department.
+    """
+    if department_id is None:
+        return _DEFAULT
+
+    scales = _local_scales()
+    scale = scales.get(department_id)
+    if scale is not None:
+        return scale
+
+    key = scale_cache_key(department_id)
+    scale = cache.get(key)
+    if scale is None:
+        from .models import GradeBoundary
+
+        boundaries = GradeBoundary.objects.filter(
+            scale__department_id=department_id
+        ).order_by('min_score').values_list('min_score', 'label')
+        scale = _split(boundaries) if boundaries else _DEFAULT
+        cache.set(key, scale, CACHE_TIMEOUT)
+    scales[department_id] = scale
+    return scale
+
+
+def invalidate_scale(department_id):
+    """Drop the cached scale of one department, here and in every other process"""
+    cache.delete(scale_cache_key(department_id))
+    version = time.time_ns()
+    cache.set(VERSION_KEY, version, None)
+    _local.update(scales={}, version=version, checked_at=time.monotonic())
+
+
+def _lookup(score, min_scores, labels):
+    if score is None:
+        return ''
+    index = bisect_right(min_scores, score) - 1
+    # Scores below the lowest boundary get the lowest grade
+    return labels[max(index, 0)]
+
+
+def grade_for(score, department_id=None):
+    """Grade label for one score"""
+    min_scores, labels = get_scale(department_id)
+    return _lookup(score, min_scores, labels)
+
+
+def grade_scores(scores, department_id=None):
+    """Grade labels for a whole sequence of scores with one scale lookup"""
+    min_scores, labels = get_scale(department_id)
+    return [_lookup(score, min_scores, labels) for score in scores]
+
+
+def grader(department_id=None):
+    """Grade function of one department, with its scale looked up once"""
+    min_scores, labels = get_scale(department_id)
+    return lambda score: _lookup(score, min_scores, labels)
+
+
+def pass_mark(department_id=None):
+    """Lowest passing score: anything above the bottom grade of the scale passes"""
+    min_scores, _ = get_scale(department_id)
+    return min_scores[1] if len(min_scores) > 1 else min_scores[0]
@@ -0,0 +1,186 @@
+# school/history.py
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .grading import grade_for
+from .models import Quarter, QuarterlyResult, Semester
+
+
+# ============================================
+# STUDENT ACADEMIC HISTORY
+# ============================================
+#
+# A student's approved results pivoted to course x quarter for each
+# academic year, with semester and annual averages and the change from one
+# quarter to the next. The projection holds plain values so it can be
+# cached and served as JSON. It is keyed on the count and latest
+# updated_at of the student's results, so any change yields a new key.
+
+HISTORY_TIMEOUT = 60 * 60 * 24
+TWO_PLACES = Decimal('0.01')
+
+
+def _average(scores):
+    scores = [score for score in scores if score is not None]
+    if not scores:
+        return None
+    return (sum(scores) / len(scores)).quantize(TWO_PLACES)
+
+
+def _delta(current, previous):
+    if current is None or previous is None:
+        return None
+    return current - previous
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def build_student_history(student_id):
+    """Build the history projection from one pass over the student's results"""
+    rows = QuarterlyResult.objects.filter(student_id=student_id, status='approved').values_list(
+        'score', 'quarter_id', 'quarter__name', 'quarter__academic_year_id', 'quarter__academic_year__name',
+        'quarter__academic_year__start_date', 'course_id', 'course__code', 'course__name', 'course__department_id',
+    )
+
+    years = {}
+    for (score, quarter_id, quarter_name, year_id, year_name, year_start,
+         course_id, course_code, course_name, department_id) in rows:
+        year = years.setdefault(year_id, {
+            'id': year_id, 'name': year_name, 'start': year_start, 'quarters': {}, 'courses': {},
+        })
+        year['quarters'][quarter_id] = quarter_name
+        course = year['courses'].setdefault(course_id, {
+            'id': course_id, 'code': course_code, 'name': course_name,
+            'department_id': department_id, 'scores': {},
+        })
+        course['scores'][quarter_id] = score
+
+    semesters = Semester.objects.filter(academic_year_id__in=years.keys()).order_by('name')
+    display = dict(Quarter.QUARTER_CHOICES)
+
+    history = []
+    previous_scores = {}
+    previous_average = None
+    for year in sorted(years.values(), key=lambda y: y['start']):
+        quarter_ids = sorted(year['quarters'], key=lambda pk: year['quarters'][pk])
+        year_semesters = [s for s in semesters if s.academic_year_id == year['id']]
+
+        courses = []
+        for course in sorted(year['courses'].values(), key=lambda c: c['name']):
+            scores = [course['scores'].get(pk) for pk in quarter_ids]
+            deltas = []
+            for score in scores:
+                deltas.append(_delta(score, previous_scores.get(course['id'])))
+                if score is not None:
+                    previous_scores[course['id']] = score
+            semester_averages = []
+            for semester in year_semesters:
+                pair = [course['scores'].get(semester.quarter_1_id), course['scores'].get(semester.quarter_2_id)]
+                # Like SemesterResult, a semester needs both quarters approved
+                semester_averages.append(_average(pair) if None not in pair else None)
+            courses.append({
+                'id': course['id'],
+                'code': course['code'],
+                'name': course['name'],
+                'department_id': course['department_id'],
+                'scores': scores,
+                'deltas': deltas,
+                'semesters': semester_averages,
+                'annual': _average(scores),
+            })
+
+        quarter_averages = [_average([c['scores'][i] for c in courses]) for i in range(len(quarter_ids))]
+        quarter_deltas = []
+        for average in quarter_averages:
+            quarter_deltas.append(_delta(average, previous_average))
+            if average is not None:
+                previous_average = average
+
+        history.append({
+            'id': year['id'],
+            'name': year['name'],
+            'quarters': [
+                {'id': pk, 'name': year['quarters'][pk], 'label': display.get(year['quarters'][pk])}
+                for pk in quarter_ids
+            ],
+            'semesters': [
+                {
+                    'id': semester.pk,
+                    'name': semester.get_name_display(),
+                    'average': _average([c['semesters'][i] for c in courses]),
+                }
+                for i, semester in enumerate(year_semesters)
+            ],
+            'courses': courses,
+            'quarter_averages': quarter_averages,
+            'quarter_deltas': quarter_deltas,
+            'annual_average': _average(quarter_averages),
+        })
+    return history
+
+
+def history_cache_key(student_id):
+    """Cache key that changes whenever any of the student's results changes"""
+    stamp = QuarterlyResult.objects.filter(student_id=student_id).aggregate(
+        count=Count('id'), latest=Max('updated_at'),
+    )
+    latest = stamp['latest'].timestamp() if stamp['latest'] else 0
+    return f"student_history:{student_id}:{stamp['count']}:{latest}"
+
+
+def get_student_history(student_id):
+    """Cached history projection of one student"""
+    key = history_cache_key(student_id)
+    history = cache.get(key)
+    if history is None:
+        history = build_student_history(student_id)
+        cache.set(key, history, HISTORY_TIMEOUT)
+    return history
+
+
+def with_grades(history):
+    """
+    Add grade labels to a history projection (scales may change
+    independently of the results), plus per-quarter cells for templates.
+    """
+    for year in history:
+        for course in year['courses']:
+            course['grades'] = [grade_for(score, course['department_id']) for score in course['scores']]
+            course['annual_grade'] = grade_for(course['annual'], course['department_id'])
+            course['cells'] = [
+                {'score': score, 'grade': grade, 'delta': delta}
+                for score, grade, delta in zip(course['scores'], course['grades'], course['deltas'])
+            ]
+        year['average_cells'] = [
+            {'score': average, 'delta': delta}
+            for average, delta in zip(year['quarter_averages'], year['quarter_deltas'])
+        ]
+    return history
+
+
+def history_as_json(history):
+    """History with Decimals turned into numbers, for JsonResponse"""
+    return [
+        {
+            **{key: value for key, value in year.items() if key != 'average_cells'},
+            'semesters': [{**s, 'average': _number(s['average'])} for s in year['semesters']],
+            'courses': [
+                {
+                    **{key: value for key, value in course.items() if key != 'cells'},
+                    'scores': [_number(v) for v in course['scores']],
+                    'deltas': [_number(v) for v in course['deltas']],
+                    'semesters': [_number(v) for v in course['semesters']],
+                    'annual': _number(course['annual']),
+                }
+                for course in year['courses']
+            ],
+            'quarter_averages': [_number(v) for v in year['quarter_averages']],
+            'quarter_deltas': [_number(v) for v in year['quarter_deltas']],
+            'annual_average': _number(year['annual_average']),
+        }
+        for year in history
+    ]
@@ -0,0 +1,254 @@
+# school/jobs.py
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .activity import record_activity
+from .leaderboards import rebuild_leaderboards, refresh_leaderboards
+from .models import Job, Semester, SemesterDirtyKey, Student, User
+from .ranking import refresh_semester_ranks
+from .report_batch import generate_report_cards
+from .results import approve_results, calculate_semester_by_course, drain_semester_dirty
+
+
+# ============================================
+# QUEUE
+# ============================================
+
+JOB_HANDLERS = {}
+
+RETRY_DELAY = timedelta(seconds=30)
+STALE_AFTER = timedelta(minutes=10)
+
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind"""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, params=None, user=None, max_attempts=3):
+    """Queue a job for the worker and return it"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(
+        kind=kind,
+        params=params or {},
+        created_by=user,
+        max_attempts=max_attempts,
+    )
+
+
+def claim_jobs(limit):
+    """Atomically move up to `limit` due jobs from queued to running"""
+    claimed = []
+    candidates = Job.objects.filter(
+        status='queued', run_after__lte=timezone.now()
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+
+    for job_id in list(candidates):
+        # The status guard makes the claim safe with several workers
+        won = Job.objects.filter(pk=job_id, status='queued').update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+        if won:
+            claimed.append(job_id)
+    return claimed
+
+
+def requeue_stale_jobs():
+    """
+    Put back running jobs whose worker stopped reporting progress.
+
+    The lost run was counted as an attempt when it was claimed, so a job
+    that keeps killing its worker is failed once it is out of attempts.
+    Returns the number of jobs requeued or failed.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', updated_at__lt=now - STALE_AFTER)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed',
+        error='Worker stopped reporting progress',
+        finished_at=now,
+        message='Failed after worker timeout',
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', run_after=now, message='Requeued after worker timeout',
+    )
+    return failed + requeued
+
+
+def set_progress(job, progress, total=None, message=None):
+    """Record progress on a running job (also acts as its heartbeat)"""
+    job.progress = progress
+    fields = {'progress': progress, 'updated_at': timezone.now()}
+    if total is not None:
+        job.total = total
+        fields['total'] = total
+    if message is not None:
+        job.message = message
+        fields['message'] = message
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def heartbeat(job):
+    """Keep a running job claimed through a long phase that has no progress to report"""
+    Job.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+
+
+def fail_job(job, error):
+    """Retry a running job that did not finish, or mark it failed once out of attempts"""
+    running = Job.objects.filter(pk=job.pk, status='running')
+    if job.attempts < job.max_attempts:
+        running.update(
+            status='queued',
+            error=error,
+            run_after=timezone.now() + RETRY_DELAY * job.attempts,
+            message=f'Retrying (attempt {job.attempts} of {job.max_attempts} failed)',
+        )
+    else:
+        running.update(
+            status='failed',
+            error=error,
+            finished_at=timezone.now(),
+            message='Failed',
+        )
+
+
+def run_job(job_id):
+    """Run one claimed job; called inside a worker process"""
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    handler = JOB_HANDLERS.get(job.kind)
+
+    try:
+        if handler is None:
+            raise ValueError(f'Unknown job kind: {job.kind}')
+        result = handler(job)
+    except Exception:
+        fail_job(job, traceback.format_exc())
+        return job_id
+
+    Job.objects.filter(pk=job.pk).update(
+        status='done',
+        result=result,
+        progress=F('total'),
+        finished_at=timezone.now(),
+        message='Completed',
+    )
+    return job_id
+
+
+# ============================================
+# HANDLERS
+# ============================================
+
+@job_handler('semester_calculate')
+def semester_calculate_job(job):
+    semester = Semester.objects.get(pk=job.params['semester_id'])
+    set_progress(job, 0, total=1, message=f'Calculating {semester}')
+
+    # Progress after every course doubles as the heartbeat that keeps the job claimed
+    def on_course(done, total):
+        set_progress(job, done, total=total + 1, message=f'Calculated {done} of {total} courses')
+
+    counts = calculate_semester_by_course(semester, on_course=on_course)
+    counts['classes_ranked'] = refresh_semester_ranks(semester.pk)
+    counts['leaderboards'] = rebuild_leaderboards('semester', semester.pk)
+    return counts
+
+
+@job_handler('semester_drain')
+def semester_drain_job(job):
+    set_progress(job, 0, total=1, message='Recomputing changed semester results')
+
+    def on_group(done, total):
+        set_progress(job, done, total=total + 1, message=f'Recomputed {done} of {total} courses')
+
+    return drain_semester_dirty(on_group=on_group)
+
+
+def queue_semester_drain():
+    """Queue a semester_drain job for pending keys of unlocked semesters, unless one is waiting"""
+    if not SemesterDirtyKey.objects.filter(semester__is_locked=False).exists():
+        return None
+    if Job.objects.filter(kind='semester_drain', status='queued').exists():
+        return None
+    return enqueue('semester_drain')
+
+
+@job_handler('leaderboard_refresh')
+def leaderboard_refresh_job(job):
+    keys = [tuple(key) for key in job.params['keys']]
+    set_progress(job, 0, total=1, message='Refreshing leaderboards')
+    return {'boards': refresh_leaderboards(keys)}
+
+
+def queue_leaderboard_refresh(keys):
+    """Queue a leaderboard_refresh job for changed (student_id, course_id, quarter_id) keys"""
+    return enqueue('leaderboard_refresh', {'keys': sorted(set(keys))})
+
+
+@job_handler('bulk_approve')
+def bulk_approve_job(job):
+    user = User.objects.filter(pk=job.params.get('user_id')).first()
+    set_progress(job, 0, message='Approving results')
+
+    def on_chunk(progress):
+        set_progress(job, progress['done'], total=progress['total'],
+                     message=f"Approved chunk {progress['chunk']}")
+
+    result = approve_results(
+        user,
+        scope=job.params.get('scope'),
+        result_ids=job.params.get('result_ids'),
+        on_chunk=on_chunk,
+    )
+    if result['approved']:
+        record_activity('results_approved', f"{result['approved']} quarterly results approved", user)
+    return result
+
+
+@job_handler('student_delete')
+def student_delete_job(job):
+    student_ids = job.params['student_ids']
+    chunk_size = job.params.get('chunk_size', 100)
+    set_progress(job, 0, total=len(student_ids), message='Deleting students')
+
+    deleted = 0
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        _, per_model = Student.objects.filter(id__in=chunk).delete()
+        deleted += per_model.get(Student._meta.label, 0)
+        set_progress(job, start + len(chunk))
+    record_activity('students_bulk', f'{deleted} students deleted', job.created_by_id)
+    return {'deleted': deleted}
+
+
+@job_handler('report_cards')
+def report_cards_job(job):
+    params = job.params
+    set_progress(job, 0, message='Collecting results')
+
+    def on_progress(done, total):
+        set_progress(job, done, total=total, message=f'Rendered {done} of {total} cards')
+
+    summary = generate_report_cards(
+        params['kind'],
+        params['period_id'],
+        params['scope'],
+        params.get('scope_id'),
+        output_format=params.get('format', 'zip'),
+        workers=params.get('workers', 2),
+        on_progress=on_progress,
+    )
+    record_activity('report_cards', f"{summary['cards']} {params['kind']} report cards generated", job.created_by_id)
+    return summary
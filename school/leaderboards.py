@@ -0,0 +1,283 @@
+# school/leaderboards.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q, Sum
+
+from .models import LeaderboardEntry, Quarter, QuarterlyResult, Semester, SemesterResult, Student
+
+
+# ============================================
+# LEADERBOARDS
+# ============================================
+#
+# A board is a (scope, scope_id, period, period_id) tuple: the whole
+# school (scope_id 0), a department, a class or a course, over a quarter,
+# a semester or an academic year. Each active student with results on the
+# board has one LeaderboardEntry holding their average, their dense
+# position and a gapless row number, so a page is a row_number range read
+# from the leaderboard_page_idx index whatever the size of the school.
+#
+# Approvals refresh only the entries of the students they touch on the
+# boards they feed, then renumber those boards from the highest average
+# that changed downwards.
+
+LEADERBOARD_SCOPES = ['overall', 'department', 'class', 'course']
+LEADERBOARD_PERIODS = ['quarter', 'semester', 'year']
+LEADERBOARD_PAGE_SIZE = 25
+
+# Result field each scope narrows on; the whole school is not narrowed
+SCOPE_FIELDS = {
+    'overall': None,
+    'department': 'student__current_class__department_id',
+    'class': 'student__current_class_id',
+    'course': 'course_id',
+}
+
+
+def _source(period, period_id):
+    """(results, score field) a period is ranked on"""
+    if period == 'quarter':
+        return QuarterlyResult.objects.filter(quarter_id=period_id, status='approved'), 'score'
+    if period == 'semester':
+        return SemesterResult.objects.filter(semester_id=period_id), 'average_score'
+    if period == 'year':
+        return QuarterlyResult.objects.filter(quarter__academic_year_id=period_id, status='approved'), 'score'
+    raise ValueError(f'Unknown leaderboard period: {period}')
+
+
+def _board_fields(board):
+    scope, scope_id, period, period_id = board
+    return {'scope': scope, 'scope_id': scope_id, 'period': period, 'period_id': period_id}
+
+
+def _entries(board, totals):
+    return [
+        LeaderboardEntry(
+            **_board_fields(board),
+            student_id=row['student_id'],
+            courses=row['courses'],
+            total_score=row['total'],
+            average_score=Decimal(row['average']).quantize(Decimal('0.01')),
+            position=0,
+            row_number=0,
+        )
+        for row in totals
+    ]
+
+
+def _totals(results, score_field, *group_by):
+    return results.filter(student__is_active=True).values(*group_by, 'student_id').annotate(
+        courses=Count('id'),
+        total=Sum(score_field),
+        average=Avg(score_field),
+    ).order_by()
+
+
+def renumber_board(board, below=None):
+    """
+    Recompute positions and row numbers of one board from its entries.
+
+    With `below`, only entries averaging at most that much are renumbered,
+    carrying on from the last entry above it. A change can only move the
+    entries at or below the highest average it touched, so the top of a
+    board keeps its numbers without being read.
+    """
+    entries = LeaderboardEntry.objects.filter(**_board_fields(board))
+    previous = None
+    position = row_number = 0
+    if below is not None:
+        above = entries.filter(average_score__gt=below).order_by(
+            'average_score', '-row_number'
+        ).values_list('average_score', 'position', 'row_number').first()
+        if above:
+            previous, position, row_number = above
+        entries = entries.filter(average_score__lte=below)
+    entries = entries.order_by(
+        '-average_score', 'student__last_name', 'student__first_name', 'student_id'
+    ).values_list('id', 'average_score', 'position', 'row_number')
+
+    changed = []
+    for row_number, (entry_id, average, old_position, old_row_number) in enumerate(entries, row_number + 1):
+        if average != previous:
+            position += 1
+            previous = average
+        if (position, row_number) != (old_position, old_row_number):
+            changed.append(LeaderboardEntry(id=entry_id, position=position, row_number=row_number))
+    LeaderboardEntry.objects.bulk_update(changed, ['position', 'row_number'], batch_size=500)
+    return len(changed)
+
+
+def refresh_board(board, student_ids=None):
+    """Recompute the entries of `student_ids` (or of everyone) on one board"""
+    with transaction.atomic():
+        _refresh_board(board, student_ids)
+
+
+def _refresh_board(board, student_ids):
+    scope, scope_id, period, period_id = board
+    results, score_field = _source(period, period_id)
+    if SCOPE_FIELDS[scope]:
+        results = results.filter(**{SCOPE_FIELDS[scope]: scope_id})
+    entries = LeaderboardEntry.objects.filter(**_board_fields(board))
+    if student_ids is None:
+        entries.delete()
+        LeaderboardEntry.objects.bulk_create(_entries(board, _totals(results, score_field)), batch_size=500)
+        renumber_board(board)
+        return
+
+    results = results.filter(student_id__in=student_ids)
+    entries = entries.filter(student_id__in=student_ids)
+    old_top = entries.aggregate(top=Max('average_score'))['top']
+    entries.delete()
+    new = _entries(board, _totals(results, score_field))
+    LeaderboardEntry.objects.bulk_create(new, batch_size=500)
+    # Entries above both the old and the new averages keep their places
+    averages = [entry.average_score for entry in new] + ([old_top] if old_top is not None else [])
+    if averages:
+        renumber_board(board, below=max(averages))
+
+
+# ============================================
+# INCREMENTAL REFRESH
+# ============================================
+
+def boards_for_results(keys):
+    """{board: student_ids} fed by (student_id, course_id, quarter_id) keys"""
+    keys = list(keys)
+    students = {
+        pk: (class_id, department_id)
+        for pk, class_id, department_id in Student.objects.filter(
+            pk__in={student_id for student_id, _, _ in keys}
+        ).values_list('pk', 'current_class_id', 'current_class__department_id')
+    }
+    quarter_ids = {quarter_id for _, _, quarter_id in keys}
+    years = dict(Quarter.objects.filter(pk__in=quarter_ids).values_list('pk', 'academic_year_id'))
+    semesters = {}
+    for pk, quarter_1_id, quarter_2_id in Semester.objects.filter(
+        Q(quarter_1_id__in=quarter_ids) | Q(quarter_2_id__in=quarter_ids)
+    ).values_list('pk', 'quarter_1_id', 'quarter_2_id'):
+        semesters.setdefault(quarter_1_id, []).append(pk)
+        semesters.setdefault(quarter_2_id, []).append(pk)
+
+    boards = {}
+    for student_id, course_id, quarter_id in keys:
+        class_id, department_id = students.get(student_id, (None, None))
+        scopes = [('overall', 0), ('course', course_id)]
+        if class_id:
+            scopes += [('class', class_id), ('department', department_id)]
+        periods = [('quarter', quarter_id)] + [('semester', pk) for pk in semesters.get(quarter_id, [])]
+        if quarter_id in years:
+            periods.append(('year', years[quarter_id]))
+        for scope, scope_id in scopes:
+            for period, period_id in periods:
+                boards.setdefault((scope, scope_id, period, period_id), set()).add(student_id)
+    return boards
+
+
+def refresh_leaderboards(keys):
+    """Bring every board fed by changed quarterly results up to date"""
+    boards = boards_for_results(keys)
+    # One transaction for all the boards instead of one per board
+    with transaction.atomic():
+        for board, student_ids in boards.items():
+            _refresh_board(board, student_ids)
+    return len(boards)
+
+
+def refresh_student_boards(student_ids):
+    """
+    Re-place students whose status or class changed.
+
+    Covers the boards they are on and the boards their approved results
+    feed, so students leave old class boards and (re)join current ones.
+    """
+    student_ids = set(student_ids)
+    keys = QuarterlyResult.objects.filter(
+        student_id__in=student_ids, status='approved'
+    ).values_list('student_id', 'course_id', 'quarter_id')
+    boards = {board: student_ids for board in boards_for_results(keys)}
+    for board in LeaderboardEntry.objects.filter(student_id__in=student_ids).values_list(
+        'scope', 'scope_id', 'period', 'period_id'
+    ).distinct():
+        boards[board] = student_ids
+    with transaction.atomic():
+        for board in boards:
+            _refresh_board(board, student_ids)
+    return len(boards)
+
+
+def refresh_semester_boards(semester_id, student_ids):
+    """Re-place students on the boards of one semester after their SemesterResult rows changed"""
+    student_ids = set(student_ids)
+    boards = set(LeaderboardEntry.objects.filter(
+        period='semester', period_id=semester_id, student_id__in=student_ids
+    ).values_list('scope', 'scope_id', 'period', 'period_id'))
+    for course_id, class_id, department_id in SemesterResult.objects.filter(
+        semester_id=semester_id, student_id__in=student_ids
+    ).values_list('course_id', 'student__current_class_id', 'student__current_class__department_id').distinct():
+        scopes = [('overall', 0), ('course', course_id)]
+        if class_id:
+            scopes += [('class', class_id), ('department', department_id)]
+        boards.update((scope, scope_id, 'semester', semester_id) for scope, scope_id in scopes)
+    with transaction.atomic():
+        for board in boards:
+            _refresh_board(board, student_ids)
+    return len(boards)
+
+
+# ============================================
+# FULL REBUILD
+# ============================================
+
+def _periods(period=None, period_id=None):
+    if period_id is not None:
+        return [(period, period_id)]
+    periods = []
+    if period in (None, 'quarter'):
+        periods += [('quarter', pk) for pk in Quarter.objects.values_list('pk', flat=True)]
+    if period in (None, 'semester'):
+        periods += [('semester', pk) for pk in Semester.objects.values_list('pk', flat=True)]
+    if period in (None, 'year'):
+        periods += [('year', pk) for pk in Quarter.objects.values_list('academic_year_id', flat=True).distinct()]
+    return periods
+
+
+def rebuild_leaderboards(period=None, period_id=None):
+    """Rebuild every board of one period (or of all periods) with one query per scope"""
+    boards = 0
+    for period, period_id in _periods(period, period_id):
+        results, score_field = _source(period, period_id)
+        with transaction.atomic():
+            LeaderboardEntry.objects.filter(period=period, period_id=period_id).delete()
+            for scope, field in SCOPE_FIELDS.items():
+                by_board = {}
+                group_by = [field] if field else []
+                for row in _totals(results, score_field, *group_by):
+                    scope_id = row[field] if field else 0
+                    if scope_id is not None:
+                        by_board.setdefault((scope, scope_id, period, period_id), []).append(row)
+                for board, totals in by_board.items():
+                    LeaderboardEntry.objects.bulk_create(_entries(board, totals), batch_size=500)
+                    renumber_board(board)
+                boards += len(by_board)
+    return boards
+
+
+# ============================================
+# READS
+# ============================================
+
+def leaderboard_size(board):
+    """Number of entries on a board, read from the last row number"""
+    return LeaderboardEntry.objects.filter(**_board_fields(board)).order_by(
+        '-row_number'
+    ).values_list('row_number', flat=True).first() or 0
+
+
+def leaderboard_page(board, page=1, per_page=LEADERBOARD_PAGE_SIZE):
+    """Entries on one page of a board, fetched as a row_number range"""
+    first = (max(page, 1) - 1) * per_page + 1
+    return LeaderboardEntry.objects.filter(
+        **_board_fields(board), row_number__gte=first, row_number__lt=first + per_page
+    ).select_related('student__current_class').order_by('row_number')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from school.exports import EXPORT_FORMATS, EXPORTS, STATUS_VALUES, export_filename, export_filters, write_export
+
+
+class Command(BaseCommand):
+    help = 'Write quarterly or semester results to a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--quarter', type=int, help='Quarter id (quarterly results)')
+        parser.add_argument('--semester', type=int, help='Semester id (semester results)')
+        parser.add_argument('--class', dest='class', type=int, help='Class id')
+        parser.add_argument('--course', type=int, help='Course id')
+        parser.add_argument('--status', choices=STATUS_VALUES, help='Result status (quarterly results)')
+        parser.add_argument('--output', help='File to write (default: a name built from the filters)')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        try:
+            filters = export_filters(kind, options)
+        except ValueError as error:
+            raise CommandError(error)
+        unused = [name for name in ('quarter', 'semester', 'status') if options[name] is not None and name not in filters]
+        if unused:
+            raise CommandError(f'{kind} results cannot be filtered by {", ".join(unused)}')
+
+        path = options['output'] or export_filename(kind, filters, options['format'])
+        size = write_export(kind, filters, options['format'], path)
+        self.stdout.write(self.style.SUCCESS(f'Exported {kind} results to {path} ({size} bytes)'))
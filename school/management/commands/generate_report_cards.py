@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from school.report_batch import BATCH_FORMATS, BATCH_SCOPES, generate_report_cards
+
+
+class Command(BaseCommand):
+    help = 'Render the report cards of a class, department or the whole school'
+
+    def add_arguments(self, parser):
+        period = parser.add_mutually_exclusive_group(required=True)
+        period.add_argument('--quarter', type=int, help='Quarter id (quarterly cards)')
+        period.add_argument('--semester', type=int, help='Semester id (semester cards)')
+        parser.add_argument('--scope', choices=BATCH_SCOPES, default='class')
+        parser.add_argument('--id', type=int, dest='scope_id', help='Class or department id')
+        parser.add_argument('--format', choices=BATCH_FORMATS, default='zip', dest='output_format')
+        parser.add_argument('--workers', type=int, default=2, help='Number of rendering processes')
+        parser.add_argument('--output', help='File to write (default: under MEDIA_ROOT/report_cards)')
+
+    def handle(self, *args, **options):
+        if options['scope'] != 'school' and not options['scope_id']:
+            raise CommandError('--id is required for class and department scopes')
+
+        kind = 'quarterly' if options['quarter'] else 'semester'
+
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} cards')
+
+        summary = generate_report_cards(
+            kind,
+            options['quarter'] or options['semester'],
+            options['scope'],
+            options['scope_id'],
+            output_format=options['output_format'],
+            workers=options['workers'],
+            output=options['output'],
+            on_progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {summary['cards']} cards into {summary['path']}"
+        ))
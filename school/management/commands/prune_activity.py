@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from school.activity import prune_activity
+
+
+class Command(BaseCommand):
+    help = 'Delete activity feed events older than the given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Keep events from the last N days')
+
+    def handle(self, *args, **options):
+        deleted = prune_activity(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} activity events'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from school.leaderboards import LEADERBOARD_PERIODS, rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the top performer leaderboards from approved results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=LEADERBOARD_PERIODS, help='Only rebuild boards of this period kind')
+        parser.add_argument('--period-id', type=int, help='Only rebuild boards of this quarter, semester or year id')
+
+    def handle(self, *args, **options):
+        if options['period_id'] is not None and not options['period']:
+            self.stderr.write(self.style.ERROR('--period-id needs --period'))
+            return
+
+        boards = rebuild_leaderboards(options['period'], options['period_id'])
+        self.stdout.write(self.style.SUCCESS(f'Leaderboards rebuilt: {boards} boards'))
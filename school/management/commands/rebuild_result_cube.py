@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from school.cube import rebuild_cube
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the result analytics cube from approved quarterly results'
+
+    def handle(self, *args, **options):
+        cells = rebuild_cube()
+        self.stdout.write(self.style.SUCCESS(f'Result cube rebuilt: {cells} cells'))
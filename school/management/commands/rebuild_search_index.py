@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from school.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Re-fill the student full-text search index from the students table'
+
+    def handle(self, *args, **options):
+        if rebuild_search_index():
+            self.stdout.write(self.style.SUCCESS('Student search index rebuilt'))
+        else:
+            self.stdout.write(self.style.WARNING('No search index on this database; search uses the fallback'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from school.trends import rebuild_trends
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the year-on-year student trends and at-risk flags from approved quarterly results'
+
+    def handle(self, *args, **options):
+        trends = rebuild_trends()
+        self.stdout.write(self.style.SUCCESS(f'Student trends rebuilt: {trends} rows'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from school.leaderboards import rebuild_leaderboards
+from school.models import Semester
+from school.ranking import refresh_semester_ranks
+from school.results import calculate_semester_results, drain_semester_dirty
+
+
+class Command(BaseCommand):
+    help = 'Recompute semester results flagged dirty by result changes (or a whole semester)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semester', type=int, help='Recompute every result of this semester id')
+        parser.add_argument('--limit', type=int, help='Maximum number of dirty keys to drain')
+
+    def handle(self, *args, **options):
+        if options['semester']:
+            semester = Semester.objects.get(pk=options['semester'])
+            counts = calculate_semester_results(semester)
+            counts['classes_ranked'] = refresh_semester_ranks(semester.pk)
+            counts['leaderboards'] = rebuild_leaderboards('semester', semester.pk)
+        else:
+            counts = drain_semester_dirty(limit=options['limit'])
+
+        summary = ', '.join(f'{key}={value}' for key, value in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Semester results recomputed: {summary}'))
@@ -0,0 +1,90 @@
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from school.jobs import claim_jobs, fail_job, requeue_stale_jobs, run_job
+from school.models import Job
+
+logger = logging.getLogger('school.jobs')
+
+
+def _init_worker():
+    # Forked children must not reuse the parent's database connections
+    connections.close_all()
+
+
+def _new_pool(workers):
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds between queue polls')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        pool = _new_pool(workers)
+        running = {}  # future -> job id
+        self.stdout.write(f'Job worker started with {workers} processes')
+
+        try:
+            while True:
+                requeue_stale_jobs()
+                broken = False
+                for future in [f for f in running if f.done()]:
+                    job_id = running.pop(future)
+                    try:
+                        future.result()
+                    except BrokenProcessPool:
+                        # A worker died (OOM killer, segfault): every job in the pool is lost
+                        broken = True
+                        self._job_crashed(job_id, traceback.format_exc())
+                    except Exception:
+                        self._job_crashed(job_id, traceback.format_exc())
+                    else:
+                        self.stdout.write(f'Job #{job_id} finished')
+
+                if broken:
+                    for job_id in running.values():
+                        self._job_crashed(job_id, 'Worker pool broke while the job was running')
+                    running.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _new_pool(workers)
+                    self.stderr.write('Worker pool broke and was restarted')
+
+                free = workers - len(running)
+                claimed = claim_jobs(free) if free > 0 else []
+                for job_id in claimed:
+                    self.stdout.write(f'Job #{job_id} started')
+                    running[pool.submit(run_job, job_id)] = job_id
+
+                if options['once'] and not running and not claimed:
+                    break
+                time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping job worker')
+        finally:
+            pool.shutdown(wait=True)
+
+    def _job_crashed(self, job_id, error):
+        """Log a job whose worker did not return and retry or fail it"""
+        logger.error('Job #%s crashed in its worker:\n%s', job_id, error)
+        self.stderr.write(f'Job #{job_id} crashed')
+        job = Job.objects.filter(pk=job_id).first()
+        if job:
+            fail_job(job, error)
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-17 02:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemesterDirtyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='school.course')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='school.semester')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='school.student')),
+            ],
+            options={
+                'unique_together': {('student', 'course', 'semester')},
+            },
+        ),
+    ]
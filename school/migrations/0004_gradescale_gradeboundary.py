@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-17 02:13
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0003_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('department', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='grade_scale', to='school.department')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GradeBoundary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=5)),
+                ('min_score', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('scale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='boundaries', to='school.gradescale')),
+            ],
+            options={
+                'verbose_name_plural': 'Grade boundaries',
+                'ordering': ['-min_score'],
+                'unique_together': {('scale', 'min_score')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-17 02:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0004_gradescale_gradeboundary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quarterlyresult',
+            name='percentile',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='quarterlyresult',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='semesterresult',
+            name='percentile',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='semesterresult',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ClassRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('courses', models.PositiveIntegerField(default=0)),
+                ('total_score', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('average_score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('position', models.PositiveIntegerField()),
+                ('percentile', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_assigned', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranks', to='school.class')),
+                ('quarter', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='school.quarter')),
+                ('semester', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='school.semester')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_ranks', to='school.student')),
+            ],
+            options={
+                'ordering': ['position'],
+                'indexes': [models.Index(fields=['class_assigned', 'quarter', 'position'], name='school_clas_class_a_a8a63b_idx'), models.Index(fields=['class_assigned', 'semester', 'position'], name='school_clas_class_a_05f96f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0 on 2026-10-17 02:16
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_submitted_at(apps, schema_editor):
+    # The approval queue pages on submitted_at, so it must never be NULL
+    QuarterlyResult = apps.get_model('school', 'QuarterlyResult')
+    QuarterlyResult.objects.filter(
+        status='submitted', submitted_at__isnull=True
+    ).update(submitted_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0005_quarterlyresult_percentile_quarterlyresult_position_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quarterlyresult',
+            index=models.Index(fields=['status', '-submitted_at', '-id'], name='result_queue_idx'),
+        ),
+        migrations.RunPython(backfill_submitted_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-17 02:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0006_approval_queue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student_created', 'New Student Registered'), ('student_updated', 'Student Updated'), ('students_bulk', 'Students Updated'), ('results_saved', 'Results Saved'), ('results_submitted', 'Results Submitted'), ('results_approved', 'Results Approved'), ('result_rejected', 'Result Rejected'), ('class_created', 'New Class Created'), ('class_updated', 'Class Updated'), ('class_deleted', 'Class Deleted')], max_length=30)),
+                ('description', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='activity_latest_idx')],
+            },
+        ),
+    ]
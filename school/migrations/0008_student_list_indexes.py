@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0007_activityevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_active', 'last_name', 'first_name', 'id'], name='student_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['current_class', 'is_active', 'last_name', 'first_name', 'id'], name='student_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['gender', 'is_active', 'last_name', 'first_name', 'id'], name='student_gender_idx'),
+        ),
+    ]
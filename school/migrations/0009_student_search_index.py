@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-17 02:40
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from school.search import create_search_index
+
+    create_search_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    from school.search import drop_search_index
+
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0008_student_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0010_autocomplete_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activityevent',
+            name='kind',
+            field=models.CharField(choices=[('student_created', 'New Student Registered'), ('student_updated', 'Student Updated'), ('students_bulk', 'Students Updated'), ('results_saved', 'Results Saved'), ('results_submitted', 'Results Submitted'), ('results_approved', 'Results Approved'), ('result_rejected', 'Result Rejected'), ('class_created', 'New Class Created'), ('class_updated', 'Class Updated'), ('class_deleted', 'Class Deleted'), ('report_cards', 'Report Cards Generated')], max_length=30),
+        ),
+    ]
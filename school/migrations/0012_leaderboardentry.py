@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-17 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0011_activityevent_report_cards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('overall', 'Whole School'), ('department', 'Department'), ('class', 'Class'), ('course', 'Course')], max_length=20)),
+                ('scope_id', models.PositiveIntegerField(default=0)),
+                ('period', models.CharField(choices=[('quarter', 'Quarter'), ('semester', 'Semester'), ('year', 'Academic Year')], max_length=10)),
+                ('period_id', models.PositiveIntegerField()),
+                ('courses', models.PositiveIntegerField(default=0)),
+                ('total_score', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('average_score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('position', models.PositiveIntegerField()),
+                ('row_number', models.PositiveIntegerField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='school.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'scope_id', 'period', 'period_id', 'row_number'], name='leaderboard_page_idx')],
+                'unique_together': {('scope', 'scope_id', 'period', 'period_id', 'student')},
+            },
+        ),
+    ]
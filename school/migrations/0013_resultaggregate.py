@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-17 02:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0012_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('score_squares', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('min_score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('max_score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('grade_counts', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_assigned', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='school.class')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='school.course')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='school.department')),
+                ('quarter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='school.quarter')),
+                ('teacher', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quarter', 'department'], name='cube_department_idx'), models.Index(fields=['quarter', 'class_assigned'], name='cube_class_idx'), models.Index(fields=['quarter', 'course'], name='cube_course_idx'), models.Index(fields=['quarter', 'teacher'], name='cube_teacher_idx')],
+                'unique_together': {('department', 'class_assigned', 'course', 'teacher', 'quarter')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-17 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0013_resultaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trajectory', models.JSONField(default=list)),
+                ('years', models.PositiveIntegerField(default=0)),
+                ('latest_average', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('delta', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('slope', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('declining', models.BooleanField(default=False)),
+                ('declining_courses', models.PositiveIntegerField(default=0)),
+                ('below_pass', models.BooleanField(default=False)),
+                ('at_risk', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='school.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trends', to='school.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'at_risk', 'delta'], name='trend_risk_idx')],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+    ]
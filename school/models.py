@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
@@ -21,6 +22,14 @@ class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Type-ahead prefix lookups
+            models.Index(Lower('first_name'), name='user_first_name_lower_idx'),
+            models.Index(Lower('last_name'), name='user_last_name_lower_idx'),
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_role_display()})"
     
@@ -73,6 +82,7 @@ class Class(models.Model):
     class Meta:
         ordering = ['name']
         verbose_name_plural = 'Classes'
+        indexes = [models.Index(Lower('name'), name='class_name_lower_idx')]
     
     def __str__(self):
         return f"{self.name} - {self.department.code}"
@@ -92,6 +102,10 @@ class Course(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(Lower('name'), name='course_name_lower_idx'),
+            models.Index(Lower('code'), name='course_code_lower_idx'),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -144,6 +158,12 @@ class Student(models.Model):
     
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Student list: active filter (+ class or gender) in list order
+            models.Index(fields=['is_active', 'last_name', 'first_name', 'id'], name='student_list_idx'),
+            models.Index(fields=['current_class', 'is_active', 'last_name', 'first_name', 'id'], name='student_class_idx'),
+            models.Index(fields=['gender', 'is_active', 'last_name', 'first_name', 'id'], name='student_gender_idx'),
+        ]
     
     def __str__(self):
         return f"{self.admission_number} - {self.get_full_name()}"
@@ -204,21 +224,37 @@ class QuarterlyResult(models.Model):
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_results')
     approved_at = models.DateTimeField(null=True, blank=True)
     
+    # Position in class for this course (filled by school.ranking)
+    position = models.PositiveIntegerField(null=True, blank=True)
+    percentile = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['student', 'course', 'quarter']
+        indexes = [
+            # Approval queue: status filter + keyset on (submitted_at, id)
+            models.Index(fields=['status', '-submitted_at', '-id'], name='result_queue_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.course.code} - {self.quarter.name}"
-    
-    def get_grade(self):
-        if self.score >= 90: return 'A'
-        elif self.score >= 80: return 'B'
-        elif self.score >= 70: return 'C'
-        elif self.score >= 60: return 'D'
-        else: return 'F'
+
+    def save(self, *args, **kwargs):
+        # The approval queue pages on submitted_at, so a submitted row always has one
+        if self.status == 'submitted' and self.submitted_at is None:
+            self.submitted_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'submitted_at'}
+        super().save(*args, **kwargs)
+
+    def get_grade(self, department_id=None):
+        """Grade of the score; pass `department_id` to grade without loading the course"""
+        from .grading import grade_for
+        if department_id is None:
+            department_id = self.course.department_id
+        return grade_for(self.score, department_id)
 
 
 class Semester(models.Model):
@@ -259,6 +295,10 @@ class SemesterResult(models.Model):
     is_approved = models.BooleanField(default=False)
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     
+    # Position in class for this course (filled by school.ranking)
+    position = models.PositiveIntegerField(null=True, blank=True)
+    percentile = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -271,12 +311,175 @@ class SemesterResult(models.Model):
             self.average_score = self.total_score / 2
             self.save()
     
-    def get_grade(self):
-        if self.average_score >= 90: return 'A'
-        elif self.average_score >= 80: return 'B'
-        elif self.average_score >= 70: return 'C'
-        elif self.average_score >= 60: return 'D'
-        else: return 'F'
+    def get_grade(self, department_id=None):
+        """Grade of the average; pass `department_id` to grade without loading the course"""
+        from .grading import grade_for
+        if department_id is None:
+            department_id = self.course.department_id
+        return grade_for(self.average_score, department_id)
+
+
+class SemesterDirtyKey(models.Model):
+    """(student, course, semester) keys whose SemesterResult needs recomputing"""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    semester = models.ForeignKey(Semester, on_delete=models.CASCADE)
+    marked_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['student', 'course', 'semester']
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.course_id} - {self.semester_id}"
+
+
+class ClassRank(models.Model):
+    """Overall position of a student in their class for a quarter or semester"""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='class_ranks')
+    class_assigned = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='ranks')
+    quarter = models.ForeignKey(Quarter, on_delete=models.CASCADE, null=True, blank=True)
+    semester = models.ForeignKey(Semester, on_delete=models.CASCADE, null=True, blank=True)
+    
+    courses = models.PositiveIntegerField(default=0)
+    total_score = models.DecimalField(max_digits=7, decimal_places=2)
+    average_score = models.DecimalField(max_digits=5, decimal_places=2)
+    position = models.PositiveIntegerField()
+    percentile = models.DecimalField(max_digits=5, decimal_places=2)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['position']
+        indexes = [
+            models.Index(fields=['class_assigned', 'quarter', 'position']),
+            models.Index(fields=['class_assigned', 'semester', 'position']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.class_assigned_id} - #{self.position}"
+
+
+class LeaderboardEntry(models.Model):
+    """A student's place on one (scope, period) leaderboard, kept by school.leaderboards"""
+    SCOPE_CHOICES = (
+        ('overall', 'Whole School'),
+        ('department', 'Department'),
+        ('class', 'Class'),
+        ('course', 'Course'),
+    )
+    PERIOD_CHOICES = (
+        ('quarter', 'Quarter'),
+        ('semester', 'Semester'),
+        ('year', 'Academic Year'),
+    )
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    scope_id = models.PositiveIntegerField(default=0)  # 0 for the whole school
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_id = models.PositiveIntegerField()
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='+')
+    
+    courses = models.PositiveIntegerField(default=0)
+    total_score = models.DecimalField(max_digits=9, decimal_places=2)
+    average_score = models.DecimalField(max_digits=5, decimal_places=2)
+    position = models.PositiveIntegerField()  # equal averages share a position
+    row_number = models.PositiveIntegerField()  # 1..n without gaps, pages are row ranges
+    
+    class Meta:
+        unique_together = ['scope', 'scope_id', 'period', 'period_id', 'student']
+        indexes = [
+            models.Index(fields=['scope', 'scope_id', 'period', 'period_id', 'row_number'], name='leaderboard_page_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope}:{self.scope_id} {self.period}:{self.period_id} - {self.student_id} #{self.position}"
+
+
+class ResultAggregate(models.Model):
+    """Approved quarterly scores rolled up per department, class, course, teacher and quarter (school.cube)"""
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='+')
+    class_assigned = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='+')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='+')
+    quarter = models.ForeignKey(Quarter, on_delete=models.CASCADE, related_name='+')
+    
+    count = models.PositiveIntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    score_squares = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    min_score = models.DecimalField(max_digits=5, decimal_places=2)
+    max_score = models.DecimalField(max_digits=5, decimal_places=2)
+    grade_counts = models.JSONField(default=dict)  # grade label -> count
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['department', 'class_assigned', 'course', 'teacher', 'quarter']
+        indexes = [
+            models.Index(fields=['quarter', 'department'], name='cube_department_idx'),
+            models.Index(fields=['quarter', 'class_assigned'], name='cube_class_idx'),
+            models.Index(fields=['quarter', 'course'], name='cube_course_idx'),
+            models.Index(fields=['quarter', 'teacher'], name='cube_teacher_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.class_assigned_id} - {self.course_id} - {self.teacher_id} - {self.quarter_id}: {self.count}"
+
+
+class StudentTrend(models.Model):
+    """Year-on-year averages of a student overall (no course) or in one course, kept by school.trends"""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='trends')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    
+    trajectory = models.JSONField(default=list)  # [[academic year id, name, average], ...] oldest first
+    years = models.PositiveIntegerField(default=0)
+    latest_average = models.DecimalField(max_digits=5, decimal_places=2)
+    delta = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # latest - previous year
+    slope = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # points per year
+    declining = models.BooleanField(default=False)
+    declining_courses = models.PositiveIntegerField(default=0)  # overall rows only
+    below_pass = models.BooleanField(default=False)
+    at_risk = models.BooleanField(default=False)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['student', 'course']
+        indexes = [
+            models.Index(fields=['course', 'at_risk', 'delta'], name='trend_risk_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.course_id or 'overall'}: {self.latest_average} ({self.delta})"
+
+
+# ============================================
+# GRADING
+# ============================================
+
+class GradeScale(models.Model):
+    """Grading scale used by a department"""
+    name = models.CharField(max_length=100)
+    department = models.OneToOneField(Department, on_delete=models.CASCADE, related_name='grade_scale')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} - {self.department.code}"
+
+
+class GradeBoundary(models.Model):
+    """Lowest score that earns a grade label"""
+    scale = models.ForeignKey(GradeScale, on_delete=models.CASCADE, related_name='boundaries')
+    label = models.CharField(max_length=5)
+    min_score = models.DecimalField(max_digits=5, decimal_places=2,
+                                    validators=[MinValueValidator(0), MaxValueValidator(100)])
+    
+    class Meta:
+        unique_together = ['scale', 'min_score']
+        ordering = ['-min_score']
+        verbose_name_plural = 'Grade boundaries'
+    
+    def __str__(self):
+        return f"{self.label} >= {self.min_score}"
 
 
 # ============================================
@@ -298,4 +501,113 @@ class ResultTemplate(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.name} - {self.department.code}"
\ No newline at end of file
+        return f"{self.name} - {self.department.code}"
+
+# ============================================
+# ACTIVITY LOG
+# ============================================
+
+class ActivityEvent(models.Model):
+    """Append-only log behind the dashboard activity feed"""
+    KIND_CHOICES = (
+        ('student_created', 'New Student Registered'),
+        ('student_updated', 'Student Updated'),
+        ('students_bulk', 'Students Updated'),
+        ('results_saved', 'Results Saved'),
+        ('results_submitted', 'Results Submitted'),
+        ('results_approved', 'Results Approved'),
+        ('result_rejected', 'Result Rejected'),
+        ('class_created', 'New Class Created'),
+        ('class_updated', 'Class Updated'),
+        ('class_deleted', 'Class Deleted'),
+        ('report_cards', 'Report Cards Generated'),
+    )
+    
+    # kind -> (Font Awesome icon, colour) for the feed
+    KIND_STYLES = {
+        'student_created': ('fa-user-plus', '#10b981'),
+        'student_updated': ('fa-user-edit', '#3b82f6'),
+        'students_bulk': ('fa-users-cog', '#f59e0b'),
+        'results_saved': ('fa-save', '#64748b'),
+        'results_submitted': ('fa-file-upload', '#3b82f6'),
+        'results_approved': ('fa-check-circle', '#10b981'),
+        'result_rejected': ('fa-times-circle', '#ef4444'),
+        'class_created': ('fa-plus-circle', '#8b5cf6'),
+        'class_updated': ('fa-chalkboard', '#8b5cf6'),
+        'class_deleted': ('fa-trash', '#ef4444'),
+        'report_cards': ('fa-file-pdf', '#1e40af'),
+    }
+    
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    description = models.CharField(max_length=255)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at'], name='activity_latest_idx')]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.description}"
+    
+    @property
+    def title(self):
+        return self.get_kind_display()
+    
+    @property
+    def icon(self):
+        return self.KIND_STYLES.get(self.kind, ('fa-info-circle', '#64748b'))[0]
+    
+    @property
+    def color(self):
+        return self.KIND_STYLES.get(self.kind, ('fa-info-circle', '#64748b'))[1]
+    
+    @property
+    def timestamp(self):
+        return self.created_at
+
+
+# ============================================
+# BACKGROUND JOBS
+# ============================================
+
+class Job(models.Model):
+    """Long-running admin work picked up by the run_jobs worker"""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+    
+    def percent(self):
+        if not self.total:
+            return 100 if self.status == 'done' else 0
+        return min(100, int(self.progress * 100 / self.total))
@@ -0,0 +1,123 @@
+# school/pagination.py
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+# ============================================
+# KEYSET (CURSOR) PAGINATION
+# ============================================
+#
+# Pages are fetched with "WHERE (ordering columns) after (cursor values)"
+# instead of OFFSET, so every page costs the same no matter how deep it is.
+# The last ordering field must be unique (normally the id) and none of the
+# ordering fields may be NULL.
+
+def encode_cursor(values):
+    # isoformat() keeps microseconds, which DjangoJSONEncoder would truncate
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    data = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Cursor string back to its list of values, or None if it is invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def cursor_for(obj, ordering):
+    """Cursor that continues after `obj`"""
+    return encode_cursor([getattr(obj, field.lstrip('-')) for field in ordering])
+
+
+def _after(ordering, values):
+    """Q object selecting rows that sort after `values`"""
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, next_cursor, is_first):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(queryset, ordering, cursor=None, per_page=50):
+    """Fetch the page of `queryset` that follows `cursor`"""
+    values = decode_cursor(cursor)
+    if values is not None and len(values) != len(ordering):
+        values = None
+
+    try:
+        page = queryset.filter(_after(ordering, values)) if values is not None else queryset
+        rows = list(page.order_by(*ordering)[:per_page + 1])
+    except (ValidationError, ValueError, TypeError):
+        # A tampered cursor falls back to the first page
+        values = None
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = cursor_for(rows[-1], ordering)
+
+    return KeysetPage(rows, next_cursor, is_first=values is None)
+
+
+# ============================================
+# NUMBERED PAGES WITH A CACHED COUNT
+# ============================================
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator whose COUNT(*) is stored in the cache under `count_key`.
+
+    Counting a large filtered table is the expensive part of numbered
+    pagination, so it runs once per key instead of on every page view.
+    """
+
+    def __init__(self, object_list, per_page, count_key, timeout=60 * 5, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.timeout = timeout
+
+    @property
+    def count(self):
+        if not hasattr(self, '_count'):
+            count = cache.get(self.count_key)
+            if count is None:
+                count = self.object_list.count()
+                cache.set(self.count_key, count, self.timeout)
+            self._count = count
+        return self._count
@@ -0,0 +1,172 @@
+# school/ranking.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, Sum, Window
+from django.db.models.functions import Cast, DenseRank, PercentRank
+
+from .class_stats import invalidate_class_statistics
+from .models import Class, ClassRank, QuarterlyResult, SemesterResult, Student
+
+
+# ============================================
+# CLASS POSITIONS
+# ============================================
+#
+# Positions are dense ranks (equal scores share a position and the next
+# score takes the following number). Percentile is the share of the class
+# scoring strictly lower, from 0 to 100.
+
+def _ordering(field):
+    # Django 5.0 emits invalid SQL on SQLite when a window orders by a
+    # DecimalField, so rank on a float copy of the score
+    return Cast(field, FloatField())
+
+
+def _percentile(value):
+    return Decimal(str(round((value or 0) * 100, 2)))
+
+
+def _rank_courses(results, score_field):
+    """Store position/percentile per course for every row of `results`"""
+    ranked = results.annotate(
+        rank_position=Window(DenseRank(), partition_by=[F('course_id')], order_by=_ordering(score_field).desc()),
+        rank_percent=Window(PercentRank(), partition_by=[F('course_id')], order_by=_ordering(score_field).asc()),
+    ).values_list('id', 'rank_position', 'rank_percent')
+
+    model = results.model
+    rows = [
+        model(id=row_id, position=position, percentile=_percentile(percent))
+        for row_id, position, percent in ranked
+    ]
+    model.objects.bulk_update(rows, ['position', 'percentile'], batch_size=500)
+    return len(rows)
+
+
+def _rank_overall(results, score_field, class_id, **period):
+    """Replace the ClassRank rows of one class and period"""
+    totals = results.values('student_id').annotate(
+        courses=Count('id'),
+        total=Sum(score_field),
+        average=Avg(score_field),
+    ).annotate(
+        rank_position=Window(DenseRank(), order_by=_ordering('average').desc()),
+        rank_percent=Window(PercentRank(), order_by=_ordering('average').asc()),
+    ).order_by()
+
+    ranks = [
+        ClassRank(
+            student_id=row['student_id'],
+            class_assigned_id=class_id,
+            courses=row['courses'],
+            total_score=row['total'],
+            average_score=Decimal(row['average']).quantize(Decimal('0.01')),
+            position=row['rank_position'],
+            percentile=_percentile(row['rank_percent']),
+            **period
+        )
+        for row in totals
+    ]
+    ClassRank.objects.filter(class_assigned_id=class_id, **period).delete()
+    ClassRank.objects.bulk_create(ranks, batch_size=500)
+    return len(ranks)
+
+
+def rank_class_quarter(class_id, quarter_id):
+    """Rank a class for one quarter, per course and overall"""
+    in_class = QuarterlyResult.objects.filter(quarter_id=quarter_id, student__current_class_id=class_id)
+    approved = in_class.filter(status='approved')
+
+    with transaction.atomic():
+        # Rows that lost their approval no longer hold a position
+        in_class.exclude(status='approved').exclude(position=None).update(position=None, percentile=None)
+        _rank_courses(approved, 'score')
+        ranked = _rank_overall(approved, 'score', class_id, quarter_id=quarter_id)
+    # Broadsheets show these positions
+    invalidate_class_statistics([class_id])
+    return ranked
+
+
+def rank_class_semester(class_id, semester_id):
+    """Rank a class for one semester, per course and overall"""
+    results = SemesterResult.objects.filter(semester_id=semester_id, student__current_class_id=class_id)
+
+    with transaction.atomic():
+        _rank_courses(results, 'average_score')
+        ranked = _rank_overall(results, 'average_score', class_id, semester_id=semester_id)
+    invalidate_class_statistics([class_id])
+    return ranked
+
+
+def class_positions(class_id, period, period_id):
+    """{student_id: overall position} of a class for a 'quarter' or a 'semester'"""
+    return dict(ClassRank.objects.filter(
+        class_assigned_id=class_id, **{f'{period}_id': period_id}
+    ).values_list('student_id', 'position'))
+
+
+def _classes_of(student_ids):
+    return set(
+        Student.objects.filter(id__in=set(student_ids), current_class__isnull=False)
+        .values_list('current_class_id', flat=True)
+    )
+
+
+def refresh_quarter_ranks(keys):
+    """Re-rank the (class, quarter) pairs touched by (student_id, course_id, quarter_id) keys"""
+    students_by_quarter = {}
+    for student_id, _, quarter_id in keys:
+        students_by_quarter.setdefault(quarter_id, set()).add(student_id)
+
+    ranked = 0
+    for quarter_id, student_ids in students_by_quarter.items():
+        for class_id in _classes_of(student_ids):
+            rank_class_quarter(class_id, quarter_id)
+            ranked += 1
+    return ranked
+
+
+def refresh_semester_ranks(semester_id, student_ids=None):
+    """Re-rank every class of a semester, or only the classes of `student_ids`"""
+    if student_ids is None:
+        class_ids = set(
+            SemesterResult.objects.filter(semester_id=semester_id, student__current_class__isnull=False)
+            .values_list('student__current_class_id', flat=True).distinct()
+        )
+    else:
+        class_ids = _classes_of(student_ids)
+
+    for class_id in class_ids:
+        rank_class_semester(class_id, semester_id)
+    return len(class_ids)
+
+
+def rerank_moved_students(student_ids, class_ids):
+    """
+    Re-rank the classes students moved between, in the quarters and
+    semesters of each class's academic year that the students have results
+    in. Results carry no class, so the old class keeps a moved student's
+    positions until it is ranked again.
+    """
+    student_ids = set(student_ids)
+    years = dict(Class.objects.filter(pk__in=set(class_ids) - {None}).values_list('pk', 'academic_year_id'))
+    quarters = set(
+        QuarterlyResult.objects.filter(student_id__in=student_ids)
+        .values_list('quarter_id', 'quarter__academic_year_id').distinct()
+    )
+    semesters = set(
+        SemesterResult.objects.filter(student_id__in=student_ids)
+        .values_list('semester_id', 'semester__academic_year_id').distinct()
+    )
+
+    ranked = 0
+    for class_id, year_id in years.items():
+        for quarter_id, quarter_year_id in quarters:
+            if quarter_year_id == year_id:
+                rank_class_quarter(class_id, quarter_id)
+                ranked += 1
+        for semester_id, semester_year_id in semesters:
+            if semester_year_id == year_id:
+                rank_class_semester(class_id, semester_id)
+                ranked += 1
+    return ranked
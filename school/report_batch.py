@@ -0,0 +1,174 @@
+# school/report_batch.py
+import multiprocessing
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils.text import slugify
+
+from .models import Quarter, Semester, Student
+from .reports import quarterly_card_contexts, render_pdf, semester_card_contexts
+
+
+# ============================================
+# BATCH REPORT CARDS
+# ============================================
+#
+# Every card of a class, department or the whole school is built from a
+# handful of queries (students, results, ranks). The cards are then laid
+# out by a pool of forked processes. Each process keeps its own warm
+# WeasyPrint caches (see school.reports).
+#
+# 'zip' output holds one PDF per student. 'pdf' output lays out each class
+# as one merged document. There is no PDF reader among the dependencies to
+# join documents made by different processes, so a scope spanning several
+# classes gets a ZIP of per-class PDFs.
+
+BATCH_SCOPES = ['class', 'department', 'school']
+BATCH_FORMATS = ['zip', 'pdf']
+BATCH_DIR = 'report_cards'
+HEARTBEAT_INTERVAL = 30  # seconds between progress reports while a document renders
+
+CARD_TEMPLATES = {
+    'quarterly': 'school/print_quarterly.html',
+    'semester': 'school/print_semester.html',
+}
+
+
+def batch_students(scope, scope_id=None):
+    """Active students of a class, a department or the whole school, in print order"""
+    students = Student.objects.filter(is_active=True, current_class__isnull=False)
+    if scope == 'class':
+        students = students.filter(current_class_id=scope_id)
+    elif scope == 'department':
+        students = students.filter(current_class__department_id=scope_id)
+    elif scope != 'school':
+        raise ValueError(f'Unknown report card scope: {scope}')
+    return students.select_related('current_class__department').order_by(
+        'current_class__name', 'last_name', 'first_name', 'id'
+    )
+
+
+def batch_contexts(kind, period_id, students):
+    """(period, card contexts) for every student, fetched in a few queries"""
+    if kind == 'quarterly':
+        period = Quarter.objects.select_related('academic_year').get(pk=period_id)
+        return period, quarterly_card_contexts(period, students)
+    if kind == 'semester':
+        period = Semester.objects.select_related('academic_year', 'quarter_1', 'quarter_2').get(pk=period_id)
+        return period, semester_card_contexts(period, students)
+    raise ValueError(f'Unknown report card kind: {kind}')
+
+
+def _init_worker():
+    # Forked children must not reuse the parent's database connections
+    connections.close_all()
+
+
+def _render(task):
+    name, template_name, context, kind = task
+    return name, render_pdf(template_name, context, kind)
+
+
+def _card_name(context, period):
+    student = context['student']
+    return f"{slugify(student.current_class.name)}/{student.admission_number}-{period.name}.pdf"
+
+
+def _tasks(kind, period, contexts, output_format):
+    """(number of cards, render task) per document"""
+    if output_format == 'zip':
+        return [(1, (_card_name(context, period), CARD_TEMPLATES[kind], context, kind)) for context in contexts]
+
+    by_class = {}
+    for context in contexts:
+        by_class.setdefault(context['student'].current_class, []).append(context)
+    return [
+        (len(cards), (
+            f'{slugify(class_.name)}-{period.name}.pdf',
+            'school/print_batch.html',
+            {'cards': cards, 'card_template': f'school/cards/{kind}_card.html', 'period': period},
+            kind,
+        ))
+        for class_, cards in by_class.items()
+    ]
+
+
+def _as_completed(futures, on_wait):
+    """Futures as they finish, calling on_wait() whenever none finished for HEARTBEAT_INTERVAL"""
+    pending = set(futures)
+    while pending:
+        finished, pending = wait(pending, timeout=HEARTBEAT_INTERVAL, return_when=FIRST_COMPLETED)
+        if not finished:
+            on_wait()
+        yield from finished
+
+
+def generate_report_cards(kind, period_id, scope, scope_id=None, output_format='zip',
+                          workers=2, output=None, on_progress=None):
+    """
+    Render the report cards of a scope into one file under MEDIA_ROOT.
+
+    Returns a summary with the path of the file relative to MEDIA_ROOT.
+    `on_progress(done, total)` counts cards: it is called as documents
+    finish, and again every HEARTBEAT_INTERVAL seconds while a long one
+    (a merged class PDF) is still being laid out.
+    """
+    if output_format not in BATCH_FORMATS:
+        raise ValueError(f'Unknown report card format: {output_format}')
+
+    students = list(batch_students(scope, scope_id))
+    period, contexts = batch_contexts(kind, period_id, students)
+    tasks = _tasks(kind, period, contexts, output_format)
+
+    single = output_format == 'pdf' and len(tasks) == 1
+    suffix = 'pdf' if single else 'zip'
+    output = Path(output) if output else (
+        Path(settings.MEDIA_ROOT) / BATCH_DIR / f'{kind}-{period.pk}-{scope}-{scope_id or "all"}.{suffix}'
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(output.name + '.part')
+
+    done = documents = 0
+
+    def report():
+        if on_progress:
+            on_progress(done, len(contexts))
+
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=max(1, workers),
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+    ) as pool:
+        futures = {pool.submit(_render, task): cards for cards, task in tasks}
+        # Each document is written out as soon as it is ready
+        archive = None if single else zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_STORED)
+        try:
+            for future in _as_completed(futures, report):
+                name, pdf = future.result()
+                if archive is None:
+                    partial.write_bytes(pdf)
+                else:
+                    archive.writestr(name, pdf)
+                documents += 1
+                done += futures[future]
+                report()
+        finally:
+            if archive is not None:
+                archive.close()
+    partial.replace(output)
+
+    try:
+        relative = str(output.relative_to(settings.MEDIA_ROOT))
+    except ValueError:
+        relative = None
+    return {
+        'file': relative,
+        'path': str(output),
+        'cards': len(contexts),
+        'documents': documents,
+        'format': suffix,
+    }
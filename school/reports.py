@@ -0,0 +1,194 @@
+# school/reports.py
+import logging
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .grading import grade_for
+from .models import ClassRank, QuarterlyResult, SemesterResult
+from .result_templates import render_result_template
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# REPORT CARD CONTEXT
+# ============================================
+
+def _card_student(student):
+    # WeasyPrint reads the photo from disk; browsers load it from MEDIA_URL
+    photo_uri = Path(student.photo.path).as_uri() if student.photo else ''
+    return {'student': student, 'photo_uri': photo_uri}
+
+
+def _average(scores):
+    scores = [score for score in scores if score is not None]
+    return round(sum(scores) / len(scores), 2) if scores else None
+
+
+def _card_contexts(students, results, ranks, score_field, template_type, **period):
+    """
+    One card context per student from already-fetched rows.
+
+    When the student's department has an active ResultTemplate of this type,
+    its rendered HTML is added as `custom_html` and replaces the default card
+    body.
+    """
+    results_by_student = {}
+    for result in results:
+        result.grade = grade_for(getattr(result, score_field), result.course.department_id)
+        results_by_student.setdefault(result.student_id, []).append(result)
+    rank_by_student = {rank.student_id: rank for rank in ranks}
+
+    contexts = []
+    for student in students:
+        student_results = results_by_student.get(student.pk, [])
+        context = {
+            **_card_student(student),
+            **period,
+            'results': student_results,
+            'average': _average([getattr(result, score_field) for result in student_results]),
+            'rank': rank_by_student.get(student.pk),
+        }
+        if student.current_class is not None:
+            context['custom_html'] = render_result_template(
+                student.current_class.department_id, template_type, context
+            )
+        contexts.append(context)
+    return contexts
+
+
+def quarterly_card_contexts(quarter, students):
+    """Quarterly card contexts for many students: results and ranks in one query each"""
+    results = QuarterlyResult.objects.filter(
+        student__in=students, quarter=quarter, status='approved'
+    ).select_related('course').order_by('course__name')
+    ranks = ClassRank.objects.filter(student__in=students, quarter=quarter)
+    return _card_contexts(students, results, ranks, 'score', 'quarterly', quarter=quarter)
+
+
+def semester_card_contexts(semester, students):
+    """Semester card contexts for many students: results and ranks in one query each"""
+    results = SemesterResult.objects.filter(
+        student__in=students, semester=semester
+    ).select_related('course').order_by('course__name')
+    ranks = ClassRank.objects.filter(student__in=students, semester=semester)
+    return _card_contexts(students, results, ranks, 'average_score', 'semester', semester=semester)
+
+
+def quarterly_card_context(quarter, student):
+    """Template context of one student's quarterly report card"""
+    return quarterly_card_contexts(quarter, [student])[0]
+
+
+def semester_card_context(semester, student):
+    """Template context of one student's semester report card"""
+    return semester_card_contexts(semester, [student])[0]
+
+
+# ============================================
+# PDF RENDERING
+# ============================================
+#
+# WeasyPrint is imported on first use. The font configuration, the parsed
+# report card stylesheet and the decoded-image cache live for the whole
+# process, so after the first card each render only pays for layout and
+# PDF output.
+
+REPORT_CARD_CSS = settings.BASE_DIR / 'static' / 'css' / 'report_card.css'
+IMAGE_CACHE_SIZE = 256
+
+_image_cache = {}
+
+
+@lru_cache(maxsize=None)
+def _font_config():
+    from weasyprint.text.fonts import FontConfiguration
+
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def _stylesheets():
+    from weasyprint import CSS
+
+    return (CSS(filename=str(REPORT_CARD_CSS), font_config=_font_config()),)
+
+
+def render_pdf(template_name, context, kind='report'):
+    """Render a report card template straight to PDF bytes"""
+    from weasyprint import HTML
+
+    started = time.perf_counter()
+    html = render_to_string(template_name, {**context, 'pdf': True})
+    templated = time.perf_counter()
+
+    if len(_image_cache) > IMAGE_CACHE_SIZE:
+        _image_cache.clear()
+    document = HTML(string=html, base_url=str(settings.BASE_DIR)).render(
+        stylesheets=_stylesheets(),
+        font_config=_font_config(),
+        cache=_image_cache,
+    )
+    laid_out = time.perf_counter()
+    pdf = document.write_pdf()
+    finished = time.perf_counter()
+
+    record_render(kind, {
+        'template': templated - started,
+        'layout': laid_out - templated,
+        'write': finished - laid_out,
+        'total': finished - started,
+    }, pages=len(document.pages), size=len(pdf))
+    return pdf
+
+
+# ============================================
+# RENDER METRICS
+# ============================================
+#
+# Per-process timings of every PDF render, split into template, layout and
+# write phases. Each render is also logged on the school.reports logger.
+
+PHASES = ['template', 'layout', 'write', 'total']
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def record_render(kind, timings, pages=0, size=0):
+    with _metrics_lock:
+        entry = _metrics.setdefault(kind, {
+            'renders': 0, 'pages': 0, 'bytes': 0,
+            **{f'{phase}_seconds': 0.0 for phase in PHASES},
+            'max_seconds': 0.0,
+        })
+        entry['renders'] += 1
+        entry['pages'] += pages
+        entry['bytes'] += size
+        for phase in PHASES:
+            entry[f'{phase}_seconds'] += timings[phase]
+        entry['max_seconds'] = max(entry['max_seconds'], timings['total'])
+    logger.info(
+        'Rendered %s PDF: %d pages, %d bytes in %.3fs (template %.3fs, layout %.3fs, write %.3fs)',
+        kind, pages, size, timings['total'], timings['template'], timings['layout'], timings['write'],
+    )
+
+
+def render_metrics():
+    """Snapshot of the render metrics with per-render averages"""
+    with _metrics_lock:
+        snapshot = {kind: dict(entry) for kind, entry in _metrics.items()}
+    for entry in snapshot.values():
+        for phase in PHASES:
+            entry[f'{phase}_average'] = entry[f'{phase}_seconds'] / entry['renders']
+    return snapshot
+
+
+def reset_render_metrics():
+    with _metrics_lock:
+        _metrics.clear()
@@ -0,0 +1,94 @@
+# school/result_templates.py
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.template import TemplateSyntaxError, engines
+from django.utils.safestring import mark_safe
+
+from .models import ResultTemplate
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# COMPILED RESULT TEMPLATES
+# ============================================
+#
+# Admin-authored ResultTemplate.html_content is compiled once into a Django
+# Template and kept in a per-process LRU keyed on (pk, content hash). An
+# edit changes the hash, so a stale compile can never be served even by a
+# process that missed the invalidation. The active template of each
+# department and type is looked up through the shared cache.
+
+TEMPLATE_CACHE_SIZE = 64
+ACTIVE_TIMEOUT = 60 * 60
+ACTIVE_VERSION_KEY = 'result_templates:version'
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def content_hash(html):
+    return hashlib.sha1(html.encode()).hexdigest()
+
+
+def compile_template(pk, html):
+    """Compiled Template for a template's content, from the LRU when possible"""
+    key = (pk, content_hash(html))
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+
+    # Compiled outside the lock; raises TemplateSyntaxError for bad content
+    compiled = engines['django'].from_string(html)
+    with _compiled_lock:
+        for stale in [k for k in _compiled if k[0] == pk and k != key]:
+            del _compiled[stale]
+        _compiled[key] = compiled
+        while len(_compiled) > TEMPLATE_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def invalidate_template(pk):
+    """Drop the compiled versions of one template and every active lookup"""
+    with _compiled_lock:
+        for key in [k for k in _compiled if k[0] == pk]:
+            del _compiled[key]
+    cache.set(ACTIVE_VERSION_KEY, time.time_ns(), None)
+
+
+def active_template(department_id, template_type):
+    """(pk, html_content) of the active template of a department and type, or None"""
+    version = cache.get_or_set(ACTIVE_VERSION_KEY, time.time_ns, None)
+    key = f'result_templates:{version}:{department_id}:{template_type}'
+    found = cache.get(key)
+    if found is None:
+        template = ResultTemplate.objects.filter(
+            department_id=department_id, template_type=template_type, is_active=True
+        ).order_by('-created_at', '-pk').values_list('pk', 'html_content').first()
+        # An empty tuple caches "no active template" as well
+        found = tuple(template) if template else ()
+        cache.set(key, found, ACTIVE_TIMEOUT)
+    return found or None
+
+
+def render_result_template(department_id, template_type, context):
+    """Render the active template for a department and type, or None if there is none"""
+    found = active_template(department_id, template_type)
+    if found is None:
+        return None
+    pk, html = found
+    try:
+        compiled = compile_template(pk, html)
+    except TemplateSyntaxError:
+        # Saved before validation existed; print the default card instead
+        logger.exception('Result template #%s does not compile', pk)
+        return None
+    return mark_safe(compiled.render(context))
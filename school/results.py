@@ -0,0 +1,448 @@
+# school/results.py
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, Max, Q, When
+from django.utils import timezone
+
+from .class_stats import invalidate_student_classes
+from .leaderboards import refresh_semester_boards
+from .models import QuarterlyResult, Semester, SemesterDirtyKey, SemesterResult
+from .ranking import refresh_quarter_ranks, refresh_semester_ranks
+from .signals import results_changed
+
+
+# ============================================
+# QUARTERLY RESULT ENTRY
+# ============================================
+
+SCORE_STEP = Decimal('0.01')
+
+
+def parse_score(value):
+    """Turn a posted score into a Decimal, or None if blank/invalid"""
+    if value in ['', None]:
+        return None
+    try:
+        score = Decimal(str(value).strip()).quantize(SCORE_STEP)
+    except InvalidOperation:
+        return None
+    if score < 0 or score > 100:
+        return None
+    return score
+
+
+def save_quarterly_results(quarter, course, students, teacher, entries):
+    """
+    Save a class sheet of scores in one transaction.
+
+    `entries` maps student_id -> (score, comment) as posted. Existing rows
+    for the sheet are loaded once, only changed rows are written, and the
+    counts of created, updated, unchanged and invalid rows are returned.
+    """
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0}
+    student_ids = [s.id if hasattr(s, 'id') else s for s in students]
+
+    existing = {
+        r.student_id: r for r in QuarterlyResult.objects.filter(
+            quarter=quarter, course=course, student_id__in=student_ids
+        )
+    }
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    reopened = []
+
+    for student_id in student_ids:
+        if student_id not in entries:
+            continue
+        raw_score, comment = entries[student_id]
+        if raw_score in ['', None]:
+            continue
+
+        score = parse_score(raw_score)
+        if score is None:
+            counts['invalid'] += 1
+            continue
+        comment = comment or ''
+
+        result = existing.get(student_id)
+        if result is None:
+            to_create.append(QuarterlyResult(
+                student_id=student_id,
+                course=course,
+                quarter=quarter,
+                teacher=teacher,
+                score=score,
+                teacher_comment=comment,
+                status='draft',
+            ))
+            continue
+
+        if (result.score == score and result.teacher_comment == comment
+                and result.teacher_id == teacher.id and result.status == 'draft'):
+            counts['unchanged'] += 1
+            continue
+        if result.status == 'approved':
+            reopened.append((result.student_id, result.course_id, result.quarter_id))
+
+        result.score = score
+        result.teacher_comment = comment
+        result.teacher = teacher
+        result.status = 'draft'
+        result.updated_at = now
+        to_update.append(result)
+
+    with transaction.atomic():
+        if to_create:
+            # update_conflicts covers a row inserted by a concurrent save
+            QuarterlyResult.objects.bulk_create(
+                to_create,
+                update_conflicts=True,
+                unique_fields=['student', 'course', 'quarter'],
+                update_fields=['teacher', 'score', 'teacher_comment', 'status', 'updated_at'],
+            )
+        if to_update:
+            QuarterlyResult.objects.bulk_update(
+                to_update,
+                ['teacher', 'score', 'teacher_comment', 'status', 'updated_at'],
+            )
+        # Approved scores sent back to draft change the semester inputs and ranks
+        if reopened:
+            mark_semester_dirty(reopened)
+            drain_semester_dirty(keys=reopened)
+            refresh_quarter_ranks(reopened)
+            transaction.on_commit(
+                lambda: results_changed.send(sender=QuarterlyResult, keys=reopened)
+            )
+
+    counts['created'] = len(to_create)
+    counts['updated'] = len(to_update)
+    return counts
+
+
+# ============================================
+# SEMESTER CALCULATION
+# ============================================
+
+SEMESTER_CHUNK_SIZE = 500
+
+
+def semester_quarter_scores(semester, student_ids=None, course_ids=None):
+    """Approved Q1/Q2 scores per (student, course), joined in one aggregate query"""
+    results = QuarterlyResult.objects.filter(
+        quarter_id__in=[semester.quarter_1_id, semester.quarter_2_id],
+        status='approved',
+    )
+    if student_ids is not None:
+        results = results.filter(student_id__in=student_ids)
+    if course_ids is not None:
+        results = results.filter(course_id__in=course_ids)
+
+    return results.values('student_id', 'course_id').annotate(
+        q1_score=Max(Case(When(quarter_id=semester.quarter_1_id, then='score'))),
+        q2_score=Max(Case(When(quarter_id=semester.quarter_2_id, then='score'))),
+    ).order_by()
+
+
+def calculate_semester_results(semester, student_ids=None, course_ids=None,
+                               chunk_size=SEMESTER_CHUNK_SIZE):
+    """
+    Recompute SemesterResult rows for a semester in bulk.
+
+    Both quarters are read in one aggregate query and the rows are upserted
+    in chunks inside a single transaction. Returns counts of inserted,
+    updated and unchanged rows, pairs skipped because one of the quarters
+    has no approved score, and rows deleted because a quarter lost its
+    approval since they were computed.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'deleted': 0}
+    started = timezone.now()
+
+    existing = SemesterResult.objects.filter(semester=semester)
+    if student_ids is not None:
+        existing = existing.filter(student_id__in=student_ids)
+    if course_ids is not None:
+        existing = existing.filter(course_id__in=course_ids)
+    existing = {
+        (student_id, course_id): (row_id, q1_score, q2_score)
+        for row_id, student_id, course_id, q1_score, q2_score in existing.values_list(
+            'id', 'student_id', 'course_id', 'q1_score', 'q2_score'
+        )
+    }
+
+    rows = []
+    complete = set()
+    for row in semester_quarter_scores(semester, student_ids, course_ids):
+        q1_score, q2_score = row['q1_score'], row['q2_score']
+        if q1_score is None or q2_score is None:
+            counts['skipped'] += 1
+            continue
+
+        key = (row['student_id'], row['course_id'])
+        complete.add(key)
+        if key in existing:
+            if existing[key][1:] == (q1_score, q2_score):
+                counts['unchanged'] += 1
+                continue
+            counts['updated'] += 1
+        else:
+            counts['inserted'] += 1
+
+        total = q1_score + q2_score
+        rows.append(SemesterResult(
+            student_id=key[0],
+            course_id=key[1],
+            semester=semester,
+            q1_score=q1_score,
+            q2_score=q2_score,
+            total_score=total,
+            average_score=(total / 2).quantize(SCORE_STEP),
+        ))
+
+    # Pairs without both quarters approved any more must not keep an old result
+    stale = [row_id for key, (row_id, _, _) in existing.items() if key not in complete]
+    counts['deleted'] = len(stale)
+
+    with transaction.atomic():
+        if stale:
+            SemesterResult.objects.filter(id__in=stale).delete()
+        for start in range(0, len(rows), chunk_size):
+            SemesterResult.objects.bulk_create(
+                rows[start:start + chunk_size],
+                update_conflicts=True,
+                unique_fields=['student', 'course', 'semester'],
+                update_fields=['q1_score', 'q2_score', 'total_score', 'average_score'],
+            )
+        if student_ids is None and course_ids is None:
+            # A full recompute covers every pending key of this semester
+            SemesterDirtyKey.objects.filter(semester=semester, marked_at__lte=started).delete()
+
+    # Class statistics and broadsheets summarise the semester results
+    touched = {row.student_id for row in rows} | {
+        student_id for (student_id, course_id) in existing if (student_id, course_id) not in complete
+    }
+    if touched:
+        invalidate_student_classes(touched)
+    return counts
+
+
+def calculate_semester_by_course(semester, on_course=None):
+    """
+    calculate_semester_results for a whole semester, one course at a time.
+
+    Each course is its own short transaction and `on_course(done, total)`
+    is called after each, so a background job can report progress between
+    them. Returns the summed counts.
+    """
+    started = timezone.now()
+    course_ids = sorted(
+        set(QuarterlyResult.objects.filter(
+            quarter_id__in=[semester.quarter_1_id, semester.quarter_2_id], status='approved'
+        ).values_list('course_id', flat=True).distinct())
+        | set(SemesterResult.objects.filter(semester=semester).values_list('course_id', flat=True).distinct())
+    )
+
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'deleted': 0}
+    for done, course_id in enumerate(course_ids, 1):
+        for key, value in calculate_semester_results(semester, course_ids=[course_id]).items():
+            totals[key] += value
+        if on_course:
+            on_course(done, len(course_ids))
+
+    # Every pending key of the semester was covered by the courses above
+    SemesterDirtyKey.objects.filter(semester=semester, marked_at__lte=started).delete()
+    return totals
+
+
+# ============================================
+# INCREMENTAL SEMESTER RECOMPUTATION
+# ============================================
+
+def semester_keys(keys):
+    """(student_id, course_id, semester_id) keys of changed (student_id, course_id, quarter_id) keys"""
+    keys = set(keys)
+    if not keys:
+        return set()
+
+    quarter_ids = {quarter_id for _, _, quarter_id in keys}
+    semesters_by_quarter = {}
+    for semester_id, quarter_1_id, quarter_2_id in Semester.objects.filter(
+        Q(quarter_1_id__in=quarter_ids) | Q(quarter_2_id__in=quarter_ids)
+    ).values_list('id', 'quarter_1_id', 'quarter_2_id'):
+        semesters_by_quarter.setdefault(quarter_1_id, []).append(semester_id)
+        semesters_by_quarter.setdefault(quarter_2_id, []).append(semester_id)
+
+    return {
+        (student_id, course_id, semester_id)
+        for student_id, course_id, quarter_id in keys
+        for semester_id in semesters_by_quarter.get(quarter_id, [])
+    }
+
+
+def mark_semester_dirty(keys):
+    """
+    Flag the semester results touched by changed quarterly results.
+
+    `keys` is an iterable of (student_id, course_id, quarter_id) tuples.
+    Returns the number of dirty keys written.
+    """
+    dirty = semester_keys(keys)
+    if not dirty:
+        return 0
+
+    now = timezone.now()
+    SemesterDirtyKey.objects.bulk_create(
+        [
+            SemesterDirtyKey(student_id=s, course_id=c, semester_id=sem, marked_at=now)
+            for s, c, sem in dirty
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'course', 'semester'],
+        update_fields=['marked_at'],
+    )
+    return len(dirty)
+
+
+def drain_semester_dirty(limit=None, on_group=None, keys=None):
+    """
+    Recompute only the SemesterResult rows flagged by mark_semester_dirty.
+
+    Keys of locked semesters are left in place until the semester is
+    unlocked. Keys re-marked while the drain runs are kept for the next one.
+    `keys` limits the drain to the semester keys of some changed
+    (student_id, course_id, quarter_id) keys; everything else is left for
+    the semester_drain job. `on_group(done, total)` is called after
+    each (semester, course) group.
+    """
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'deleted': 0, 'drained': 0}
+
+    started = timezone.now()
+    pending = SemesterDirtyKey.objects.filter(semester__is_locked=False).order_by('marked_at')
+    if keys is not None:
+        wanted = semester_keys(keys)
+        pending = pending.filter(
+            student_id__in={student_id for student_id, _, _ in wanted},
+            course_id__in={course_id for _, course_id, _ in wanted},
+            semester_id__in={semester_id for _, _, semester_id in wanted},
+        )
+    if limit:
+        pending = pending[:limit]
+    pending = list(pending.values_list('id', 'student_id', 'course_id', 'semester_id'))
+    if keys is not None:
+        # The id filters above are a superset; keep the exact keys
+        pending = [row for row in pending if row[1:] in wanted]
+    if not pending:
+        return totals
+
+    grouped = {}
+    for _, student_id, course_id, semester_id in pending:
+        grouped.setdefault((semester_id, course_id), []).append(student_id)
+
+    semesters = Semester.objects.in_bulk({semester_id for semester_id, _ in grouped})
+    students_by_semester = {}
+    for done, ((semester_id, course_id), student_ids) in enumerate(grouped.items(), 1):
+        counts = calculate_semester_results(
+            semesters[semester_id], student_ids=student_ids, course_ids=[course_id]
+        )
+        for key, value in counts.items():
+            totals[key] += value
+        students_by_semester.setdefault(semester_id, set()).update(student_ids)
+        if on_group:
+            on_group(done, len(grouped))
+
+    for semester_id, student_ids in students_by_semester.items():
+        refresh_semester_ranks(semester_id, student_ids)
+        # A scoped drain runs inside an approval, whose results_changed
+        # signal queues a refresh of the same boards
+        if keys is None:
+            refresh_semester_boards(semester_id, student_ids)
+
+    totals['drained'], _ = SemesterDirtyKey.objects.filter(
+        id__in=[key_id for key_id, _, _, _ in pending], marked_at__lte=started
+    ).delete()
+    return totals
+
+
+# ============================================
+# APPROVAL
+# ============================================
+
+APPROVAL_CHUNK_SIZE = 200
+
+# (scope name, QuarterlyResult field) pairs bulk approval can be limited by
+APPROVAL_SCOPES = [
+    ('quarter', 'quarter_id'),
+    ('class', 'student__current_class_id'),
+    ('course', 'course_id'),
+    ('teacher', 'teacher_id'),
+]
+
+
+def results_approved(keys):
+    """
+    Bring derived data up to date after quarterly results were approved.
+
+    `keys` are the (student_id, course_id, quarter_id) tuples that changed;
+    they are also sent with the results_changed signal. Only the semester
+    results of these keys are recomputed here; a semester_drain job is
+    queued for any other pending keys.
+    """
+    from .jobs import queue_semester_drain  # jobs imports this module
+
+    keys = list(keys)
+    mark_semester_dirty(keys)
+    semesters = drain_semester_dirty(keys=keys)
+    queue_semester_drain()
+    refresh_quarter_ranks(keys)
+    results_changed.send(sender=QuarterlyResult, keys=keys)
+    return semesters
+
+
+def approve_results(user, scope=None, result_ids=None, chunk_size=APPROVAL_CHUNK_SIZE, on_chunk=None):
+    """
+    Approve submitted results in bounded chunks.
+
+    `scope` maps APPROVAL_SCOPES fields to ids and `result_ids` limits the
+    run to rows picked in the approval queue. Each chunk is approved and its
+    derived data refreshed in one short transaction, so the database lock is
+    released between batches and a run that fails part way leaves no
+    approved rows behind without their semester results, ranks and boards;
+    a retry picks up the chunks still submitted. `on_chunk` is called with
+    the progress of every committed chunk.
+    """
+    pending = QuarterlyResult.objects.filter(status='submitted', **(scope or {}))
+    if result_ids is not None:
+        pending = pending.filter(id__in=result_ids)
+    rows = list(pending.order_by('id').values_list('id', 'student_id', 'course_id', 'quarter_id'))
+
+    chunks = []
+    semesters = {}
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        with transaction.atomic():
+            approved = QuarterlyResult.objects.filter(
+                id__in=[row[0] for row in chunk], status='submitted'
+            ).update(
+                status='approved',
+                approved_by=user,
+                approved_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+            counts = results_approved(
+                (student_id, course_id, quarter_id) for _, student_id, course_id, quarter_id in chunk
+            )
+        for key, value in counts.items():
+            semesters[key] = semesters.get(key, 0) + value
+
+        progress = {'chunk': len(chunks) + 1, 'approved': approved, 'done': start + len(chunk), 'total': len(rows)}
+        chunks.append(progress)
+        if on_chunk:
+            on_chunk(progress)
+
+    return {
+        'approved': sum(chunk['approved'] for chunk in chunks),
+        'chunks': chunks,
+        'semesters': semesters or None,
+    }
@@ -0,0 +1,132 @@
+# school/search.py
+import re
+
+from django.db import OperationalError, connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Student
+
+
+# ============================================
+# STUDENT SEARCH INDEX
+# ============================================
+#
+# On SQLite, students are mirrored into an FTS5 table whose rowid is the
+# student id. Searches are prefix matches on every word typed, ranked with
+# bm25. Other backends fall back to icontains over the same columns.
+
+FTS_TABLE = 'school_student_fts'
+SEARCH_COLUMNS = ['first_name', 'middle_name', 'last_name', 'admission_number', 'guardian_name', 'guardian_phone']
+# bm25 weights, in SEARCH_COLUMNS order: the student's own names count most
+SEARCH_WEIGHTS = [10.0, 5.0, 10.0, 10.0, 2.0, 2.0]
+
+_available = {}
+
+
+def create_search_index(schema_editor):
+    """Create and fill the FTS table; returns False where FTS5 is unavailable"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        return False
+    _available.pop(schema_editor.connection.alias, None)
+    _rebuild(schema_editor.connection)
+    return True
+
+
+def drop_search_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        _available.pop(schema_editor.connection.alias, None)
+
+
+def search_index_available():
+    """True when the FTS table exists on the default database"""
+    if connection.alias not in _available:
+        _available[connection.alias] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available[connection.alias]
+
+
+def _rebuild(conn):
+    columns = ', '.join(SEARCH_COLUMNS)
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+            f'SELECT id, {columns} FROM {Student._meta.db_table}'
+        )
+
+
+def rebuild_search_index():
+    """Re-fill the index from the students table (after raw or bulk loads)"""
+    if not search_index_available():
+        return False
+    _rebuild(connection)
+    return True
+
+
+def index_students(students):
+    """Add or refresh the index rows of `students`"""
+    if not search_index_available():
+        return
+    rows = [[student.pk] + [getattr(student, column) for column in SEARCH_COLUMNS] for student in students]
+    placeholders = ', '.join(['%s'] * (len(SEARCH_COLUMNS) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[row[0]] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES ({placeholders})", rows
+        )
+
+
+def unindex_students(student_ids):
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[pk] for pk in student_ids])
+
+
+# ============================================
+# SEARCHING
+# ============================================
+
+def match_query(term):
+    """FTS5 query matching every word of `term` as a prefix, or '' if none"""
+    words = re.findall(r'\w+', term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_students(queryset, term):
+    """
+    Students of `queryset` matching `term`, annotated with `search_rank`.
+
+    A lower rank is a better match; order by ('search_rank', ...) to list
+    the best matches first.
+    """
+    if search_index_available():
+        query = match_query(term)
+        if not query:
+            # Still annotated, so callers can order by the rank
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query])
+        ).annotate(search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            [query],
+            output_field=FloatField(),
+        ))
+
+    condition = Q()
+    for column in SEARCH_COLUMNS:
+        condition |= Q(**{f'{column}__icontains': term})
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,391 @@
+# school/signals.py
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .autocomplete import invalidate_autocomplete
+from .card_cache import invalidate_department_cards, invalidate_result_cards, invalidate_student_cards
+from .class_stats import invalidate_class_statistics, invalidate_student_classes
+from .cube import refresh_cells, refresh_cube
+from .dashboard import invalidate_admin_stats, invalidate_student_counts, invalidate_teacher_progress
+from .grading import invalidate_scale
+from .leaderboards import refresh_leaderboards, refresh_student_boards, renumber_board
+from .models import (
+    Class, Course, Department, GradeBoundary, GradeScale, LeaderboardEntry, Quarter, QuarterlyResult,
+    ResultTemplate, Semester, Student, User,
+)
+from .ranking import rerank_moved_students
+from .result_templates import invalidate_template
+from .search import index_students, unindex_students
+from .trends import refresh_department_trends, refresh_student_trends, refresh_trends
+
+
+# Sent with keys=[(student_id, course_id, quarter_id), ...] whenever approved
+# quarterly results change (approval, or an approved score sent back to draft)
+results_changed = Signal()
+
+# Approval and rejection save only these fields; approvals reach the derived
+# data through results_changed, so the post_save receivers below skip them
+RESULT_STATUS_FIELDS = {'status', 'approved_by', 'approved_at', 'submitted_at', 'updated_at'}
+
+
+def status_only(update_fields):
+    """True for a QuarterlyResult save that changed nothing but its status"""
+    return update_fields is not None and set(update_fields) <= RESULT_STATUS_FIELDS
+
+
+def login_only(sender, update_fields):
+    """True for the save that records a user's last login, which no cached data depends on"""
+    return sender is User and update_fields is not None and set(update_fields) == {'last_login'}
+
+
+# ============================================
+# GRADE SCALE CACHE
+# ============================================
+
+@receiver(pre_save, sender=GradeScale)
+def remember_scale_department(sender, instance, **kwargs):
+    # A scale moved to another department must also clear the old one
+    instance._previous_department_id = None
+    if instance.pk:
+        instance._previous_department_id = GradeScale.objects.filter(
+            pk=instance.pk
+        ).values_list('department_id', flat=True).first()
+
+
+@receiver(post_save, sender=GradeScale)
+@receiver(post_delete, sender=GradeScale)
+def grade_scale_changed(sender, instance, **kwargs):
+    invalidate_scale(instance.department_id)
+    invalidate_class_statistics()
+    schedule_department_grades(instance.department_id)
+    previous = getattr(instance, '_previous_department_id', None)
+    if previous and previous != instance.department_id:
+        invalidate_scale(previous)
+        schedule_department_grades(previous)
+
+
+def refresh_department_grades(department_id):
+    # Cube cells count grades of the department's courses; trends flag scores below its pass mark
+    invalidate_scale(department_id)
+    refresh_cells(course_ids=Course.objects.filter(department_id=department_id).values_list('pk', flat=True))
+    refresh_department_trends(department_id)
+
+
+_scheduled_grades = threading.local()
+
+
+def schedule_department_grades(department_id):
+    """
+    Refresh a department's graded data once the transaction commits.
+
+    Saving a scale with its boundaries (the admin inline) fires a signal per
+    row. Each call queues its own callback, but the callbacks of one
+    department share a flag until one of them runs, so the refresh happens
+    once per commit. A rolled back savepoint drops its callbacks with
+    nothing to undo: the ones that survive still find the flag down.
+    Outside a transaction the refresh runs straight away.
+    """
+    pending = getattr(_scheduled_grades, 'pending', None)
+    if pending is None:
+        pending = _scheduled_grades.pending = {}
+    state = pending.setdefault(department_id, {'done': False})
+
+    def refresh():
+        if state['done']:
+            return
+        state['done'] = True
+        if pending.get(department_id) is state:
+            del pending[department_id]
+        refresh_department_grades(department_id)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=GradeBoundary)
+@receiver(post_delete, sender=GradeBoundary)
+def grade_boundary_changed(sender, instance, **kwargs):
+    department_id = GradeScale.objects.filter(
+        pk=instance.scale_id
+    ).values_list('department_id', flat=True).first()
+    if department_id:
+        invalidate_scale(department_id)
+        schedule_department_grades(department_id)
+    invalidate_class_statistics()
+
+
+# ============================================
+# DASHBOARD SNAPSHOT
+# ============================================
+
+DASHBOARD_MODELS = [Student, User, Class, QuarterlyResult, Quarter, Course, Department]
+
+
+def dashboard_data_changed(sender, **kwargs):
+    if login_only(sender, kwargs.get('update_fields')):
+        return
+    invalidate_admin_stats()
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(dashboard_data_changed, sender=model, dispatch_uid=f'dashboard_{model.__name__}_save')
+    post_delete.connect(dashboard_data_changed, sender=model, dispatch_uid=f'dashboard_{model.__name__}_delete')
+
+# Queryset updates (approval, submission) bypass post_save
+results_changed.connect(dashboard_data_changed, dispatch_uid='dashboard_results_changed')
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+def student_list_changed(sender, **kwargs):
+    invalidate_student_counts()
+
+
+@receiver(results_changed)
+def approved_results_changed(sender, keys, **kwargs):
+    # Approvals move counts on the dashboards of the teachers who entered them
+    student_ids = {student_id for student_id, _, _ in keys}
+    course_ids = {course_id for _, course_id, _ in keys}
+    quarter_ids = {quarter_id for _, _, quarter_id in keys}
+    teacher_ids = QuarterlyResult.objects.filter(
+        student_id__in=student_ids, course_id__in=course_ids, quarter_id__in=quarter_ids
+    ).values_list('teacher_id', flat=True).distinct()
+    invalidate_teacher_progress(set(teacher_ids))
+
+
+# ============================================
+# STUDENT SEARCH INDEX
+# ============================================
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, **kwargs):
+    index_students([instance])
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    unindex_students([instance.pk])
+
+
+# ============================================
+# AUTOCOMPLETE
+# ============================================
+
+AUTOCOMPLETE_MODELS = {Student: 'students', User: 'teachers', Course: 'courses', Class: 'classes'}
+
+
+def autocomplete_data_changed(sender, **kwargs):
+    if login_only(sender, kwargs.get('update_fields')):
+        return
+    invalidate_autocomplete(AUTOCOMPLETE_MODELS[sender])
+
+
+for model in AUTOCOMPLETE_MODELS:
+    post_save.connect(autocomplete_data_changed, sender=model, dispatch_uid=f'autocomplete_{model.__name__}_save')
+    post_delete.connect(autocomplete_data_changed, sender=model, dispatch_uid=f'autocomplete_{model.__name__}_delete')
+
+
+# ============================================
+# RESULT TEMPLATES
+# ============================================
+
+@receiver(post_save, sender=ResultTemplate)
+@receiver(post_delete, sender=ResultTemplate)
+def result_template_changed(sender, instance, **kwargs):
+    invalidate_template(instance.pk)
+    invalidate_department_cards(instance.department_id, instance.template_type)
+
+
+# ============================================
+# REPORT CARD DOCUMENTS
+# ============================================
+# Cached cards are content-addressed, so these only reclaim disk space early
+
+@receiver(results_changed)
+def report_card_results_changed(sender, keys, **kwargs):
+    invalidate_result_cards(keys)
+
+
+@receiver(post_save, sender=QuarterlyResult)
+@receiver(post_delete, sender=QuarterlyResult)
+def report_card_result_edited(sender, instance, **kwargs):
+    if status_only(kwargs.get('update_fields')):
+        return
+    # A single edit does not move positions; approvals arrive through results_changed
+    invalidate_result_cards([(instance.student_id, instance.course_id, instance.quarter_id)], whole_class=False)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def report_card_student_changed(sender, instance, **kwargs):
+    invalidate_student_cards([instance.pk])
+
+
+# ============================================
+# LEADERBOARDS
+# ============================================
+
+@receiver(results_changed)
+def leaderboard_results_changed(sender, keys, **kwargs):
+    from .jobs import queue_leaderboard_refresh  # jobs imports results, which imports this module
+
+    # An approval feeds a dozen boards per key; renumbering them is left to
+    # a job so it stays out of the request
+    keys = list(keys)
+    transaction.on_commit(lambda: queue_leaderboard_refresh(keys))
+
+
+@receiver(post_save, sender=QuarterlyResult)
+def leaderboard_result_saved(sender, instance, **kwargs):
+    if status_only(kwargs.get('update_fields')):
+        return
+    # Only approved scores are ranked; approvals themselves come through results_changed
+    if instance.status == 'approved':
+        refresh_leaderboards([(instance.student_id, instance.course_id, instance.quarter_id)])
+
+
+@receiver(post_delete, sender=QuarterlyResult)
+def leaderboard_result_deleted(sender, instance, **kwargs):
+    refresh_leaderboards([(instance.student_id, instance.course_id, instance.quarter_id)])
+
+
+@receiver(pre_save, sender=Student)
+def remember_student_placement(sender, instance, **kwargs):
+    instance._previous_placement = None
+    if instance.pk:
+        instance._previous_placement = Student.objects.filter(
+            pk=instance.pk
+        ).values_list('is_active', 'current_class_id').first()
+
+
+@receiver(post_save, sender=Student)
+def leaderboard_student_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_placement', None)
+    if not created and previous and previous != (instance.is_active, instance.current_class_id):
+        refresh_student_boards([instance.pk])
+
+
+@receiver(pre_delete, sender=Student)
+def remember_student_boards(sender, instance, **kwargs):
+    instance._leaderboards = list(LeaderboardEntry.objects.filter(student=instance).values_list(
+        'scope', 'scope_id', 'period', 'period_id', 'average_score'
+    ))
+
+
+@receiver(post_delete, sender=Student)
+def leaderboard_student_deleted(sender, instance, **kwargs):
+    # The entries went with the student; close the gaps they left
+    for *board, average in getattr(instance, '_leaderboards', []):
+        renumber_board(tuple(board), below=average)
+
+
+# ============================================
+# CLASS POSITIONS
+# ============================================
+
+@receiver(post_save, sender=Student)
+def ranks_student_moved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_placement', None)
+    if previous and previous[1] != instance.current_class_id:
+        rerank_moved_students([instance.pk], {previous[1], instance.current_class_id})
+
+
+# ============================================
+# CLASS STATISTICS
+# ============================================
+
+@receiver(results_changed)
+def class_statistics_results_changed(sender, keys, **kwargs):
+    invalidate_student_classes(student_id for student_id, _, _ in keys)
+
+
+@receiver(post_save, sender=QuarterlyResult)
+@receiver(post_delete, sender=QuarterlyResult)
+def class_statistics_result_edited(sender, instance, **kwargs):
+    if status_only(kwargs.get('update_fields')):
+        return
+    invalidate_student_classes([instance.student_id])
+
+
+@receiver(post_save, sender=Student)
+def class_statistics_student_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_placement', None)
+    if previous and previous != (instance.is_active, instance.current_class_id):
+        invalidate_class_statistics({previous[1], instance.current_class_id} - {None})
+
+
+# ============================================
+# RESULT CUBE
+# ============================================
+
+@receiver(results_changed)
+def cube_results_changed(sender, keys, **kwargs):
+    refresh_cube(keys)
+
+
+@receiver(post_save, sender=QuarterlyResult)
+@receiver(post_delete, sender=QuarterlyResult)
+def cube_result_edited(sender, instance, **kwargs):
+    if status_only(kwargs.get('update_fields')):
+        return
+    refresh_cube([(instance.student_id, instance.course_id, instance.quarter_id)])
+
+
+@receiver(post_save, sender=Student)
+def cube_student_changed(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_placement', None)
+    if previous and previous[1] != instance.current_class_id:
+        refresh_cells(class_ids={previous[1], instance.current_class_id} - {None})
+
+
+# ============================================
+# STUDENT TRENDS
+# ============================================
+
+@receiver(results_changed)
+def trend_results_changed(sender, keys, **kwargs):
+    refresh_trends(keys)
+
+
+@receiver(post_save, sender=QuarterlyResult)
+def trend_result_saved(sender, instance, **kwargs):
+    if status_only(kwargs.get('update_fields')):
+        return
+    # Only approved scores make up the trends; approvals themselves come through results_changed
+    if instance.status == 'approved':
+        refresh_student_trends([instance.student_id])
+
+
+@receiver(post_delete, sender=QuarterlyResult)
+def trend_result_deleted(sender, instance, **kwargs):
+    refresh_student_trends([instance.student_id])
+
+
+@receiver(post_save, sender=Student)
+def trend_student_changed(sender, instance, created, **kwargs):
+    # The overall pass mark follows the department of the student's class
+    previous = getattr(instance, '_previous_placement', None)
+    if previous and previous[1] != instance.current_class_id:
+        refresh_student_trends([instance.pk])
+
+
+# ============================================
+# SEMESTER RESULTS
+# ============================================
+# Dirty keys of a locked semester wait in SemesterDirtyKey until it is unlocked
+
+@receiver(pre_save, sender=Semester)
+def remember_semester_lock(sender, instance, **kwargs):
+    instance._was_locked = bool(instance.pk) and Semester.objects.filter(pk=instance.pk, is_locked=True).exists()
+
+
+@receiver(post_save, sender=Semester)
+def semester_unlocked(sender, instance, created, **kwargs):
+    from .jobs import queue_semester_drain  # jobs imports results, which imports this module
+
+    if getattr(instance, '_was_locked', False) and not instance.is_locked:
+        transaction.on_commit(queue_semester_drain)
@@ -1,3 +1,1410 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+import time
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import card_cache, grading, report_batch, result_templates, results, signals
+from .activity import prune_activity, recent_activity, record_activity
+from .autocomplete import autocomplete
+from .broadsheet import get_broadsheet
+from .class_stats import get_class_statistics
+from .cube import rebuild_cube, rollup
+from .dashboard import compute_admin_stats, compute_teacher_progress, get_admin_stats, get_teacher_progress
+from .exports import export_filename, export_filters
+from .history import build_student_history, get_student_history
+from .jobs import (
+    JOB_HANDLERS, STALE_AFTER, claim_jobs, enqueue, fail_job, heartbeat, job_handler, requeue_stale_jobs, run_job,
+)
+from .leaderboards import leaderboard_page, rebuild_leaderboards, renumber_board
+from .models import (
+    AcademicYear, ActivityEvent, Class, ClassRank, Course, Department, GradeBoundary, GradeScale, Job,
+    LeaderboardEntry, Quarter, QuarterlyResult, ResultTemplate, Semester, SemesterDirtyKey, SemesterResult,
+    Student, StudentTrend, TeacherAssignment, User,
+)
+from .pagination import cursor_for, decode_cursor, encode_cursor, keyset_page
+from .ranking import refresh_quarter_ranks
+from .reports import quarterly_card_contexts, record_render, render_metrics, reset_render_metrics
+from .results import approve_results, drain_semester_dirty, mark_semester_dirty, results_approved, save_quarterly_results
+from .search import match_query, search_index_available, search_students
+from .trends import at_risk_students, rebuild_trends, student_trends
+
+
+# Derived data (grade scales, statistics) is cached; keep each run's cache to itself
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_school(students=3):
+    """A department with one class, two courses, a semester and some students"""
+    department = Department.objects.create(name='Primary', code='PRI')
+    year = AcademicYear.objects.create(
+        name='2024/2025', start_date=datetime.date(2024, 9, 1), end_date=datetime.date(2025, 7, 1), is_active=True,
+    )
+    teacher = User.objects.create_user(username='teacher', password='x', role='teacher')
+    admin = User.objects.create_user(username='admin', password='x', role='admin')
+    school_class = Class.objects.create(name='Grade 1A', department=department, academic_year=year, class_teacher=teacher)
+    math = Course.objects.create(name='Math', code='M1', department=department)
+    english = Course.objects.create(name='English', code='E1', department=department)
+    quarter_1 = Quarter.objects.create(
+        name='Q1', academic_year=year, start_date=year.start_date, end_date=year.end_date, is_active=True,
+    )
+    quarter_2 = Quarter.objects.create(name='Q2', academic_year=year, start_date=year.start_date, end_date=year.end_date)
+    semester = Semester.objects.create(name='S1', academic_year=year, quarter_1=quarter_1, quarter_2=quarter_2)
+    pupils = [
+        Student.objects.create(
+            admission_number=f'A{index:03d}', first_name=f'First{index}', last_name=f'Last{index}',
+            gender='F', date_of_birth=datetime.date(2015, 1, 1), current_class=school_class,
+            guardian_name='Guardian', guardian_phone=f'0240000{index:03d}', guardian_address='Accra',
+        )
+        for index in range(students)
+    ]
+    return {
+        'teacher': teacher, 'admin': admin, 'class': school_class, 'math': math, 'english': english,
+        'quarter_1': quarter_1, 'quarter_2': quarter_2, 'semester': semester, 'students': pupils,
+    }
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SaveQuarterlyResultsTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school()
+
+    def save(self, entries):
+        return save_quarterly_results(
+            self.school['quarter_1'], self.school['math'], self.school['students'], self.school['teacher'], entries,
+        )
+
+    def scores(self):
+        return dict(QuarterlyResult.objects.values_list('student_id', 'score'))
+
+    def test_counts_created_updated_unchanged_and_invalid(self):
+        first, second, third = self.school['students']
+        counts = self.save({first.id: ('75', 'Good'), second.id: ('101', ''), third.id: ('', '')})
+        self.assertEqual(counts, {'created': 1, 'updated': 0, 'unchanged': 0, 'invalid': 1})
+
+        counts = self.save({first.id: ('75', 'Good'), second.id: ('60.5', ''), third.id: ('abc', '')})
+        self.assertEqual(counts, {'created': 1, 'updated': 0, 'unchanged': 1, 'invalid': 1})
+
+        counts = self.save({first.id: ('80', 'Good'), second.id: ('60.5', '')})
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 1, 'invalid': 0})
+        self.assertEqual(self.scores(), {first.id: Decimal('80.00'), second.id: Decimal('60.50')})
+
+    def test_new_score_sends_approved_result_back_to_draft(self):
+        student = self.school['students'][0]
+        self.save({student.id: ('70', '')})
+        QuarterlyResult.objects.update(status='approved')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = self.save({student.id: ('72', '')})
+
+        self.assertEqual(counts['updated'], 1)
+        result = QuarterlyResult.objects.get()
+        self.assertEqual((result.score, result.status), (Decimal('72.00'), 'draft'))
+
+    def test_only_posted_students_are_written(self):
+        student = self.school['students'][1]
+        self.save({student.id: ('50', '')})
+        self.assertEqual(list(QuarterlyResult.objects.values_list('student_id', flat=True)), [student.id])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SemesterDrainTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school()
+        self.keys = []
+        for quarter in (self.school['quarter_1'], self.school['quarter_2']):
+            for index, student in enumerate(self.school['students']):
+                for course in (self.school['math'], self.school['english']):
+                    QuarterlyResult.objects.create(
+                        student=student, course=course, quarter=quarter, teacher=self.school['teacher'],
+                        score=80 - index, status='approved',
+                    )
+                    self.keys.append((student.id, course.id, quarter.id))
+
+    def math_keys(self):
+        return [key for key in self.keys if key[1] == self.school['math'].id]
+
+    def math_positions(self):
+        return list(SemesterResult.objects.filter(course=self.school['math']).order_by(
+            'position').values_list('student_id', 'position'))
+
+    def test_approval_computes_semester_results(self):
+        counts = results_approved(self.math_keys())
+        self.assertEqual(counts['inserted'], 3)
+        students = self.school['students']
+        self.assertEqual(self.math_positions(), [(students[0].id, 1), (students[1].id, 2), (students[2].id, 3)])
+
+    def test_reopened_quarter_drops_semester_result_and_reranks(self):
+        results_approved(self.math_keys())
+        students = self.school['students']
+
+        # A new score sends the approved Q1 row back to draft
+        with self.captureOnCommitCallbacks(execute=True):
+            save_quarterly_results(
+                self.school['quarter_1'], self.school['math'], students, self.school['teacher'],
+                {students[0].id: ('50', '')},
+            )
+
+        self.assertFalse(SemesterResult.objects.filter(student=students[0], course=self.school['math']).exists())
+        self.assertEqual(self.math_positions(), [(students[1].id, 1), (students[2].id, 2)])
+        self.assertFalse(SemesterDirtyKey.objects.exists())
+
+    def test_drain_deletes_rows_that_lost_an_approval(self):
+        results_approved(self.math_keys())
+        student = self.school['students'][1]
+        QuarterlyResult.objects.filter(
+            student=student, course=self.school['math'], quarter=self.school['quarter_2'],
+        ).update(status='draft')
+        mark_semester_dirty([(student.id, self.school['math'].id, self.school['quarter_2'].id)])
+
+        counts = drain_semester_dirty()
+
+        self.assertEqual((counts['deleted'], counts['drained']), (1, 1))
+        students = self.school['students']
+        self.assertEqual(self.math_positions(), [(students[0].id, 1), (students[2].id, 2)])
+
+    def test_approval_drains_only_its_own_keys(self):
+        other = (self.school['students'][2].id, self.school['english'].id, self.school['quarter_1'].id)
+        mark_semester_dirty([other])
+
+        counts = results_approved(self.math_keys())
+
+        self.assertEqual(counts['drained'], 3)
+        self.assertEqual(
+            list(SemesterDirtyKey.objects.values_list('student_id', 'course_id', 'semester_id')),
+            [(other[0], other[1], self.school['semester'].id)],
+        )
+        self.assertFalse(SemesterResult.objects.filter(course=self.school['english']).exists())
+
+        # The global drain picks up what the approval left
+        self.assertEqual(drain_semester_dirty()['inserted'], 1)
+        self.assertFalse(SemesterDirtyKey.objects.exists())
+
+    def test_locked_semester_keys_wait_until_unlocked(self):
+        semester = self.school['semester']
+        semester.is_locked = True
+        semester.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            results_approved(self.math_keys())
+
+        self.assertEqual(SemesterDirtyKey.objects.count(), 3)
+        self.assertFalse(Job.objects.filter(kind='semester_drain').exists())
+
+        semester.is_locked = False
+        with self.captureOnCommitCallbacks(execute=True):
+            semester.save()
+
+        self.assertEqual(list(Job.objects.filter(kind='semester_drain').values_list('status', flat=True)), ['queued'])
+        self.assertEqual(drain_semester_dirty()['inserted'], 3)
+        self.assertFalse(SemesterDirtyKey.objects.exists())
+
+    def test_leftover_keys_queue_one_drain_job(self):
+        other = (self.school['students'][2].id, self.school['english'].id, self.school['quarter_1'].id)
+        mark_semester_dirty([other])
+
+        results_approved(self.math_keys()[:2])
+        results_approved(self.math_keys()[2:])
+
+        self.assertEqual(Job.objects.filter(kind='semester_drain', status='queued').count(), 1)
+
+    def test_no_drain_job_without_leftover_keys(self):
+        results_approved(self.math_keys())
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(TestCase):
+    ordering = ['last_name', 'first_name', 'id']
+
+    def setUp(self):
+        self.school = make_school(students=7)
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor([moment, 'Last1', 4])), [moment.isoformat(), 'Last1', 4])
+
+    def test_invalid_cursors_decode_to_none(self):
+        for cursor in ['', None, 'not base64!', encode_cursor({'id': 1})[:-2], 'e30']:
+            self.assertIsNone(decode_cursor(cursor), cursor)
+
+    def test_pages_follow_each_other(self):
+        seen = []
+        cursor = None
+        while True:
+            page = keyset_page(Student.objects.all(), self.ordering, cursor, per_page=3)
+            self.assertEqual(page.is_first, cursor is None)
+            seen.extend(student.id for student in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        expected = list(Student.objects.order_by(*self.ordering).values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(page), 1)
+
+    def test_descending_ordering(self):
+        ordering = ['-last_name', '-id']
+        first = keyset_page(Student.objects.all(), ordering, per_page=4)
+        second = keyset_page(Student.objects.all(), ordering, first.next_cursor, per_page=4)
+        names = [student.last_name for student in [*first, *second]]
+        self.assertEqual(names, sorted(names, reverse=True))
+        self.assertIsNone(second.next_cursor)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        first = keyset_page(Student.objects.all(), self.ordering, per_page=3)
+        student = first.object_list[0]
+        for cursor in ['garbage', encode_cursor(['Last1']), encode_cursor(['Last1', 'First1', 'x'])]:
+            page = keyset_page(Student.objects.all(), self.ordering, cursor, per_page=3)
+            self.assertTrue(page.is_first, cursor)
+            self.assertEqual(page.object_list[0], student)
+        self.assertEqual(first.next_cursor, cursor_for(first.object_list[-1], self.ordering))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StudentListPagingTests(TestCase):
+
+    def setUp(self):
+        make_school(students=9)
+        self.client.force_login(User.objects.get(username='admin'))
+        for name, value in [('STUDENT_PAGE_SIZE', 2), ('STUDENT_OFFSET_PAGES', 2)]:
+            patcher = mock.patch(f'school.views.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def walk(self):
+        pages = []
+        params = {}
+        while True:
+            context = self.client.get('/students/', params).context
+            pages.append((context['page_number'], context['page_links'], len(context['students'])))
+            if not context['next_cursor']:
+                return pages, context
+            params = {'page': context['page_number'] + 1, 'cursor': context['next_cursor']}
+
+    def test_next_runs_past_the_numbered_pages_with_true_labels(self):
+        pages, context = self.walk()
+        ellipsis = context['ellipsis']
+        self.assertEqual(context['num_pages'], 5)
+        self.assertEqual(pages, [
+            (1, [1, 2], 2), (2, [1, 2], 2), (3, [1, 2, 3], 2),
+            (4, [1, 2, ellipsis, 4], 2), (5, [1, 2, ellipsis, 5], 1),
+        ])
+
+    def test_deep_numbered_page_redirects_to_the_last_numbered_one(self):
+        response = self.client.get('/students/', {'page': 4, 'gender': 'F'})
+        self.assertRedirects(response, '/students/?gender=F&page=2', fetch_redirect_response=False)
+
+    def test_cursor_page_label_stays_within_the_count(self):
+        first = self.client.get('/students/').context
+        context = self.client.get('/students/', {'page': 99, 'cursor': first['next_cursor']}).context
+        self.assertEqual(context['page_number'], 4)
+        context = self.client.get('/students/', {'page': 99, 'cursor': 'garbage'}).context
+        self.assertEqual(context['page_number'], 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StudentSearchTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        self.first, self.second, self.third = self.school['students']
+        self.first.first_name, self.first.last_name = 'Ama', 'Mensah'
+        self.first.save()
+        self.second.first_name, self.second.guardian_name = 'Kofi', 'Ama Boateng'
+        self.second.save()
+
+    def search(self, term):
+        return list(search_students(Student.objects.all(), term).order_by('search_rank', 'id').values_list('pk', flat=True))
+
+    def test_match_query_quotes_words_as_prefixes(self):
+        self.assertEqual(match_query('ama  "men'), '"ama"* "men"*')
+        self.assertEqual(match_query(' -* '), '')
+
+    def test_index_is_available(self):
+        self.assertTrue(search_index_available())
+
+    def test_own_names_rank_above_guardians(self):
+        self.assertEqual(self.search('ama'), [self.first.pk, self.second.pk])
+        self.assertEqual(self.search('am mens'), [self.first.pk])
+        self.assertEqual(self.search('*'), [])
+
+    def test_punctuation_only_search_lists_nothing(self):
+        self.client.force_login(self.school['admin'])
+        response = self.client.get('/students/', {'search': '*'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['students']), [])
+
+    def test_edits_and_deletes_reach_the_index(self):
+        self.third.last_name = 'Owusu'
+        self.third.save()
+        self.assertEqual(self.search('owu'), [self.third.pk])
+
+        self.third.delete()
+        self.assertEqual(self.search('owu'), [])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=2)
+        self.teacher = self.school['teacher']
+        self.teacher.first_name, self.teacher.last_name = 'Efua', 'Sarpong'
+        self.teacher.save()
+
+    def texts(self, kind, term):
+        return [row['text'] for row in autocomplete(kind, term)]
+
+    def test_every_word_is_a_prefix_of_some_field(self):
+        self.assertEqual(self.texts('courses', 'ma'), ['M1 - Math'])
+        self.assertEqual(self.texts('courses', 'E1'), ['E1 - English'])
+        self.assertEqual(self.texts('teachers', 'SARP ef'), ['Efua Sarpong (Teacher)'])
+        self.assertEqual(self.texts('teachers', 'sarp x'), [])
+        self.assertEqual(self.texts('students', 'first1'), ['A001 - First1 Last1'])
+        self.assertEqual(self.texts('classes', '   '), [])
+
+    def test_edits_retire_cached_answers(self):
+        self.assertEqual(self.texts('courses', 'sci'), [])
+        Course.objects.create(name='Science', code='S1', department=self.school['class'].department)
+        self.assertEqual(self.texts('courses', 'sci'), ['S1 - Science'])
+
+        # A login is not an edit
+        with mock.patch('school.signals.invalidate_autocomplete') as invalidate:
+            self.client.login(username='teacher', password='x')
+        invalidate.assert_not_called()
+
+    def test_view_is_admin_only(self):
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get('/autocomplete/courses/', {'q': 'ma'}).status_code, 403)
+
+        self.client.force_login(self.school['admin'])
+        self.assertEqual(self.client.get('/autocomplete/rooms/', {'q': 'ma'}).status_code, 404)
+        response = self.client.get('/autocomplete/courses/', {'q': 'ma'})
+        self.assertEqual(response.json(), {'results': [{'id': self.school['math'].pk, 'text': 'M1 - Math'}]})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StudentHistoryTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=1)
+        self.student = self.school['students'][0]
+        self.addCleanup(grading.invalidate_scale, self.school['class'].department_id)
+        self.results = {}
+        for course, quarter, score, status in [
+            ('math', 'quarter_1', 70, 'approved'),
+            ('math', 'quarter_2', 80, 'approved'),
+            ('english', 'quarter_1', 60, 'approved'),
+            ('english', 'quarter_2', 95, 'draft'),
+        ]:
+            self.results[course, quarter] = QuarterlyResult.objects.create(
+                student=self.student, course=self.school[course], quarter=self.school[quarter],
+                teacher=self.school['teacher'], score=score, status=status,
+            )
+
+    def test_approved_scores_pivot_by_course_and_quarter(self):
+        with self.assertNumQueries(2):
+            year, = build_student_history(self.student.pk)
+        self.assertEqual([quarter['name'] for quarter in year['quarters']], ['Q1', 'Q2'])
+        english, math = year['courses']
+        self.assertEqual((english['scores'], english['semesters'], english['annual']), ([60, None], [None], 60))
+        self.assertEqual((math['scores'], math['deltas'], math['semesters']), ([70, 80], [None, 10], [75]))
+        self.assertEqual((year['quarter_averages'], year['quarter_deltas']), ([65, 80], [None, 15]))
+        self.assertEqual((year['semesters'][0]['average'], year['annual_average']), (75, Decimal('72.50')))
+
+    def test_result_edits_give_a_new_projection(self):
+        self.assertEqual(get_student_history(self.student.pk)[0]['annual_average'], Decimal('72.50'))
+        result = self.results['english', 'quarter_2']
+        result.status = 'approved'
+        result.save()
+        self.assertEqual(get_student_history(self.student.pk)[0]['annual_average'], Decimal('76.25'))
+
+    def test_json_view(self):
+        self.client.force_login(self.school['admin'])
+        response = self.client.get(f'/students/{self.student.pk}/history/')
+        years = response.json()['years']
+        self.assertEqual(years[0]['courses'][1]['scores'], [70.0, 80.0])
+        self.assertEqual(years[0]['annual_average'], 72.5)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExportFilterTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=2)
+        for student in self.school['students']:
+            QuarterlyResult.objects.create(
+                student=student, course=self.school['math'], quarter=self.school['quarter_1'],
+                teacher=self.school['teacher'], score=70, status='approved',
+            )
+
+    def test_filters_are_cleaned(self):
+        filters = export_filters('quarterly', {'class': ' 007 ', 'status': 'approved', 'course': '', 'other': 'x'})
+        self.assertEqual(filters, {'class': 7, 'status': 'approved'})
+        self.assertEqual(export_filename('quarterly', filters, 'csv'), 'quarterly-results_class-7_status-approved.csv')
+
+    def test_bad_filters_raise(self):
+        for params in [{'class': '1; drop'}, {'quarter': '-1'}, {'status': 'bogus'}, {'course': '1.5'}]:
+            with self.assertRaises(ValueError, msg=params):
+                export_filters('quarterly', params)
+
+    def test_semester_export_ignores_status(self):
+        self.assertEqual(export_filters('semester', {'status': 'bogus', 'semester': '3'}), {'semester': 3})
+
+    def test_view_rejects_bad_filters(self):
+        self.client.force_login(self.school['admin'])
+        response = self.client.get('/reports/export/quarterly/', {'class': '"x.csv', 'format': 'csv'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertNotIn(b'x.csv', response.content)
+
+    def test_view_streams_filtered_rows(self):
+        self.client.force_login(self.school['admin'])
+        response = self.client.get('/reports/export/quarterly/', {
+            'class': str(self.school['class'].pk), 'status': 'approved', 'format': 'csv',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'class-{self.school["class"].pk}_status-approved.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_teachers_cannot_export(self):
+        self.client.force_login(self.school['teacher'])
+        response = self.client.get('/reports/export/quarterly/')
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class JobRunnerTests(TransactionTestCase):
+    # run_job closes stale connections the way a worker does, which a
+    # TestCase transaction would not survive
+
+    def setUp(self):
+        self.calls = []
+
+        @job_handler('test_echo')
+        def echo(job):
+            self.calls.append(job.attempts)
+            if job.params.get('fail'):
+                raise RuntimeError('boom')
+            return {'echo': job.params.get('value')}
+
+        self.addCleanup(JOB_HANDLERS.pop, 'test_echo')
+
+    def run_next(self):
+        claimed = claim_jobs(1)
+        for job_id in claimed:
+            run_job(job_id)
+        return claimed
+
+    def test_unknown_kind_is_refused(self):
+        with self.assertRaises(ValueError):
+            enqueue('no_such_job')
+
+    def test_handler_result_is_stored(self):
+        job = enqueue('test_echo', {'value': 3})
+        self.assertEqual(self.run_next(), [job.pk])
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), ('done', {'echo': 3}, 1))
+        self.assertEqual(self.run_next(), [])
+
+    def test_claims_respect_run_after_and_limit(self):
+        later = enqueue('test_echo')
+        Job.objects.filter(pk=later.pk).update(run_after=timezone.now() + STALE_AFTER)
+        first, second = enqueue('test_echo'), enqueue('test_echo')
+
+        self.assertEqual(claim_jobs(5), [first.pk, second.pk])
+        self.assertEqual(claim_jobs(5), [])
+
+    def test_failing_job_retries_then_fails(self):
+        job = enqueue('test_echo', {'fail': True}, max_attempts=2)
+        self.run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('RuntimeError: boom', job.error)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ('failed', 'Failed'))
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_fail_job_leaves_finished_jobs_alone(self):
+        job = enqueue('test_echo')
+        self.run_next()
+        job.refresh_from_db()
+        fail_job(job, 'late crash report')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('done', ''))
+
+    def test_stale_jobs_are_requeued_until_out_of_attempts(self):
+        job = enqueue('test_echo', max_attempts=2)
+        for attempt, status in [(1, 'queued'), (2, 'failed')]:
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertEqual(claim_jobs(1), [job.pk])
+            Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - STALE_AFTER * 2)
+
+            self.assertEqual(requeue_stale_jobs(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.attempts, job.status), (attempt, status))
+        self.assertEqual(self.calls, [])
+
+    def test_heartbeat_keeps_a_job_claimed(self):
+        job = enqueue('test_echo')
+        claim_jobs(1)
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - STALE_AFTER * 2)
+        heartbeat(job)
+
+        self.assertEqual(requeue_stale_jobs(), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'running')
+
+    def test_semester_calculation_reports_progress_per_course(self):
+        school = make_school(students=2)
+        for quarter in (school['quarter_1'], school['quarter_2']):
+            for student in school['students']:
+                for course in (school['math'], school['english']):
+                    QuarterlyResult.objects.create(
+                        student=student, course=course, quarter=quarter, teacher=school['teacher'],
+                        score=70, status='approved',
+                    )
+        job = enqueue('semester_calculate', {'semester_id': school['semester'].pk})
+        self.run_next()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total), ('done', 3, 3))
+        self.assertEqual(job.result['inserted'], 4)
+        self.assertEqual(SemesterResult.objects.count(), 4)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GradingTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=1)
+        self.department = self.school['math'].department
+        # Scales are memoized per process; don't leak this one into other tests
+        self.addCleanup(grading.invalidate_scale, self.department.pk)
+
+    def make_scale(self):
+        scale = GradeScale.objects.create(name='Primary', department=self.department)
+        for min_score, label in [('0', 'E'), ('50', 'P'), ('75', 'M'), ('90', 'X')]:
+            GradeBoundary.objects.create(scale=scale, min_score=Decimal(min_score), label=label)
+        return scale
+
+    def test_default_scale(self):
+        self.assertEqual(grading.grade_scores([Decimal('59.99'), Decimal('60'), Decimal('95'), None]), ['F', 'D', 'A', ''])
+        self.assertEqual(grading.pass_mark(self.department.pk), Decimal('60'))
+
+    def test_department_scale_and_edits(self):
+        scale = self.make_scale()
+        self.assertEqual(grading.grade_for(Decimal('80'), self.department.pk), 'M')
+        self.assertEqual(grading.pass_mark(self.department.pk), Decimal('50'))
+
+        scale.boundaries.filter(label='M').update(min_score=Decimal('85'))
+        GradeBoundary.objects.get(label='X').save()
+        self.assertEqual(grading.grade_for(Decimal('80'), self.department.pk), 'P')
+
+    def test_memoized_scale_skips_the_cache(self):
+        self.make_scale()
+        grading.get_scale(self.department.pk)
+        with mock.patch.object(grading, 'cache') as cache:
+            self.assertEqual(grading.grade_for(Decimal('95'), self.department.pk), 'X')
+        cache.get.assert_not_called()
+
+    def test_other_process_invalidation_is_seen(self):
+        self.make_scale()
+        grading.get_scale(self.department.pk)
+        GradeBoundary.objects.filter(label='X').update(label='Y')
+        # Another process bumped the version and dropped the shared copy
+        grading.cache.delete(grading.scale_cache_key(self.department.pk))
+        grading.cache.set(grading.VERSION_KEY, 'elsewhere', None)
+
+        self.assertEqual(grading.grade_for(Decimal('95'), self.department.pk), 'X')
+        later = grading._local['checked_at'] + grading.LOCAL_CHECK_INTERVAL
+        with mock.patch.object(grading.time, 'monotonic', return_value=later):
+            self.assertEqual(grading.grade_for(Decimal('95'), self.department.pk), 'Y')
+
+    def test_get_grade_with_department_loads_nothing(self):
+        result = QuarterlyResult.objects.create(
+            student=self.school['students'][0], course=self.school['math'], quarter=self.school['quarter_1'],
+            teacher=self.school['teacher'], score=72,
+        )
+        result = QuarterlyResult.objects.get(pk=result.pk)
+        grading.get_scale(self.department.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(result.get_grade(self.department.pk), 'C')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DepartmentGradeRefreshTests(TestCase):
+
+    def setUp(self):
+        self.department = make_school(students=1)['math'].department
+        self.addCleanup(grading.invalidate_scale, self.department.pk)
+        patcher = mock.patch.object(signals, 'refresh_department_grades')
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scale_and_boundaries_refresh_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            scale = GradeScale.objects.create(name='Primary', department=self.department)
+            for min_score, label in [('0', 'E'), ('50', 'P'), ('75', 'M')]:
+                GradeBoundary.objects.create(scale=scale, min_score=Decimal(min_score), label=label)
+            self.refresh.assert_not_called()
+        self.refresh.assert_called_once_with(self.department.pk)
+
+        # The next transaction refreshes again
+        with self.captureOnCommitCallbacks(execute=True):
+            GradeBoundary.objects.get(label='M').save()
+        self.assertEqual(self.refresh.call_count, 2)
+
+    def test_rolled_back_savepoint_does_not_swallow_the_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                signals.schedule_department_grades(self.department.pk)
+                raise RuntimeError
+            signals.schedule_department_grades(self.department.pk)
+        self.refresh.assert_called_once_with(self.department.pk)
+
+    def test_rolled_back_savepoint_refreshes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                signals.schedule_department_grades(self.department.pk)
+                raise RuntimeError
+        self.refresh.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            signals.schedule_department_grades(self.department.pk)
+        self.refresh.assert_called_once_with(self.department.pk)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ResultCubeTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        self.department = self.school['class'].department
+        self.addCleanup(grading.invalidate_scale, self.department.pk)
+        keys = []
+        for student, score in zip(self.school['students'], [90, 70, 50]):
+            QuarterlyResult.objects.create(
+                student=student, course=self.school['math'], quarter=self.school['quarter_1'],
+                teacher=self.school['teacher'], score=score, status='submitted',
+            )
+            keys.append((student.pk, self.school['math'].pk, self.school['quarter_1'].pk))
+        QuarterlyResult.objects.update(status='approved')
+        results_approved(keys)
+
+    def math(self):
+        return rollup(['course'], quarter=self.school['quarter_1'].pk)[0]
+
+    def test_rollup_follows_from_the_cell_sums(self):
+        math = self.math()
+        self.assertEqual(math['label'], 'M1 Math')
+        self.assertEqual((math['count'], math['mean'], math['stdev']), (3, 70, 16.33))
+        self.assertEqual((math['min_score'], math['max_score']), (50, 90))
+        self.assertEqual(math['grades'], sorted(
+            (grade, 1) for grade in grading.grade_scores([Decimal(90), Decimal(70), Decimal(50)], self.department.pk)
+        ))
+
+    def test_incremental_refreshes_match_a_rebuild(self):
+        result = QuarterlyResult.objects.get(score=50)
+        result.score = 80
+        result.save()
+        self.assertEqual((self.math()['count'], self.math()['mean']), (3, 80))
+
+        other = Class.objects.create(
+            name='Grade 1B', department=self.department, academic_year=self.school['class'].academic_year,
+        )
+        student = self.school['students'][0]
+        student.current_class = other
+        student.save()
+        by_class = [(row['label'], row['count']) for row in rollup(['class'])]
+        self.assertEqual(sorted(by_class), [('Grade 1A', 2), ('Grade 1B', 1)])
+
+        incremental = rollup(['class', 'course', 'quarter'])
+        rebuild_cube()
+        self.assertEqual(rollup(['class', 'course', 'quarter']), incremental)
+
+    def test_new_scale_regrades_the_cells_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            scale = GradeScale.objects.create(name='Pass/Fail', department=self.department)
+            for min_score, label in [('0', 'F'), ('60', 'P')]:
+                GradeBoundary.objects.create(scale=scale, min_score=Decimal(min_score), label=label)
+        self.assertEqual(self.math()['grades'], [('F', 1), ('P', 2)])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClassRankTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school()
+        self.other_class = Class.objects.create(
+            name='Grade 1B', department=self.school['class'].department,
+            academic_year=self.school['class'].academic_year,
+        )
+        keys = []
+        for index, student in enumerate(self.school['students']):
+            QuarterlyResult.objects.create(
+                student=student, course=self.school['math'], quarter=self.school['quarter_1'],
+                teacher=self.school['teacher'], score=90 - index * 10, status='approved',
+            )
+            keys.append((student.id, self.school['math'].id, self.school['quarter_1'].id))
+        refresh_quarter_ranks(keys)
+
+    def ranks(self, school_class):
+        return list(ClassRank.objects.filter(class_assigned=school_class).order_by(
+            'position').values_list('student_id', 'position'))
+
+    def result_positions(self):
+        return dict(QuarterlyResult.objects.values_list('student_id', 'position'))
+
+    def assert_moved(self, top, rest):
+        self.assertEqual(self.ranks(self.school['class']), [(rest[0].id, 1), (rest[1].id, 2)])
+        self.assertEqual(self.ranks(self.other_class), [(top.id, 1)])
+        self.assertEqual(self.result_positions(), {top.id: 1, rest[0].id: 1, rest[1].id: 2})
+
+    def test_ranked_within_class(self):
+        students = self.school['students']
+        self.assertEqual(self.ranks(self.school['class']), [(students[0].id, 1), (students[1].id, 2), (students[2].id, 3)])
+
+    def test_moving_a_student_reranks_both_classes(self):
+        top, *rest = self.school['students']
+        top.current_class = self.other_class
+        top.save()
+        self.assert_moved(top, rest)
+
+    def test_bulk_class_change_reranks_both_classes(self):
+        top, *rest = self.school['students']
+        self.client.force_login(self.school['admin'])
+        self.client.post('/students/bulk-actions/', {
+            'action': 'change_class', 'student_ids': [top.id], 'new_class': self.other_class.id,
+        })
+        self.assert_moved(top, rest)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ApprovalQueueTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school()
+        self.results = [
+            QuarterlyResult.objects.create(
+                student=student, course=course, quarter=self.school['quarter_1'], teacher=self.school['teacher'],
+                score=70, status='submitted',
+            )
+            for student in self.school['students'] for course in (self.school['math'], self.school['english'])
+        ]
+        self.client.force_login(self.school['admin'])
+
+    def test_saving_a_submitted_result_stamps_it(self):
+        self.assertTrue(all(result.submitted_at for result in self.results))
+        result = self.results[0]
+        result.status, result.submitted_at = 'draft', None
+        result.save()
+        result.status = 'submitted'
+        result.save(update_fields=['status'])
+        self.assertIsNotNone(QuarterlyResult.objects.get(pk=result.pk).submitted_at)
+
+    def test_counts_match_the_listed_rows(self):
+        # A row written around save() has no submitted_at and cannot be paged
+        QuarterlyResult.objects.filter(pk=self.results[0].pk).update(submitted_at=None)
+
+        response = self.client.get('/results/approval/')
+        listed = list(response.context['pending_results'])
+        self.assertEqual(response.context['total_pending'], len(listed))
+        self.assertEqual(len(listed), 5)
+        self.assertEqual(sum(count for _, count in response.context['course_options']), 5)
+
+        response = self.client.get('/results/approval/', {'course': self.school['math'].pk})
+        self.assertEqual(response.context['total_pending'], len(response.context['pending_results']))
+
+    def test_queue_pages_with_a_cursor(self):
+        with mock.patch('school.views.APPROVAL_PAGE_SIZE', 4):
+            first = self.client.get('/results/approval/').context['pending_results']
+            second = self.client.get('/results/approval/', {'after': first.next_cursor}).context['pending_results']
+        ids = [result.pk for result in [*first, *second]]
+        self.assertEqual(sorted(ids), sorted(result.pk for result in self.results))
+        self.assertIsNone(second.next_cursor)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BulkApprovalTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        for student in self.school['students']:
+            for course in (self.school['math'], self.school['english']):
+                QuarterlyResult.objects.create(
+                    student=student, course=course, quarter=self.school['quarter_1'],
+                    teacher=self.school['teacher'], score=70, status='submitted',
+                )
+
+    def states(self):
+        return sorted(QuarterlyResult.objects.values_list('status', 'position').order_by('id'))
+
+    def test_chunks_report_progress(self):
+        progress = []
+        outcome = approve_results(self.school['admin'], chunk_size=4, on_chunk=progress.append)
+        self.assertEqual(outcome['approved'], 6)
+        self.assertEqual([(p['chunk'], p['done'], p['total']) for p in progress], [(1, 4, 6), (2, 6, 6)])
+        self.assertEqual(self.states(), [('approved', 1)] * 6)
+
+    def test_scope_limits_the_run(self):
+        outcome = approve_results(self.school['admin'], scope={'course_id': self.school['math'].pk})
+        self.assertEqual(outcome['approved'], 3)
+        self.assertEqual(QuarterlyResult.objects.filter(status='submitted').count(), 3)
+
+    def test_failed_chunk_is_left_for_the_retry(self):
+        refresh = results.results_approved
+        calls = []
+
+        def flaky(keys):
+            calls.append(keys)
+            if len(calls) == 2:
+                raise RuntimeError('refresh failed')
+            return refresh(keys)
+
+        with mock.patch.object(results, 'results_approved', flaky), self.assertRaises(RuntimeError):
+            approve_results(self.school['admin'], chunk_size=4)
+
+        # The first chunk is approved and ranked, the second was rolled back whole
+        self.assertEqual(self.states(), [('approved', 1)] * 4 + [('submitted', None)] * 2)
+
+        self.assertEqual(approve_results(self.school['admin'], chunk_size=4)['approved'], 2)
+        self.assertEqual(self.states(), [('approved', 1)] * 6)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AdminStatsTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        self.school['students'][2].is_active = False
+        self.school['students'][2].save()
+        for student, status in zip(self.school['students'], ['submitted', 'approved', 'approved']):
+            QuarterlyResult.objects.create(
+                student=student, course=self.school['math'], quarter=self.school['quarter_1'],
+                teacher=self.school['teacher'], score=70, status=status,
+            )
+
+    def test_counts(self):
+        self.assertEqual(compute_admin_stats(), {
+            'total_students': 2, 'total_teachers': 1, 'total_classes': 1, 'pending_results': 1,
+            'total_departments': 1, 'total_courses': 2, 'active_quarters': 1, 'total_results': 2,
+        })
+
+    def test_snapshot_survives_logins(self):
+        get_admin_stats()
+        self.assertTrue(self.client.login(username='admin', password='x'))
+        with self.assertNumQueries(0):
+            get_admin_stats()
+
+    def test_snapshot_follows_data_changes(self):
+        get_admin_stats()
+        Course.objects.create(name='Science', code='S1', department=self.school['math'].department)
+        self.assertEqual(get_admin_stats()['total_courses'], 3)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TeacherProgressTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=4)
+        self.teacher = self.school['teacher']
+        for course in (self.school['math'], self.school['english']):
+            TeacherAssignment.objects.create(
+                teacher=self.teacher, course=course, class_assigned=self.school['class'],
+                academic_year=self.school['class'].academic_year,
+            )
+        first, second, third, fourth = self.school['students']
+        Student.objects.filter(pk=fourth.pk).update(is_active=False)
+        for student, course, quarter, status in [
+            (first, self.school['math'], self.school['quarter_1'], 'draft'),
+            (second, self.school['math'], self.school['quarter_1'], 'submitted'),
+            (fourth, self.school['math'], self.school['quarter_1'], 'approved'),
+            (third, self.school['math'], self.school['quarter_2'], 'approved'),
+            (third, self.school['english'], self.school['quarter_1'], 'approved'),
+        ]:
+            QuarterlyResult.objects.create(
+                student=student, course=course, quarter=quarter, teacher=self.teacher, score=70, status=status,
+            )
+
+    def test_counts_per_assignment_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = compute_teacher_progress(self.teacher.pk, self.school['quarter_1'])
+        self.assertEqual(
+            [(row['course_code'], row['roster'], row['entered'], row['draft'], row['submitted'],
+              row['approved'], row['missing']) for row in rows],
+            [('E1', 3, 1, 0, 0, 1, 2), ('M1', 3, 2, 1, 1, 0, 1)],
+        )
+
+    def test_without_a_quarter_only_the_roster_is_counted(self):
+        rows = compute_teacher_progress(self.teacher.pk, None)
+        self.assertEqual([(row['roster'], row['entered'], row['missing']) for row in rows], [(3, 0, 3), (3, 0, 3)])
+
+    def test_approval_retires_the_cached_matrix(self):
+        quarter = self.school['quarter_1']
+        self.assertEqual(get_teacher_progress(self.teacher.pk, quarter)[1]['approved'], 0)
+        result = QuarterlyResult.objects.get(status='submitted')
+        self.client.force_login(self.school['admin'])
+        self.client.post(f'/results/approve/{result.pk}/')
+        self.assertEqual(get_teacher_progress(self.teacher.pk, quarter)[1]['approved'], 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ActivityTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=1)
+
+    def test_events_are_written_at_once(self):
+        record_activity('test', 'x' * 300, self.school['admin'])
+        event = ActivityEvent.objects.get()
+        self.assertEqual((event.kind, len(event.description), event.actor), ('test', 255, self.school['admin']))
+
+    def test_events_roll_back_with_their_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record_activity('test', 'rolled back')
+            raise RuntimeError
+        record_activity('test', 'kept')
+        self.assertEqual([event.description for event in recent_activity()], ['kept'])
+
+    def test_approval_is_logged(self):
+        result = QuarterlyResult.objects.create(
+            student=self.school['students'][0], course=self.school['math'], quarter=self.school['quarter_1'],
+            teacher=self.school['teacher'], score=70, status='submitted',
+        )
+        self.client.force_login(self.school['admin'])
+        self.client.post(f'/results/approve/{result.pk}/')
+        self.assertEqual(recent_activity(1)[0].kind, 'results_approved')
+
+    def test_recent_first_and_pruning(self):
+        for days in [400, 10, 0]:
+            event = record_activity('test', f'{days} days ago')
+            ActivityEvent.objects.filter(pk=event.pk).update(created_at=timezone.now() - datetime.timedelta(days=days))
+        self.assertEqual([event.description for event in recent_activity()], ['0 days ago', '10 days ago', '400 days ago'])
+        self.assertEqual(prune_activity(days=365), 1)
+        self.assertEqual(ActivityEvent.objects.count(), 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReportCardTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        self.addCleanup(grading.invalidate_scale, self.school['class'].department_id)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        keys = []
+        for student, score in zip(self.school['students'], [95, 72, None]):
+            if score is not None:
+                for course in (self.school['math'], self.school['english']):
+                    QuarterlyResult.objects.create(
+                        student=student, course=course, quarter=self.school['quarter_1'],
+                        teacher=self.school['teacher'], score=score, status='approved',
+                    )
+                    keys.append((student.pk, course.pk, self.school['quarter_1'].pk))
+        results_approved(keys)
+        self.client.force_login(self.school['admin'])
+        self.pdf_url = f"/print/quarterly/{self.school['quarter_1'].pk}/{self.school['students'][0].pk}/pdf/"
+
+    def test_batch_contexts_take_a_fixed_number_of_queries(self):
+        students = list(Student.objects.select_related('current_class').order_by('pk'))
+        # Results and ranks; the department's active template is cached after the first call
+        quarterly_card_contexts(self.school['quarter_1'], students)
+        with self.assertNumQueries(2):
+            first, second, third = quarterly_card_contexts(self.school['quarter_1'], students)
+        self.assertEqual([result.grade for result in first['results']], ['A', 'A'])
+        self.assertEqual((first['average'], first['rank'].position), (95, 1))
+        self.assertEqual((second['average'], second['rank'].position), (72, 2))
+        self.assertEqual((third['results'], third['average'], third['rank']), ([], None, None))
+
+    def test_pdf_is_rendered_once_and_revalidated(self):
+        with mock.patch('school.views.render_pdf', return_value=b'%PDF-card') as render:
+            response = self.client.get(self.pdf_url)
+            self.assertEqual((response['Content-Type'], b''.join(response.streaming_content)), ('application/pdf', b'%PDF-card'))
+            again = self.client.get(self.pdf_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        render.assert_called_once()
+
+    def test_missing_renderer_falls_back_to_the_html_card(self):
+        with mock.patch('school.views.render_pdf', side_effect=ImportError):
+            response = self.client.get(self.pdf_url)
+        self.assertRedirects(response, self.pdf_url.removesuffix('pdf/'), fetch_redirect_response=False)
+
+    def test_render_metrics_average_each_phase(self):
+        reset_render_metrics()
+        self.addCleanup(reset_render_metrics)
+        for total in (1.0, 3.0):
+            record_render('quarterly', {'template': 0.5, 'layout': total - 1, 'write': 0.5, 'total': total}, pages=1, size=10)
+        metrics = render_metrics()['quarterly']
+        self.assertEqual((metrics['renders'], metrics['pages'], metrics['bytes']), (2, 2, 20))
+        self.assertEqual((metrics['total_average'], metrics['layout_average'], metrics['max_seconds']), (2.0, 1.0, 3.0))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ResultTemplateTests(TestCase):
+
+    def setUp(self):
+        self.department = make_school(students=1)['class'].department
+        self.template = ResultTemplate.objects.create(
+            name='Card', department=self.department, template_type='quarterly', html_content='<p>{{ average }}</p>',
+        )
+        self.addCleanup(result_templates.invalidate_template, self.template.pk)
+
+    def render(self, average=70):
+        return result_templates.render_result_template(self.department.pk, 'quarterly', {'average': average})
+
+    def test_compiled_once_per_content(self):
+        engine = result_templates.engines['django']
+        with mock.patch.object(engine, 'from_string', wraps=engine.from_string) as from_string:
+            self.assertEqual(self.render(70), '<p>70</p>')
+            with self.assertNumQueries(0):
+                self.assertEqual(self.render(80), '<p>80</p>')
+            self.assertEqual(from_string.call_count, 1)
+
+            self.template.html_content = '<b>{{ average }}</b>'
+            self.template.save()
+            self.assertEqual(self.render(70), '<b>70</b>')
+            self.assertEqual(from_string.call_count, 2)
+        self.assertEqual(len([key for key in result_templates._compiled if key[0] == self.template.pk]), 1)
+
+    def test_inactive_or_broken_templates_fall_back_to_the_default_card(self):
+        self.assertEqual(self.render(), '<p>70</p>')
+        self.template.is_active = False
+        self.template.save()
+        self.assertIsNone(self.render())
+
+        ResultTemplate.objects.filter(pk=self.template.pk).update(is_active=True, html_content='{% if %}')
+        result_templates.invalidate_template(self.template.pk)
+        with self.assertLogs('school.result_templates', 'ERROR'):
+            self.assertIsNone(self.render())
+
+
+def slow_pdf(template_name, context, kind='report'):
+    # Stands in for WeasyPrint in the forked workers
+    time.sleep(0.3)
+    return b'%PDF-' + template_name.encode()
+
+
+@override_settings(CACHES=TEST_CACHES)
+@mock.patch.object(report_batch, 'HEARTBEAT_INTERVAL', 0.05)
+@mock.patch.object(report_batch, 'render_pdf', slow_pdf)
+class ReportBatchTests(TransactionTestCase):
+    # The batch closes connections before forking its workers
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        self.output = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+
+    def generate(self, output_format):
+        self.progress = []
+        return report_batch.generate_report_cards(
+            'quarterly', self.school['quarter_1'].pk, 'class', self.school['class'].pk,
+            output_format=output_format, workers=1, output=f'{self.output.name}/cards.{output_format}',
+            on_progress=lambda done, total: self.progress.append((done, total)),
+        )
+
+    def test_merged_pdf_reports_progress_while_rendering(self):
+        summary = self.generate('pdf')
+        self.assertEqual((summary['format'], summary['documents'], summary['cards']), ('pdf', 1, 3))
+        self.assertIn((0, 3), self.progress)
+        self.assertEqual(self.progress[-1], (3, 3))
+
+    def test_zip_reports_each_card(self):
+        summary = self.generate('zip')
+        with zipfile.ZipFile(summary['path']) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+        self.assertEqual(sorted({done for done, total in self.progress}), [0, 1, 2, 3])
+
+
+@override_settings(CACHES=TEST_CACHES, REPORT_CARD_CACHE_MAX_BYTES=1000)
+class CardCacheTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=3)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.addCleanup(grading.invalidate_scale, self.school['class'].department_id)
+
+    def open(self, student, content='<p>card</p>'):
+        built = []
+
+        def build():
+            built.append(student.pk)
+            return content
+
+        with card_cache.open_card('quarterly', self.school['quarter_1'], student, 'html', build) as handle:
+            return handle.read(), built
+
+    def cached_files(self):
+        return sorted(path.name for path in card_cache.cache_root().rglob('*.*'))
+
+    def test_card_is_built_once_until_its_results_change(self):
+        student = self.school['students'][0]
+        self.assertEqual(self.open(student), (b'<p>card</p>', [student.pk]))
+        self.assertEqual(self.open(student), (b'<p>card</p>', []))
+
+        QuarterlyResult.objects.create(
+            student=student, course=self.school['math'], quarter=self.school['quarter_1'],
+            teacher=self.school['teacher'], score=80, status='approved',
+        )
+        self.assertEqual(self.open(student, '<p>new</p>'), (b'<p>new</p>', [student.pk]))
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_least_recently_served_cards_are_evicted(self):
+        first, second, third = self.school['students']
+        self.open(first, 'a' * 400)
+        self.open(second, 'b' * 400)
+        old = time.time() - 60
+        for path in card_cache._student_dir('quarterly', self.school['quarter_1'].pk, first.pk).iterdir():
+            os.utime(path, (old, old))
+        self.open(third, 'c' * 400)
+
+        self.assertEqual(len(self.cached_files()), 2)
+        self.assertEqual(self.open(second)[1], [])
+        self.assertEqual(self.open(third)[1], [])
+
+    def test_eviction_leaves_writes_in_progress_alone(self):
+        directory = card_cache.cache_root() / 'quarterly-1' / '1'
+        directory.mkdir(parents=True)
+        writing = directory / 'abc.html.123.part'
+        abandoned = directory / 'def.html.456.part'
+        card = directory / 'ghi.html'
+        for path in [writing, abandoned, card]:
+            path.write_bytes(b'x' * 100)
+        old = time.time() - card_cache.PART_GRACE - 1
+        os.utime(abandoned, (old, old))
+
+        self.assertEqual(card_cache.evict(target=0), 2)
+        self.assertEqual(self.cached_files(), ['abc.html.123.part'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=6)
+        self.board = ('overall', 0, 'quarter', self.school['quarter_1'].pk)
+        self.results = {}
+        for index, student in enumerate(self.school['students']):
+            self.results[student.pk] = QuarterlyResult.objects.create(
+                student=student, course=self.school['math'], quarter=self.school['quarter_1'],
+                teacher=self.school['teacher'], score=[90, 80, 80, 70, 60, 50][index], status='approved',
+            )
+
+    def places(self, board=None):
+        return list(leaderboard_page(board or self.board, per_page=100).values_list('student_id', 'position', 'row_number'))
+
+    def rebuilt_places(self, board=None):
+        rebuild_leaderboards(*(board or self.board)[2:])
+        return self.places(board)
+
+    def test_ties_share_a_position(self):
+        students = [student.pk for student in self.school['students']]
+        self.assertEqual(self.places(), [
+            (students[0], 1, 1), (students[1], 2, 2), (students[2], 2, 3),
+            (students[3], 3, 4), (students[4], 4, 5), (students[5], 5, 6),
+        ])
+
+    def test_score_changes_match_a_full_rebuild(self):
+        for student_index, score in [(5, 95), (0, 80), (3, 40), (2, 80), (1, 10)]:
+            result = self.results[self.school['students'][student_index].pk]
+            result.score = score
+            result.save()
+            incremental = self.places()
+            self.assertEqual(incremental, self.rebuilt_places())
+
+    def test_renumbering_starts_at_the_changed_average(self):
+        # A bottom change must not rewrite the rows above it
+        top = LeaderboardEntry.objects.get(
+            scope='overall', scope_id=0, period='quarter', period_id=self.board[3], student=self.school['students'][0],
+        )
+        LeaderboardEntry.objects.filter(pk=top.pk).update(position=99)
+        result = self.results[self.school['students'][5].pk]
+        result.score = 55
+        result.save()
+        self.assertEqual(LeaderboardEntry.objects.get(pk=top.pk).position, 99)
+
+        renumber_board(self.board)
+        self.assertEqual(self.places(), self.rebuilt_places())
+
+    def test_approvals_refresh_boards_in_a_job(self):
+        student = self.school['students'][5]
+        result = self.results[student.pk]
+        QuarterlyResult.objects.filter(pk=result.pk).update(score=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            results_approved([(student.pk, self.school['math'].pk, self.school['quarter_1'].pk)])
+        self.assertEqual(self.places()[-1][0], student.pk)
+
+        job = Job.objects.get(kind='leaderboard_refresh')
+        JOB_HANDLERS['leaderboard_refresh'](job)
+        self.assertEqual(self.places()[0], (student.pk, 1, 1))
+        self.assertEqual(self.places(), self.rebuilt_places())
+
+    def test_deleted_student_closes_the_gap(self):
+        self.school['students'][1].delete()
+        self.assertEqual([row[1:] for row in self.places()], [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)])
+
+    def test_semester_boards_follow_background_recalculation(self):
+        semester = self.school['semester']
+        board = ('overall', 0, 'semester', semester.pk)
+        for student in self.school['students'][:3]:
+            QuarterlyResult.objects.create(
+                student=student, course=self.school['math'], quarter=self.school['quarter_2'],
+                teacher=self.school['teacher'], score=70, status='approved',
+            )
+        self.assertEqual(self.places(board), [])
+
+        JOB_HANDLERS['semester_calculate'](enqueue('semester_calculate', {'semester_id': semester.pk}))
+        self.assertEqual(len(self.places(board)), 3)
+
+        student = self.school['students'][3]
+        QuarterlyResult.objects.create(
+            student=student, course=self.school['math'], quarter=self.school['quarter_2'],
+            teacher=self.school['teacher'], score=100, status='approved',
+        )
+        mark_semester_dirty([(student.pk, self.school['math'].pk, self.school['quarter_2'].pk)])
+        drain_semester_dirty()
+        self.assertEqual(self.places(board)[0], (student.pk, 1, 1))
+        self.assertEqual(self.places(board), self.rebuilt_places(board))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SemesterStatisticsTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school()
+        self.addCleanup(grading.invalidate_scale, self.school['class'].department_id)
+        for quarter in (self.school['quarter_1'], self.school['quarter_2']):
+            for student in self.school['students']:
+                QuarterlyResult.objects.create(
+                    student=student, course=self.school['math'], quarter=quarter,
+                    teacher=self.school['teacher'], score=80, status='approved',
+                )
+        results.calculate_semester_results(self.school['semester'])
+
+    def highest_average(self):
+        stats = get_class_statistics(self.school['class'].pk, 'semester', self.school['semester'].pk)
+        return stats['class']['max']
+
+    def raise_second_quarter(self, score):
+        # A direct update, so only the semester recalculation can notice it
+        student = self.school['students'][0]
+        QuarterlyResult.objects.filter(student=student, quarter=self.school['quarter_2']).update(score=score)
+        return student
+
+    def test_calculate_job_retires_cached_statistics(self):
+        self.assertEqual(self.highest_average(), 80)
+        self.raise_second_quarter(100)
+        self.assertEqual(self.highest_average(), 80)
+
+        JOB_HANDLERS['semester_calculate'](enqueue('semester_calculate', {'semester_id': self.school['semester'].pk}))
+        self.assertEqual(self.highest_average(), 90)
+
+    def test_drain_retires_cached_statistics(self):
+        self.assertEqual(self.highest_average(), 80)
+        student = self.raise_second_quarter(90)
+        mark_semester_dirty([(student.pk, self.school['math'].pk, self.school['quarter_2'].pk)])
+
+        drain_semester_dirty()
+        self.assertEqual(self.highest_average(), 85)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BroadsheetTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=4)
+        keys = []
+        for quarter in (self.school['quarter_1'], self.school['quarter_2']):
+            for student, score in zip(self.school['students'], [70, 90, 70, 60]):
+                for course in (self.school['math'], self.school['english']):
+                    QuarterlyResult.objects.create(
+                        student=student, course=course, quarter=quarter,
+                        teacher=self.school['teacher'], score=score, status='approved',
+                    )
+                    keys.append((student.pk, course.pk, quarter.pk))
+        results_approved(keys)
+
+    def positions(self, period, period_id):
+        sheet = get_broadsheet(self.school['class'].pk, period, period_id)
+        return {row['id']: row['position'] for row in sheet['students']}
+
+    def test_positions_are_the_class_ranks(self):
+        quarter = self.school['quarter_1']
+        ranks = dict(ClassRank.objects.filter(quarter=quarter).values_list('student_id', 'position'))
+        self.assertEqual(self.positions('quarter', quarter.pk), ranks)
+        self.assertEqual(sorted(ranks.values()), [1, 2, 2, 3])
+
+    def test_semester_recalculation_refreshes_the_broadsheet(self):
+        semester = self.school['semester']
+        student = self.school['students'][3]
+        self.assertEqual(self.positions('semester', semester.pk)[student.pk], 3)
+
+        QuarterlyResult.objects.filter(student=student, quarter=self.school['quarter_2']).update(score=100)
+        mark_semester_dirty([
+            (student.pk, course.pk, self.school['quarter_2'].pk) for course in (self.school['math'], self.school['english'])
+        ])
+        drain_semester_dirty()
+
+        # (60 + 100) / 2 now sits behind 90 only
+        self.assertEqual(self.positions('semester', semester.pk)[student.pk], 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TrendTests(TestCase):
+
+    def setUp(self):
+        self.school = make_school(students=2)
+        self.addCleanup(grading.invalidate_scale, self.school['class'].department_id)
+        self.science = Course.objects.create(name='Science', code='S1', department=self.school['class'].department)
+        next_year = AcademicYear.objects.create(
+            name='2025/2026', start_date=datetime.date(2025, 9, 1), end_date=datetime.date(2026, 7, 1),
+        )
+        self.next_quarter = Quarter.objects.create(
+            name='Q1', academic_year=next_year, start_date=next_year.start_date, end_date=next_year.end_date,
+        )
+        self.declining, self.steady = self.school['students']
+        courses = [self.school['math'], self.school['english'], self.science]
+        for student, before, after in [
+            (self.declining, [80, 80, 60], [74, 74, 80]),
+            (self.steady, [60, 70, 70], [75, 70, 70]),
+        ]:
+            for course, first, second in zip(courses, before, after):
+                for quarter, score in [(self.school['quarter_1'], first), (self.next_quarter, second)]:
+                    QuarterlyResult.objects.create(
+                        student=student, course=course, quarter=quarter,
+                        teacher=self.school['teacher'], score=score, status='approved',
+                    )
+
+    def test_declines_in_several_courses_put_a_student_at_risk(self):
+        overall, courses = student_trends(self.declining.pk)
+        self.assertEqual((overall.years, overall.delta, overall.slope), (2, Decimal('2.67'), Decimal('2.67')))
+        self.assertEqual((overall.declining, overall.declining_courses, overall.at_risk), (False, 2, True))
+        self.assertEqual([(trend.course.code, trend.declining) for trend in courses], [('E1', True), ('M1', True), ('S1', False)])
+        self.assertEqual([trend.student for trend in at_risk_students()], [self.declining])
+
+    def test_edits_refresh_the_student_and_match_a_rebuild(self):
+        result = QuarterlyResult.objects.get(student=self.steady, course=self.school['math'], quarter=self.next_quarter)
+        result.score = 40
+        result.save()
+        self.assertEqual(student_trends(self.steady.pk)[0].delta, Decimal('-6.67'))
+        self.assertEqual({trend.student for trend in at_risk_students()}, {self.declining, self.steady})
+
+        refreshed = sorted(StudentTrend.objects.values_list('student_id', 'course_id', 'delta', 'at_risk'), key=str)
+        rebuild_trends()
+        self.assertEqual(sorted(StudentTrend.objects.values_list('student_id', 'course_id', 'delta', 'at_risk'), key=str), refreshed)
@@ -0,0 +1,226 @@
+# school/trends.py
+import statistics
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .grading import pass_mark
+from .models import AcademicYear, Course, QuarterlyResult, Student, StudentTrend
+
+
+# ============================================
+# LONGITUDINAL TRENDS
+# ============================================
+#
+# StudentTrend holds, per student, one overall row and one row per course
+# with the annual average of every academic year the student has approved
+# scores in, the change since the previous year, the least-squares slope
+# across the years and flags for decline and risk. Annual averages follow
+# the academic history: a course's is the mean of its quarter scores, the
+# overall one the mean of the quarter averages.
+#
+# Two aggregate queries feed any number of students, so the whole school
+# is rebuilt in one batch. Approvals and result edits refresh only the
+# students they touch, and the at-risk list is a read of flagged rows.
+
+TREND_DECLINE_POINTS = Decimal('5.00')  # a drop of this much since last year is a decline
+TREND_RISK_COURSES = 2  # declining in this many courses puts a student at risk
+AT_RISK_PAGE_SIZE = 25
+TWO_PLACES = Decimal('0.01')
+
+
+def _mean(total, count):
+    return (Decimal(total) / count).quantize(TWO_PLACES)
+
+
+def _approved(student_ids):
+    results = QuarterlyResult.objects.filter(status='approved')
+    if student_ids is not None:
+        results = results.filter(student_id__in=student_ids)
+    return results.order_by()
+
+
+def _series(student_ids):
+    """{(student_id, course_id or None): {year_id: annual average}}"""
+    series = {}
+    for student_id, course_id, year_id, total, count in _approved(student_ids).values(
+        'student_id', 'course_id', 'quarter__academic_year_id'
+    ).annotate(total=Sum('score'), count=Count('id')).values_list(
+        'student_id', 'course_id', 'quarter__academic_year_id', 'total', 'count'
+    ).iterator(chunk_size=2000):
+        series.setdefault((student_id, course_id), {})[year_id] = _mean(total, count)
+
+    quarters = {}
+    for student_id, year_id, total, count in _approved(student_ids).values(
+        'student_id', 'quarter__academic_year_id', 'quarter_id'
+    ).annotate(total=Sum('score'), count=Count('id')).values_list(
+        'student_id', 'quarter__academic_year_id', 'total', 'count'
+    ).iterator(chunk_size=2000):
+        quarters.setdefault((student_id, year_id), []).append(_mean(total, count))
+    for (student_id, year_id), averages in quarters.items():
+        series.setdefault((student_id, None), {})[year_id] = _mean(sum(averages), len(averages))
+    return series
+
+
+def _trend(student_id, course_id, averages, years, mark):
+    """A StudentTrend from {year_id: average}, `years` being {year_id: (index, name)}"""
+    points = sorted(averages.items(), key=lambda item: years[item[0]][0])
+    latest = points[-1][1]
+    delta = latest - points[-2][1] if len(points) > 1 else None
+    slope = None
+    if len(points) > 1:
+        # Least squares over the years' places in the calendar, so a gap year counts
+        fit = statistics.linear_regression(
+            [years[year_id][0] for year_id, _ in points], [float(average) for _, average in points]
+        )
+        slope = Decimal(fit.slope).quantize(TWO_PLACES)
+    declining = delta is not None and delta <= -TREND_DECLINE_POINTS
+    below_pass = latest < mark
+    return StudentTrend(
+        student_id=student_id, course_id=course_id,
+        trajectory=[[year_id, years[year_id][1], float(average)] for year_id, average in points],
+        years=len(points), latest_average=latest, delta=delta, slope=slope,
+        declining=declining, below_pass=below_pass, at_risk=declining or below_pass,
+    )
+
+
+def build_trends(student_ids=None):
+    """StudentTrend rows of some students (None = everyone), not yet saved"""
+    series = _series(student_ids)
+    years = {
+        pk: (index, name)
+        for index, (pk, name) in enumerate(AcademicYear.objects.order_by('start_date').values_list('pk', 'name'))
+    }
+    course_departments = dict(Course.objects.values_list('pk', 'department_id'))
+    student_departments = dict(
+        Student.objects.filter(pk__in={student_id for student_id, _ in series})
+        .values_list('pk', 'current_class__department_id')
+    )
+
+    trends = {}
+    for (student_id, course_id), averages in series.items():
+        department_id = course_departments[course_id] if course_id else student_departments.get(student_id)
+        trends[student_id, course_id] = _trend(student_id, course_id, averages, years, pass_mark(department_id))
+
+    # Only declines into the student's latest year count towards the overall risk
+    for (student_id, course_id), trend in trends.items():
+        overall = trends[student_id, None]
+        if course_id and trend.declining and trend.trajectory[-1][0] == overall.trajectory[-1][0]:
+            overall.declining_courses += 1
+    for overall in (trend for (_, course_id), trend in trends.items() if course_id is None):
+        overall.at_risk = overall.at_risk or overall.declining_courses >= TREND_RISK_COURSES
+    return list(trends.values())
+
+
+def refresh_student_trends(student_ids):
+    """Recompute the trends of some students"""
+    student_ids = set(student_ids)
+    if not student_ids:
+        return 0
+    trends = build_trends(student_ids)
+    with transaction.atomic():
+        StudentTrend.objects.filter(student_id__in=student_ids).delete()
+        StudentTrend.objects.bulk_create(trends, batch_size=500)
+    return len(trends)
+
+
+def refresh_trends(keys):
+    """Recompute the trends of the students in changed (student_id, course_id, quarter_id) keys"""
+    return refresh_student_trends(student_id for student_id, _, _ in keys)
+
+
+def refresh_department_trends(department_id):
+    """Recompute the trends whose pass mark comes from a department"""
+    return refresh_student_trends(Student.objects.filter(
+        Q(current_class__department_id=department_id)
+        | Q(results__course__department_id=department_id, results__status='approved')
+    ).values_list('pk', flat=True).distinct())
+
+
+def rebuild_trends():
+    """Rebuild the trends of the whole school"""
+    trends = build_trends()
+    with transaction.atomic():
+        StudentTrend.objects.all().delete()
+        StudentTrend.objects.bulk_create(trends, batch_size=500)
+    return len(trends)
+
+
+# ============================================
+# READING
+# ============================================
+
+def at_risk_students(class_id=None, department_id=None, class_teacher=None):
+    """Overall trends of active students at risk, steepest decline first"""
+    trends = StudentTrend.objects.filter(course__isnull=True, at_risk=True, student__is_active=True)
+    if class_id:
+        trends = trends.filter(student__current_class_id=class_id)
+    if department_id:
+        trends = trends.filter(student__current_class__department_id=department_id)
+    if class_teacher:
+        trends = trends.filter(student__current_class__class_teacher=class_teacher)
+    return trends.select_related('student', 'student__current_class').order_by(
+        F('delta').asc(nulls_last=True), 'latest_average', 'student__last_name', 'student__first_name'
+    )
+
+
+def student_trends(student_id):
+    """(overall trend or None, course trends by course name) of one student"""
+    trends = list(StudentTrend.objects.filter(student_id=student_id).select_related('course'))
+    overall = next((trend for trend in trends if trend.course_id is None), None)
+    courses = sorted((trend for trend in trends if trend.course_id), key=lambda trend: trend.course.name)
+    return overall, courses
+
+
+def trend_as_json(trend):
+    """One trend with Decimals turned into numbers, for JsonResponse"""
+    return {
+        'course': {'id': trend.course_id, 'code': trend.course.code, 'name': trend.course.name}
+        if trend.course_id else None,
+        'years': [{'id': year_id, 'name': name, 'average': average} for year_id, name, average in trend.trajectory],
+        'latest_average': float(trend.latest_average),
+        'delta': float(trend.delta) if trend.delta is not None else None,
+        'slope': float(trend.slope) if trend.slope is not None else None,
+        'declining': trend.declining,
+        'declining_courses': trend.declining_courses,
+        'below_pass': trend.below_pass,
+        'at_risk': trend.at_risk,
+    }
+
+
+def cohort_trends(class_id):
+    """
+    Year-by-year means of the trends of a class's active students, overall
+    and per course: {'years': [names], 'rows': [{'label', 'averages', 'delta', ...}]}.
+    """
+    rows = StudentTrend.objects.filter(
+        student__current_class_id=class_id, student__is_active=True
+    ).values_list('course_id', 'course__code', 'course__name', 'trajectory', 'declining')
+
+    groups = {}
+    year_ids = set()
+    for course_id, code, name, trajectory, declining in rows:
+        group = groups.setdefault(course_id, {
+            'label': f'{code} {name}' if course_id else 'Overall', 'points': {}, 'declining': 0,
+        })
+        group['declining'] += declining
+        for year_id, _, average in trajectory:
+            group['points'].setdefault(year_id, []).append(average)
+            year_ids.add(year_id)
+
+    years = list(AcademicYear.objects.filter(pk__in=year_ids).order_by('start_date').values_list('pk', 'name'))
+    result = []
+    for course_id, group in sorted(groups.items(), key=lambda item: (item[0] is not None, item[1]['label'])):
+        averages = [
+            round(statistics.fmean(group['points'][year_id]), 2) if year_id in group['points'] else None
+            for year_id, _ in years
+        ]
+        present = [average for average in averages if average is not None]
+        result.append({
+            'label': group['label'],
+            'averages': averages,
+            'delta': round(present[-1] - present[-2], 2) if len(present) > 1 else None,
+            'declining': group['declining'],
+        })
+    return {'years': [name for _, name in years], 'rows': result}
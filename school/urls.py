@@ -17,6 +17,7 @@ urlpatterns = [
     path('students/create/', views.student_create, name='student_create'),
     path('students/<int:pk>/edit/', views.student_edit, name='student_edit'),
     path('students/<int:pk>/', views.student_detail, name='student_detail'),
+    path('students/<int:pk>/history/', views.student_history, name='student_history'),
     path('students/bulk-actions/', views.student_bulk_actions, name='student_bulk_actions'),
     
     # Teachers
@@ -37,6 +38,7 @@ urlpatterns = [
     path('classes/<int:pk>/edit/', views.class_edit, name='class_edit'),
     path('classes/<int:pk>/delete/', views.class_delete, name='class_delete'),
     path('classes/<int:class_id>/performance/', views.class_performance_report, name='class_performance'),
+    path('classes/<int:class_id>/broadsheet/', views.class_broadsheet, name='class_broadsheet'),
     
     # Courses
     path('courses/', views.course_list, name='course_list'),
@@ -93,8 +95,21 @@ urlpatterns = [
     
     # Reports
     path('reports/top-performers/', views.top_performers, name='top_performers'),
+    path('reports/at-risk/', views.at_risk_list, name='at_risk_students'),
+    path('reports/analytics/', views.results_analytics, name='results_analytics'),
+    path('reports/export/<str:kind>/', views.results_export, name='results_export'),
+    
+    # Background jobs
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
+    path('autocomplete/<str:kind>/', views.autocomplete_view, name='autocomplete'),
     
     # Printing
     path('print/quarterly/<int:quarter_id>/<int:student_id>/', views.print_quarterly, name='print_quarterly'),
     path('print/semester/<int:semester_id>/<int:student_id>/', views.print_semester, name='print_semester'),
+    path('print/quarterly/<int:quarter_id>/<int:student_id>/pdf/', views.print_quarterly_pdf, name='print_quarterly_pdf'),
+    path('print/semester/<int:semester_id>/<int:student_id>/pdf/', views.print_semester_pdf, name='print_semester_pdf'),
+    path('print/metrics/', views.report_metrics, name='report_metrics'),
+    path('print/batch/', views.report_cards_batch, name='report_cards_batch'),
 ]
\ No newline at end of file
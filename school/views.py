@@ -1,12 +1,50 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db.models import Count
+from django.template import TemplateSyntaxError
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.safestring import mark_safe
+from pathlib import Path
 
 from .models import *
 from .forms import *
+from .activity import record_activity, recent_activity
+from .autocomplete import autocomplete, autocomplete_kinds, invalidate_autocomplete
+from .broadsheet import BROADSHEET_FORMATS, BROADSHEET_PERIODS, broadsheet_chunks, get_broadsheet, get_broadsheet_pdf
+from .card_cache import card_digest, open_card
+from .class_stats import STATS_PERIODS, get_class_statistics, invalidate_class_statistics
+from .cube import CUBE_DIMENSIONS, refresh_cells, rollup
+from .dashboard import (
+    get_admin_stats, get_teacher_progress, invalidate_admin_stats, invalidate_student_counts,
+    invalidate_teacher_progress, student_count_key,
+)
+from .exports import EXPORT_FORMATS, EXPORTS, export_chunks, export_filename, export_filters
+from .history import get_student_history, history_as_json, with_grades
+from .jobs import enqueue
+from .leaderboards import (
+    LEADERBOARD_PAGE_SIZE, LEADERBOARD_PERIODS, LEADERBOARD_SCOPES, leaderboard_page, leaderboard_size,
+    refresh_student_boards,
+)
+from .pagination import CachedCountPaginator, cursor_for, keyset_page
+from .ranking import rerank_moved_students
+from .report_batch import BATCH_FORMATS, BATCH_SCOPES
+from .result_templates import compile_template
+from .reports import quarterly_card_context, render_metrics, render_pdf, semester_card_context
+from .results import APPROVAL_SCOPES, results_approved, save_quarterly_results
+from .search import search_students
+from .trends import (
+    AT_RISK_PAGE_SIZE, at_risk_students, cohort_trends, refresh_student_trends, student_trends, trend_as_json,
+)
 
 
 # ============================================
@@ -54,78 +92,24 @@ def dashboard_view(request):
     }
     
     if request.user.role == 'admin':
-        # Main Statistics
-        context['total_students'] = Student.objects.filter(is_active=True).count()
-        context['total_teachers'] = User.objects.filter(
-            role__in=['teacher', 'class_teacher']
-        ).count()
-        context['total_classes'] = Class.objects.count()
-        context['pending_results'] = QuarterlyResult.objects.filter(
-            status='submitted'
-        ).count()
+        # Statistics snapshot (one query, cached until the data changes)
+        context.update(get_admin_stats())
         
-        # Additional Stats
-        context['total_departments'] = Department.objects.count()
-        context['total_courses'] = Course.objects.count()
-        context['active_quarters'] = Quarter.objects.filter(is_active=True).count()
-        context['total_results'] = QuarterlyResult.objects.filter(
-            status='approved'
-        ).count()
-        
-        # Recent Activities (sample data - customize as needed)
-        context['recent_activities'] = [
-            {
-                'title': 'New Student Registered',
-                'description': 'John Doe added to Grade 1A',
-                'timestamp': timezone.now() - timezone.timedelta(hours=2),
-                'icon': 'fa-user-plus',
-                'color': '#10b981'
-            },
-            {
-                'title': 'Results Submitted',
-                'description': 'Teacher Smith submitted Math Q1 results',
-                'timestamp': timezone.now() - timezone.timedelta(hours=5),
-                'icon': 'fa-file-upload',
-                'color': '#3b82f6'
-            },
-            {
-                'title': 'Results Approved',
-                'description': '25 quarterly results approved',
-                'timestamp': timezone.now() - timezone.timedelta(days=1),
-                'icon': 'fa-check-circle',
-                'color': '#10b981'
-            },
-            {
-                'title': 'New Class Created',
-                'description': 'Grade 2B created in Primary Department',
-                'timestamp': timezone.now() - timezone.timedelta(days=2),
-                'icon': 'fa-plus-circle',
-                'color': '#8b5cf6'
-            },
-        ]
+        context['recent_activities'] = recent_activity(10)
         
         return render(request, 'school/admin_dashboard.html', context)
     
     elif request.user.is_teacher():
-        # Teacher dashboard
-        context['my_classes'] = TeacherAssignment.objects.filter(
-            teacher=request.user
-        ).select_related('class_assigned', 'course')
-        
-        context['submitted_results'] = QuarterlyResult.objects.filter(
-            teacher=request.user,
-            status='submitted'
-        ).count()
-        
-        context['draft_results'] = QuarterlyResult.objects.filter(
-            teacher=request.user,
-            status='draft'
-        ).count()
+        # Teacher dashboard: progress per assignment for the active quarter
+        quarter = Quarter.objects.filter(is_active=True).first()
+        progress = get_teacher_progress(request.user.pk, quarter)
         
-        context['approved_results'] = QuarterlyResult.objects.filter(
-            teacher=request.user,
-            status='approved'
-        ).count()
+        context['quarter'] = quarter
+        context['my_classes'] = progress
+        context['submitted_results'] = sum(row['submitted'] for row in progress)
+        context['draft_results'] = sum(row['draft'] for row in progress)
+        context['approved_results'] = sum(row['approved'] for row in progress)
+        context['managed_classes'] = request.user.managed_classes.order_by('name')
         
         return render(request, 'school/teacher_dashboard.html', context)
     
@@ -137,19 +121,96 @@ def dashboard_view(request):
 # STUDENT VIEWS
 # ============================================
 
+STUDENT_PAGE_SIZE = 25
+STUDENT_ORDERING = ['last_name', 'first_name', 'id']
+# Numbered (OFFSET) pages stop here; later pages are reached with a cursor
+STUDENT_OFFSET_PAGES = 20
+
+
+def _student_filters(params):
+    """Student filters picked on the student list"""
+    filters = {}
+    for param, field in [('class', 'current_class_id'), ('department', 'current_class__department_id')]:
+        value = params.get(param)
+        if value and value.isdigit():
+            filters[field] = int(value)
+    if params.get('gender') in dict(Student.GENDER_CHOICES):
+        filters['gender'] = params['gender']
+    return filters
+
+
 @login_required
 def student_list(request):
-    students = Student.objects.filter(is_active=True).select_related('current_class__department')
+    filters = _student_filters(request.GET)
+    students = Student.objects.filter(is_active=True, **filters).select_related('current_class__department')
 
-    search = request.GET.get('search')
+    ordering = STUDENT_ORDERING
+    search = request.GET.get('search', '').strip()
     if search:
-        students = students.filter(
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search) |
-            Q(admission_number__icontains=search)
+        # Best matches first, from the full-text index
+        filters['search'] = search
+        students = search_students(students, search)
+        ordering = ['search_rank'] + STUDENT_ORDERING
+
+    students = students.order_by(*ordering)
+    paginator = CachedCountPaginator(students, STUDENT_PAGE_SIZE, student_count_key(filters))
+    page_number = request.GET.get('page')
+    page_number = int(page_number) if page_number and page_number.isdigit() else 1
+    cursor = request.GET.get('cursor')
+
+    query = request.GET.copy()
+    query.pop('page', None)
+    query.pop('cursor', None)
+
+    if cursor:
+        # Deep pages continue from the last row seen instead of using OFFSET;
+        # the page number only labels them, so keep it within the real count
+        page = keyset_page(students, ordering, cursor, STUDENT_PAGE_SIZE)
+        if page.is_first:
+            page_number = 1
+        elif not page.has_next():
+            page_number = paginator.num_pages
+        else:
+            page_number = min(max(page_number, 2), paginator.num_pages - 1)
+        rows, next_cursor = page.object_list, page.next_cursor
+    elif page_number > STUDENT_OFFSET_PAGES:
+        # Numbered pages end here; later ones are reached with Next
+        query['page'] = STUDENT_OFFSET_PAGES
+        return redirect(f'{request.path}?{query.urlencode()}')
+    else:
+        page = paginator.get_page(page_number)
+        page_number = page.number
+        rows = list(page.object_list)
+        next_cursor = cursor_for(rows[-1], ordering) if page.has_next() else None
+
+    # Links run up to the last numbered page; a deeper current page follows them
+    page_links = [
+        number for number in paginator.get_elided_page_range(
+            min(page_number, STUDENT_OFFSET_PAGES, paginator.num_pages), on_each_side=2, on_ends=1,
         )
-
-    return render(request, 'school/student_list.html', {'students': students})
+        if number == paginator.ELLIPSIS or number <= STUDENT_OFFSET_PAGES
+    ]
+    if page_number > STUDENT_OFFSET_PAGES:
+        if page_links[-1] == paginator.ELLIPSIS:
+            page_links.pop()
+        if page_number > STUDENT_OFFSET_PAGES + 1:
+            page_links.append(paginator.ELLIPSIS)
+        page_links.append(page_number)
+
+    return render(request, 'school/student_list.html', {
+        'students': rows,
+        'total_students': paginator.count,
+        'page_number': page_number,
+        'num_pages': paginator.num_pages,
+        'page_links': page_links,
+        'ellipsis': paginator.ELLIPSIS,
+        'previous_page': page_number - 1 if 1 < page_number <= STUDENT_OFFSET_PAGES + 1 else None,
+        'next_cursor': next_cursor,
+        'filter_query': query.urlencode(),
+        'classes': Class.objects.select_related('academic_year').order_by('name'),
+        'departments': Department.objects.order_by('name'),
+        'gender_choices': Student.GENDER_CHOICES,
+    })
 
 
 @login_required
@@ -157,7 +218,8 @@ def student_create(request):
     if request.method == 'POST':
         form = StudentForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
+            student = form.save()
+            record_activity('student_created', f'{student.get_full_name()} added to {student.current_class or "no class"}', request.user)
             messages.success(request, 'Student added successfully!')
             return redirect('school:student_list')
     else:
@@ -173,6 +235,7 @@ def student_edit(request, pk):
         form = StudentForm(request.POST, request.FILES, instance=student)
         if form.is_valid():
             form.save()
+            record_activity('student_updated', f'{student.get_full_name()} details updated', request.user)
             messages.success(request, 'Student updated successfully!')
             return redirect('school:student_list')
     else:
@@ -183,9 +246,25 @@ def student_edit(request, pk):
 
 @login_required
 def student_detail(request, pk):
+    student = get_object_or_404(Student.objects.select_related('current_class'), pk=pk)
+    history = with_grades(get_student_history(student.pk))
+    overall_trend, course_trends = student_trends(student.pk)
+    return render(request, 'school/student_detail.html', {
+        'student': student, 'history': history, 'overall_trend': overall_trend, 'course_trends': course_trends,
+    })
+
+
+@login_required
+def student_history(request, pk):
+    """Academic history of a student as JSON"""
     student = get_object_or_404(Student, pk=pk)
-    results = QuarterlyResult.objects.filter(student=student).select_related('course', 'quarter__academic_year')
-    return render(request, 'school/student_detail.html', {'student': student, 'results': results})
+    history = with_grades(get_student_history(student.pk))
+    overall_trend, course_trends = student_trends(student.pk)
+    return JsonResponse({
+        'student': {'id': student.pk, 'admission_number': student.admission_number, 'name': student.get_full_name()},
+        'years': history_as_json(history),
+        'trends': [trend_as_json(trend) for trend in [overall_trend, *course_trends] if trend],
+    })
 
 
 # ============================================
@@ -229,24 +308,31 @@ def result_entry(request, quarter_id, class_id, course_id):
     students = Student.objects.filter(current_class=class_obj, is_active=True).order_by('last_name', 'first_name')
 
     if request.method == 'POST':
-        for student in students:
-            score_key = f'score_{student.id}'
-            comment_key = f'comment_{student.id}'
-            score = request.POST.get(score_key)
-
-            if score not in ['', None]:
-                QuarterlyResult.objects.update_or_create(
-                    student=student,
-                    course=course,
-                    quarter=quarter,
-                    defaults={
-                        'teacher': request.user,
-                        'score': score,
-                        'teacher_comment': request.POST.get(comment_key, ''),
-                        'status': 'draft'
-                    }
-                )
-        messages.success(request, 'Results saved as draft.')
+        student_ids = list(students.values_list('id', flat=True))
+        entries = {
+            student_id: (
+                request.POST.get(f'score_{student_id}'),
+                request.POST.get(f'comment_{student_id}', ''),
+            )
+            for student_id in student_ids
+        }
+        counts = save_quarterly_results(quarter, course, student_ids, request.user, entries)
+        invalidate_teacher_progress([request.user.pk])
+        if counts['created'] or counts['updated']:
+            record_activity(
+                'results_saved',
+                f"{request.user.get_full_name()} saved {counts['created'] + counts['updated']} "
+                f"{course.name} {quarter.name} scores for {class_obj.name}",
+                request.user,
+            )
+
+        messages.success(
+            request,
+            f"Results saved as draft ({counts['created']} new, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged)."
+        )
+        if counts['invalid']:
+            messages.warning(request, f"{counts['invalid']} scores were invalid and skipped.")
         return redirect('school:quarter_select')
 
     # Load existing results
@@ -275,9 +361,12 @@ def submit_results(request, quarter_id, class_id, course_id):
         student__current_class_id=class_id,
         teacher=request.user,
         status='draft'
-    ).update(status='submitted', submitted_at=timezone.now())
+    ).update(status='submitted', submitted_at=timezone.now(), updated_at=timezone.now())
 
     if updated:
+        invalidate_admin_stats()
+        invalidate_teacher_progress([request.user.pk])
+        record_activity('results_submitted', f'{request.user.get_full_name()} submitted {updated} results for approval', request.user)
         messages.success(request, f'{updated} results submitted for approval!')
     else:
         messages.info(request, 'No draft results found to submit.')
@@ -289,17 +378,62 @@ def submit_results(request, quarter_id, class_id, course_id):
 # ADMIN - RESULT APPROVAL
 # ============================================
 
+APPROVAL_PAGE_SIZE = 50
+
+
+def _approval_scope(params):
+    """QuarterlyResult filters picked in the approval queue"""
+    scope = {}
+    for param, field in APPROVAL_SCOPES:
+        value = params.get(param)
+        if value and value.isdigit():
+            scope[field] = int(value)
+    return scope
+
 @login_required
 def approval_list(request):
     if request.user.role != 'admin':
         messages.error(request, 'Access denied.')
         return redirect('school:dashboard')
 
-    pending = QuarterlyResult.objects.filter(status='submitted') \
-        .select_related('student', 'course', 'quarter__academic_year', 'teacher') \
-        .order_by('-submitted_at')
+    filters = _approval_scope(request.GET)
+
+    # The list pages on submitted_at; the counts come from exactly the same rows
+    queue = QuarterlyResult.objects.filter(status='submitted', submitted_at__isnull=False)
+
+    # One grouped aggregate feeds the total and every filter's counts
+    groups = queue.values(*[field for _, field in APPROVAL_SCOPES]).annotate(count=Count('id')).order_by()
+
+    counts = {param: {} for param, _ in APPROVAL_SCOPES}
+    total = 0
+    for group in groups:
+        for param, field in APPROVAL_SCOPES:
+            counts[param][group[field]] = counts[param].get(group[field], 0) + group['count']
+        if all(group[field] == value for field, value in filters.items()):
+            total += group['count']
+
+    pending = queue.filter(**filters) \
+        .select_related('student__current_class', 'course', 'quarter__academic_year', 'teacher')
+    page = keyset_page(pending, ['-submitted_at', '-id'], request.GET.get('after'), APPROVAL_PAGE_SIZE)
+
+    query = request.GET.copy()
+    query.pop('after', None)
+
+    return render(request, 'school/approval_list.html', {
+        'pending_results': page,
+        'total_pending': total,
+        'filter_query': query.urlencode(),
+        'scope_params': [(param, request.GET.get(param, '')) for param, _ in APPROVAL_SCOPES],
+        'quarter_options': _with_counts(Quarter.objects.select_related('academic_year'), counts['quarter']),
+        'class_options': _with_counts(Class.objects.all(), counts['class']),
+        'course_options': _with_counts(Course.objects.all(), counts['course']),
+        'teacher_options': _with_counts(User.objects.filter(pk__in=counts['teacher'].keys()), counts['teacher']),
+    })
 
-    return render(request, 'school/approval_list.html', {'pending_results': pending})
+
+def _with_counts(queryset, counts):
+    """(object, pending count) pairs for the filters that have pending results"""
+    return [(obj, counts[obj.pk]) for obj in queryset.filter(pk__in=counts.keys())]
 
 
 @login_required
@@ -311,7 +445,9 @@ def approve_result(request, pk):
     result.status = 'approved'
     result.approved_by = request.user
     result.approved_at = timezone.now()
-    result.save()
+    result.save(update_fields=['status', 'approved_by', 'approved_at', 'updated_at'])
+    results_approved([(result.student_id, result.course_id, result.quarter_id)])
+    record_activity('results_approved', f'{result} approved', request.user)
     messages.success(request, 'Result approved successfully.')
     return redirect('school:approval_list')
 
@@ -323,7 +459,9 @@ def reject_result(request, pk):
 
     result = get_object_or_404(QuarterlyResult, pk=pk, status='submitted')
     result.status = 'rejected'
-    result.save()
+    result.save(update_fields=['status', 'updated_at'])
+    invalidate_teacher_progress([result.teacher_id])
+    record_activity('result_rejected', f'{result} rejected', request.user)
     messages.warning(request, 'Result has been rejected.')
     return redirect('school:approval_list')
 
@@ -343,7 +481,8 @@ def class_create(request):
     if request.method == 'POST':
         form = ClassForm(request.POST)
         if form.is_valid():
-            form.save()
+            class_obj = form.save()
+            record_activity('class_created', f'{class_obj.name} created in {class_obj.department}', request.user)
             messages.success(request, 'Class created!')
             return redirect('school:class_list')
     else:
@@ -393,29 +532,119 @@ def department_create(request):
 # PRINT VIEWS
 # ============================================
 
+def _card_response(request, kind, period, student, output_format, build, filename=None):
+    """Serve a report card from the document cache, answering If-None-Match with 304"""
+    digest = card_digest(kind, period, student)
+    etag = quote_etag(digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        document = open_card(kind, period, student, output_format, build, digest=digest)
+        if output_format == 'pdf':
+            response = FileResponse(document, content_type='application/pdf', filename=filename)
+        else:
+            with document:
+                response = HttpResponse(document.read())
+    response['ETag'] = etag
+    # Browsers keep the card but check back each time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @login_required
 def print_quarterly(request, quarter_id, student_id):
-    quarter = get_object_or_404(Quarter, pk=quarter_id)
-    student = get_object_or_404(Student, pk=student_id)
-    results = QuarterlyResult.objects.filter(
-        student=student, quarter=quarter, status='approved'
-    ).select_related('course')
-
-    return render(request, 'school/print_quarterly.html', {
-        'quarter': quarter, 'student': student, 'results': results
-    })
+    quarter = get_object_or_404(Quarter.objects.select_related('academic_year'), pk=quarter_id)
+    student = get_object_or_404(Student.objects.select_related('current_class'), pk=student_id)
+    return _card_response(request, 'quarterly', quarter, student, 'html', lambda: render_to_string(
+        'school/print_quarterly.html', quarterly_card_context(quarter, student)
+    ))
 
 
 @login_required
 def print_semester(request, semester_id, student_id):
-    semester = get_object_or_404(Semester, pk=semester_id)
-    student = get_object_or_404(Student, pk=student_id)
-    results = SemesterResult.objects.filter(student=student, semester=semester).select_related('course')
+    semester = get_object_or_404(
+        Semester.objects.select_related('academic_year', 'quarter_1', 'quarter_2'), pk=semester_id
+    )
+    student = get_object_or_404(Student.objects.select_related('current_class'), pk=student_id)
+    return _card_response(request, 'semester', semester, student, 'html', lambda: render_to_string(
+        'school/print_semester.html', semester_card_context(semester, student)
+    ))
+
+
+@login_required
+def print_quarterly_pdf(request, quarter_id, student_id):
+    quarter = get_object_or_404(Quarter.objects.select_related('academic_year'), pk=quarter_id)
+    student = get_object_or_404(Student.objects.select_related('current_class'), pk=student_id)
+    try:
+        return _card_response(request, 'quarterly', quarter, student, 'pdf', lambda: render_pdf(
+            'school/print_quarterly.html', quarterly_card_context(quarter, student), 'quarterly'
+        ), filename=f'{student.admission_number}-{quarter.name}.pdf')
+    except ImportError:
+        messages.error(request, 'PDF rendering is not available on this server.')
+        return redirect('school:print_quarterly', quarter_id=quarter.pk, student_id=student.pk)
+
 
-    return render(request, 'school/print_semester.html', {
-        'semester': semester, 'student': student, 'results': results
+@login_required
+def print_semester_pdf(request, semester_id, student_id):
+    semester = get_object_or_404(
+        Semester.objects.select_related('academic_year', 'quarter_1', 'quarter_2'), pk=semester_id
+    )
+    student = get_object_or_404(Student.objects.select_related('current_class'), pk=student_id)
+    try:
+        return _card_response(request, 'semester', semester, student, 'pdf', lambda: render_pdf(
+            'school/print_semester.html', semester_card_context(semester, student), 'semester'
+        ), filename=f'{student.admission_number}-{semester.name}.pdf')
+    except ImportError:
+        messages.error(request, 'PDF rendering is not available on this server.')
+        return redirect('school:print_semester', semester_id=semester.pk, student_id=student.pk)
+
+
+@login_required
+def report_metrics(request):
+    """PDF render timings of this process as JSON"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    return JsonResponse({'metrics': render_metrics()})
+
+@login_required
+def report_cards_batch(request):
+    """Queue report cards for a class, a department or the whole school"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    if request.method == 'POST':
+        kind, _, period_id = request.POST.get('period', '').partition(':')
+        scope = request.POST.get('scope')
+        scope_id = request.POST.get(f'{scope}_id', '')
+        output_format = request.POST.get('format')
+        
+        valid = (
+            kind in ['quarterly', 'semester'] and period_id.isdigit()
+            and scope in BATCH_SCOPES and output_format in BATCH_FORMATS
+            and (scope == 'school' or scope_id.isdigit())
+        )
+        if valid:
+            job = enqueue('report_cards', {
+                'kind': kind,
+                'period_id': int(period_id),
+                'scope': scope,
+                'scope_id': int(scope_id) if scope != 'school' else None,
+                'format': output_format,
+            }, user=request.user)
+            messages.info(request, 'Report card generation has been queued.')
+            return redirect('school:job_detail', pk=job.pk)
+        messages.error(request, 'Choose a period, a scope and a format.')
+    
+    return render(request, 'school/report_cards_batch.html', {
+        'quarters': Quarter.objects.select_related('academic_year'),
+        'semesters': Semester.objects.select_related('academic_year'),
+        'classes': Class.objects.select_related('department'),
+        'departments': Department.objects.all(),
+        'scopes': BATCH_SCOPES,
+        'formats': BATCH_FORMATS,
     })
 
+
 # Add these views to school/views.py
 
 # ============================================
@@ -649,52 +878,10 @@ def semester_calculate(request, semester_id):
         return redirect('school:dashboard')
     
     semester = get_object_or_404(Semester, pk=semester_id)
+    job = enqueue('semester_calculate', {'semester_id': semester.pk}, user=request.user)
     
-    # Get all quarterly results for both quarters
-    q1_results = QuarterlyResult.objects.filter(
-        quarter=semester.quarter_1,
-        status='approved'
-    ).select_related('student', 'course')
-    
-    q2_results = QuarterlyResult.objects.filter(
-        quarter=semester.quarter_2,
-        status='approved'
-    ).select_related('student', 'course')
-    
-    # Create dict for easy lookup
-    q2_dict = {(r.student_id, r.course_id): r for r in q2_results}
-    
-    calculated = 0
-    
-    for q1_result in q1_results:
-        # Find matching Q2 result
-        key = (q1_result.student_id, q1_result.course_id)
-        if key in q2_dict:
-            q2_result = q2_dict[key]
-            
-            # Create or update semester result
-            sem_result, created = SemesterResult.objects.get_or_create(
-                student=q1_result.student,
-                course=q1_result.course,
-                semester=semester,
-                defaults={
-                    'q1_score': q1_result.score,
-                    'q2_score': q2_result.score,
-                    'total_score': q1_result.score + q2_result.score,
-                    'average_score': (q1_result.score + q2_result.score) / 2,
-                }
-            )
-            
-            if not created:
-                # Update existing
-                sem_result.q1_score = q1_result.score
-                sem_result.q2_score = q2_result.score
-                sem_result.calculate()
-            
-            calculated += 1
-    
-    messages.success(request, f'Calculated {calculated} semester results!')
-    return redirect('school:semester_list')
+    messages.info(request, f'Semester calculation for {semester} has been queued.')
+    return redirect('school:job_detail', pk=job.pk)
 
 
 # ============================================
@@ -709,16 +896,19 @@ def bulk_approve_results(request):
         return redirect('school:dashboard')
     
     if request.method == 'POST':
-        updated = QuarterlyResult.objects.filter(
-            status='submitted'
-        ).update(
-            status='approved',
-            approved_by=request.user,
-            approved_at=timezone.now()
-        )
+        result_ids = [int(pk) for pk in request.POST.getlist('result_ids') if pk.isdigit()]
+        if request.POST.get('selected_only') and not result_ids:
+            messages.warning(request, 'Select at least one result to approve.')
+            return redirect('school:approval_list')
         
-        messages.success(request, f'Approved {updated} results!')
-        return redirect('school:approval_list')
+        job = enqueue('bulk_approve', {
+            'user_id': request.user.pk,
+            'scope': _approval_scope(request.POST),
+            'result_ids': result_ids or None,
+        }, user=request.user)
+        
+        messages.info(request, 'Bulk approval has been queued.')
+        return redirect('school:job_detail', pk=job.pk)
     
     return redirect('school:approval_list')
 
@@ -729,72 +919,226 @@ def bulk_approve_results(request):
 
 @login_required
 def class_performance_report(request, class_id):
-    """View class performance analytics"""
+    """Per-course and per-student statistics of a class for a quarter or semester"""
     if request.user.role != 'admin':
         messages.error(request, 'Access denied.')
         return redirect('school:dashboard')
     
-    class_obj = get_object_or_404(Class, pk=class_id)
-    students = Student.objects.filter(current_class=class_obj, is_active=True)
+    class_obj = get_object_or_404(Class.objects.select_related('department'), pk=class_id)
     
-    # Get latest quarter results
-    latest_quarter = Quarter.objects.filter(is_active=True).first()
+    period, _, period_id = request.GET.get('period', '').partition(':')
+    if period not in STATS_PERIODS or not period_id.isdigit():
+        # Default to the active quarter
+        period, period_id = 'quarter', Quarter.objects.filter(is_active=True).values_list('pk', flat=True).first()
+        if period_id is None:
+            messages.warning(request, 'No active quarter found.')
+            return redirect('school:class_list')
+    period_id = int(period_id)
     
-    if latest_quarter:
-        results = QuarterlyResult.objects.filter(
-            student__in=students,
-            quarter=latest_quarter,
-            status='approved'
-        ).select_related('student', 'course')
-        
-        # Calculate class average
-        from django.db.models import Avg
-        class_avg = results.aggregate(Avg('score'))['score__avg']
-        
-        context = {
-            'class_obj': class_obj,
-            'students': students,
-            'results': results,
-            'class_average': class_avg,
-            'quarter': latest_quarter
-        }
-        
-        return render(request, 'school/class_performance.html', context)
+    stats = get_class_statistics(class_obj.pk, period, period_id)
+    context = {
+        'class_obj': class_obj,
+        'stats': stats,
+        'class_average': stats['class']['mean'] if stats['class'] else None,
+        'period': period,
+        'period_id': period_id,
+        'quarters': Quarter.objects.filter(academic_year=class_obj.academic_year_id),
+        'semesters': Semester.objects.filter(academic_year=class_obj.academic_year_id),
+    }
+    return render(request, 'school/class_performance.html', context)
+
+
+@login_required
+def class_broadsheet(request, class_id):
+    """Students x courses broadsheet of a class as a page, a print page, CSV, XLSX or PDF"""
+    class_obj = get_object_or_404(Class.objects.select_related('department', 'academic_year'), pk=class_id)
+    if request.user.role != 'admin' and class_obj.class_teacher_id != request.user.pk:
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    period, _, period_id = request.GET.get('period', '').partition(':')
+    if period not in BROADSHEET_PERIODS or not period_id.isdigit():
+        # Default to the active quarter
+        period, period_id = 'quarter', Quarter.objects.filter(is_active=True).values_list('pk', flat=True).first()
+        if period_id is None:
+            messages.warning(request, 'No active quarter found.')
+            return redirect('school:dashboard')
+    period_model = Quarter if period == 'quarter' else Semester
+    period_obj = get_object_or_404(period_model.objects.select_related('academic_year'), pk=period_id)
+    output_format = request.GET.get('format', 'html')
+    if output_format not in BROADSHEET_FORMATS:
+        raise Http404('Unknown broadsheet format')
+    
+    sheet = get_broadsheet(class_obj.pk, period, period_obj.pk)
+    title = f'{class_obj.name} {period_obj.name} Broadsheet'
+    filename = f'{class_obj.name}-{period_obj.name}-broadsheet'.replace(' ', '_')
+    
+    if output_format in EXPORT_FORMATS:
+        response = StreamingHttpResponse(
+            broadsheet_chunks(sheet, output_format, title), content_type=EXPORT_FORMATS[output_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{output_format}"'
+        return response
+    
+    context = {
+        'class_obj': class_obj,
+        'sheet': sheet,
+        'period': period,
+        'period_id': period_obj.pk,
+        'period_obj': period_obj,
+        'title': title,
+    }
+    if output_format == 'pdf':
+        try:
+            pdf = get_broadsheet_pdf(class_obj.pk, period, period_obj.pk, lambda: render_pdf(
+                'school/print_broadsheet.html', context, 'broadsheet'
+            ))
+        except ImportError:
+            messages.error(request, 'PDF rendering is not available on this server.')
+            return redirect(f'{request.path}?period={period}:{period_obj.pk}&format=print')
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{filename}.pdf"'
+        return response
+    if output_format == 'print':
+        return render(request, 'school/print_broadsheet.html', context)
+    
+    context['quarters'] = Quarter.objects.filter(academic_year=class_obj.academic_year_id)
+    context['semesters'] = Semester.objects.filter(academic_year=class_obj.academic_year_id)
+    return render(request, 'school/class_broadsheet.html', context)
+
+
+@login_required
+def results_analytics(request):
+    """Approved score roll-ups by department, class, course or teacher, answered from the result cube"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    by = request.GET.get('by', 'department')
+    if by not in CUBE_DIMENSIONS:
+        by = 'department'
+    filters = {
+        level: int(request.GET[level])
+        for level in CUBE_DIMENSIONS if level != by and request.GET.get(level, '').isdigit()
+    }
+    if 'quarter' not in request.GET and by != 'quarter':
+        # Default to the active quarter; an empty choice covers every quarter
+        active = Quarter.objects.filter(is_active=True).values_list('pk', flat=True).first()
+        if active:
+            filters['quarter'] = active
     
-    messages.warning(request, 'No active quarter found.')
-    return redirect('school:class_list')
+    context = {
+        'groups': rollup([by], **filters),
+        'by': by,
+        'levels': list(CUBE_DIMENSIONS),
+        'filters': filters,
+        'quarters': Quarter.objects.select_related('academic_year'),
+        'departments': Department.objects.all(),
+    }
+    return render(request, 'school/results_analytics.html', context)
+
+
+@login_required
+def results_export(request, kind):
+    """Stream quarterly or semester results as CSV or XLSX"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    output_format = request.GET.get('format', 'csv')
+    if kind not in EXPORTS or output_format not in EXPORT_FORMATS:
+        raise Http404('Unknown export')
+    
+    try:
+        filters = export_filters(kind, request.GET)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error), content_type='text/plain')
+    response = StreamingHttpResponse(
+        export_chunks(kind, filters, output_format), content_type=EXPORT_FORMATS[output_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, filters, output_format)}"'
+    return response
+
+
+@login_required
+def at_risk_list(request):
+    """Active students flagged at risk by their year-on-year trends, read from the trend projection"""
+    if request.user.role != 'admin' and not request.user.managed_classes.exists():
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    class_id = request.GET.get('class_id', '')
+    department_id = request.GET.get('department_id', '')
+    class_id = int(class_id) if class_id.isdigit() else None
+    department_id = int(department_id) if department_id.isdigit() else None
+    # Class teachers only see the classes they manage
+    class_teacher = None if request.user.role == 'admin' else request.user
+    classes = Class.objects.all() if class_teacher is None else request.user.managed_classes.all()
+    
+    paginator = Paginator(at_risk_students(class_id, department_id, class_teacher), AT_RISK_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
+    query = request.GET.copy()
+    query.pop('page', None)
+    
+    context = {
+        'page': page,
+        'class_id': class_id,
+        'department_id': department_id,
+        'classes': classes.order_by('name'),
+        'departments': Department.objects.all() if class_teacher is None else Department.objects.none(),
+        'cohort': cohort_trends(class_id) if class_id and classes.filter(pk=class_id).exists() else None,
+        'filter_query': query.urlencode(),
+    }
+    return render(request, 'school/at_risk_students.html', context)
 
 
 @login_required
 def top_performers(request):
-    """View top performing students"""
+    """Leaderboards of the school, a department, a class or a course, one page at a time"""
     if request.user.role != 'admin':
         messages.error(request, 'Access denied.')
         return redirect('school:dashboard')
     
-    # Get latest quarter
-    latest_quarter = Quarter.objects.filter(is_active=True).first()
+    period, _, period_id = request.GET.get('period', '').partition(':')
+    if period not in LEADERBOARD_PERIODS or not period_id.isdigit():
+        # Default to the active quarter
+        period, period_id = 'quarter', Quarter.objects.filter(is_active=True).values_list('pk', flat=True).first()
+        if period_id is None:
+            messages.warning(request, 'No active quarter found.')
+            return redirect('school:dashboard')
     
-    if latest_quarter:
-        # Get top performers
-        from django.db.models import Avg
-        top_students = Student.objects.filter(
-            results__quarter=latest_quarter,
-            results__status='approved',
-            is_active=True
-        ).annotate(
-            avg_score=Avg('results__score')
-        ).order_by('-avg_score')[:20]
-        
-        context = {
-            'top_students': top_students,
-            'quarter': latest_quarter
-        }
-        
-        return render(request, 'school/top_performers.html', context)
+    scope = request.GET.get('scope', 'overall')
+    scope_id = request.GET.get(f'{scope}_id', '')
+    if scope not in LEADERBOARD_SCOPES or (scope != 'overall' and not scope_id.isdigit()):
+        scope, scope_id = 'overall', 0
+    board = (scope, int(scope_id or 0), period, int(period_id))
+    
+    total = leaderboard_size(board)
+    num_pages = max(1, -(-total // LEADERBOARD_PAGE_SIZE))
+    page = request.GET.get('page', '1')
+    page = min(int(page), num_pages) if page.isdigit() and int(page) > 0 else 1
+    query = request.GET.copy()
+    query.pop('page', None)
     
-    messages.warning(request, 'No active quarter found.')
-    return redirect('school:dashboard')
+    context = {
+        'entries': leaderboard_page(board, page),
+        'scope': scope,
+        'scope_id': board[1],
+        'period': period,
+        'period_id': board[3],
+        'total': total,
+        'page_number': page,
+        'num_pages': num_pages,
+        'filter_query': query.urlencode(),
+        'quarters': Quarter.objects.select_related('academic_year'),
+        'semesters': Semester.objects.select_related('academic_year'),
+        'years': AcademicYear.objects.all(),
+        'departments': Department.objects.all(),
+        'classes': Class.objects.select_related('department'),
+        'courses': Course.objects.all(),
+        'scopes': LeaderboardEntry.SCOPE_CHOICES,
+    }
+    return render(request, 'school/top_performers.html', context)
 
 @login_required
 def teacher_list(request):
@@ -1016,6 +1360,7 @@ def class_edit(request, pk):
         form = ClassForm(request.POST, instance=class_obj)
         if form.is_valid():
             form.save()
+            record_activity('class_updated', f'{class_obj.name} updated', request.user)
             messages.success(request, 'Class updated successfully!')
             return redirect('school:class_list')
     else:
@@ -1033,6 +1378,7 @@ def class_delete(request, pk):
     class_obj = get_object_or_404(Class, pk=pk)
     
     if request.method == 'POST':
+        record_activity('class_deleted', f'{class_obj.name} deleted', request.user)
         class_obj.delete()
         messages.success(request, 'Class deleted successfully!')
         return redirect('school:class_list')
@@ -1338,52 +1684,10 @@ def semester_calculate(request, semester_id):
         return redirect('school:dashboard')
     
     semester = get_object_or_404(Semester, pk=semester_id)
+    job = enqueue('semester_calculate', {'semester_id': semester.pk}, user=request.user)
     
-    # Get all quarterly results for both quarters
-    q1_results = QuarterlyResult.objects.filter(
-        quarter=semester.quarter_1,
-        status='approved'
-    ).select_related('student', 'course')
-    
-    q2_results = QuarterlyResult.objects.filter(
-        quarter=semester.quarter_2,
-        status='approved'
-    ).select_related('student', 'course')
-    
-    # Create dict for easy lookup
-    q2_dict = {(r.student_id, r.course_id): r for r in q2_results}
-    
-    calculated = 0
-    
-    for q1_result in q1_results:
-        # Find matching Q2 result
-        key = (q1_result.student_id, q1_result.course_id)
-        if key in q2_dict:
-            q2_result = q2_dict[key]
-            
-            # Create or update semester result
-            sem_result, created = SemesterResult.objects.get_or_create(
-                student=q1_result.student,
-                course=q1_result.course,
-                semester=semester,
-                defaults={
-                    'q1_score': q1_result.score,
-                    'q2_score': q2_result.score,
-                    'total_score': q1_result.score + q2_result.score,
-                    'average_score': (q1_result.score + q2_result.score) / 2,
-                }
-            )
-            
-            if not created:
-                # Update existing
-                sem_result.q1_score = q1_result.score
-                sem_result.q2_score = q2_result.score
-                sem_result.calculate()
-            
-            calculated += 1
-    
-    messages.success(request, f'Calculated {calculated} semester results!')
-    return redirect('school:semester_list')
+    messages.info(request, f'Semester calculation for {semester} has been queued.')
+    return redirect('school:job_detail', pk=job.pk)
 
 @login_required
 def semester_lock(request, pk):
@@ -1477,8 +1781,35 @@ def template_preview(request, pk):
         messages.error(request, 'Access denied.')
         return redirect('school:dashboard')
     
-    template = get_object_or_404(ResultTemplate, pk=pk)
-    return render(request, 'school/template_preview.html', {'template': template})
+    template = get_object_or_404(ResultTemplate.objects.select_related('department'), pk=pk)
+    
+    # Render with a real student of the department when there is one
+    student = Student.objects.filter(
+        is_active=True, current_class__department=template.department
+    ).select_related('current_class').first()
+    context = {}
+    if template.template_type == 'quarterly':
+        quarter = Quarter.objects.order_by('-is_active', '-academic_year__start_date', '-name').first()
+        if student and quarter:
+            context = quarterly_card_context(quarter, student)
+    else:
+        semester = Semester.objects.order_by('-academic_year__start_date', '-name').first()
+        if student and semester:
+            context = semester_card_context(semester, student)
+    
+    preview_error = None
+    try:
+        rendered = mark_safe(compile_template(template.pk, template.html_content).render(context))
+    except TemplateSyntaxError as e:
+        rendered = ''
+        preview_error = str(e)
+    
+    return render(request, 'school/template_preview.html', {
+        'template': template,
+        'rendered': rendered,
+        'preview_error': preview_error,
+        'sample_student': student,
+    })
 
 # ============================================
 # BULK OPERATIONS
@@ -1492,16 +1823,19 @@ def bulk_approve_results(request):
         return redirect('school:dashboard')
     
     if request.method == 'POST':
-        updated = QuarterlyResult.objects.filter(
-            status='submitted'
-        ).update(
-            status='approved',
-            approved_by=request.user,
-            approved_at=timezone.now()
-        )
+        result_ids = [int(pk) for pk in request.POST.getlist('result_ids') if pk.isdigit()]
+        if request.POST.get('selected_only') and not result_ids:
+            messages.warning(request, 'Select at least one result to approve.')
+            return redirect('school:approval_list')
         
-        messages.success(request, f'Approved {updated} results!')
-        return redirect('school:approval_list')
+        job = enqueue('bulk_approve', {
+            'user_id': request.user.pk,
+            'scope': _approval_scope(request.POST),
+            'result_ids': result_ids or None,
+        }, user=request.user)
+        
+        messages.info(request, 'Bulk approval has been queued.')
+        return redirect('school:job_detail', pk=job.pk)
     
     return redirect('school:approval_list')
 
@@ -1522,20 +1856,111 @@ def student_bulk_actions(request):
         
         if action == 'deactivate':
             Student.objects.filter(id__in=student_ids).update(is_active=False)
+            refresh_student_boards(student_ids)
+            invalidate_class_statistics()
+            invalidate_admin_stats()
+            invalidate_student_counts()
+            invalidate_autocomplete('students')
+            record_activity('students_bulk', f'{len(student_ids)} students deactivated', request.user)
             messages.success(request, f'{len(student_ids)} students deactivated!')
         
         elif action == 'activate':
             Student.objects.filter(id__in=student_ids).update(is_active=True)
+            refresh_student_boards(student_ids)
+            invalidate_class_statistics()
+            invalidate_admin_stats()
+            invalidate_student_counts()
+            invalidate_autocomplete('students')
+            record_activity('students_bulk', f'{len(student_ids)} students activated', request.user)
             messages.success(request, f'{len(student_ids)} students activated!')
         
         elif action == 'change_class':
             new_class_id = request.POST.get('new_class')
             if new_class_id:
+                moved_from = set(Student.objects.filter(id__in=student_ids).values_list('current_class_id', flat=True))
                 Student.objects.filter(id__in=student_ids).update(current_class_id=new_class_id)
+                rerank_moved_students(student_ids, moved_from | {int(new_class_id)})
+                refresh_student_boards(student_ids)
+                invalidate_class_statistics()
+                refresh_cells(class_ids=(moved_from | {int(new_class_id)}) - {None})
+                refresh_student_trends(student_ids)
+                invalidate_admin_stats()
+                invalidate_student_counts()
+                record_activity('students_bulk', f'{len(student_ids)} students moved to a new class', request.user)
                 messages.success(request, f'{len(student_ids)} students moved to new class!')
         
         elif action == 'delete':
-            Student.objects.filter(id__in=student_ids).delete()
-            messages.success(request, f'{len(student_ids)} students deleted!')
+            job = enqueue('student_delete', {'student_ids': [int(pk) for pk in student_ids]}, user=request.user)
+            messages.info(request, f'Deletion of {len(student_ids)} students has been queued.')
+            return redirect('school:job_detail', pk=job.pk)
+    
+    return redirect('school:student_list')
+
+# ============================================
+# BACKGROUND JOBS
+# ============================================
+
+@login_required
+def job_detail(request, pk):
+    """Progress page for a background job"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    job = get_object_or_404(Job, pk=pk)
+    return render(request, 'school/job_detail.html', {'job': job})
+
+
+@login_required
+def job_download(request, pk):
+    """Stream the file a finished job produced"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Access denied.')
+        return redirect('school:dashboard')
+    
+    job = get_object_or_404(Job, pk=pk, status='done')
+    relative = (job.result or {}).get('file')
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    path = (media_root / relative).resolve() if relative else None
+    if path is None or media_root not in path.parents or not path.is_file():
+        messages.error(request, 'This job has no file to download.')
+        return redirect('school:job_detail', pk=job.pk)
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
+
+
+@login_required
+def job_status(request, pk):
+    """JSON status of a background job, polled by job_detail"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    
+    job = get_object_or_404(Job, pk=pk)
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent(),
+        'message': job.message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'finished': job.status in ['done', 'failed'],
+    })
+
+
+# ============================================
+# AUTOCOMPLETE
+# ============================================
+
+@login_required
+def autocomplete_view(request, kind):
+    """Top matches for type-ahead widgets as JSON"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    if kind not in autocomplete_kinds():
+        return JsonResponse({'error': 'Unknown lookup.'}, status=404)
     
-    return redirect('school:student_list')
\ No newline at end of file
+    response = JsonResponse({'results': autocomplete(kind, request.GET.get('q', ''))})
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
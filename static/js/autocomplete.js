@@ -0,0 +1,46 @@
+// Remote-loading selects: only the chosen option is rendered with the page,
+// the rest are fetched from the autocomplete endpoint while the user types.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(select => {
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Type to search...';
+        input.autocomplete = 'off';
+        select.parentNode.insertBefore(input, select);
+
+        let timer = null;
+        let controller = null;
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                const term = input.value.trim();
+                if (!term) {
+                    return;
+                }
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                const url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(term);
+                fetch(url, {signal: controller.signal, credentials: 'same-origin'})
+                    .then(response => response.json())
+                    .then(data => {
+                        const selected = select.value;
+                        Array.from(select.options).forEach(option => {
+                            if (option.value && option.value !== selected) {
+                                option.remove();
+                            }
+                        });
+                        data.results.forEach(item => {
+                            if (String(item.id) !== selected) {
+                                select.add(new Option(item.text, item.id));
+                            }
+                        });
+                    })
+                    .catch(() => {});
+            }, 200);
+        });
+    });
+});